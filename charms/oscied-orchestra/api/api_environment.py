@@ -51,9 +51,14 @@ def api_environment_get_head(auth_user=None, api_core=None, request=None):
 @app.route(u'/environment', methods=[u'GET'])
 @api_method_decorator(api_core, allow_root=True, role=u'admin_platform')
 def api_environment_get(auth_user=None, api_core=None, request=None):
-    u"""Return an array containing the environments (with status) serialized to JSON."""
+    u"""
+    Return an array containing the environments (with status) serialized to JSON.
+
+    The status is retrieved from a snapshot refreshed in background, ``status_date`` is the date of this snapshot.
+    """
     (environments, default) = api_core.get_environments(get_status=True)
-    return ok_200({u'environments': environments, u'default': default}, include_properties=False)
+    return ok_200({u'environments': environments, u'default': default, u'status_date': api_core.get_status_date()},
+                  include_properties=False)
 
 
 @app.route(u'/environment', methods=[u'POST'])
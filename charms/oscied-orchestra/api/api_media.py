@@ -28,6 +28,8 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import flask
 from pytoolbox.encoding import to_bytes
 from pytoolbox.network.http import get_request_data
+from werkzeug import secure_filename
+from oscied_lib.api.utils import send_file_range
 from oscied_lib.models import Media
 
 from server import app, api_method_decorator, api_core, ok_200
@@ -51,6 +53,18 @@ def api_media_head(auth_user=None, api_core=None, request=None):
     return ok_200(api_core.get_medias(**data), include_properties=True)
 
 
+@app.route(u'/media/ids', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_ids(auth_user=None, api_core=None, request=None):
+    u"""
+    Return an array containing the media assets with ids ``ids`` serialized to JSON.
+
+    The media assets are retrieved with one query, the unknown ids are skipped.
+    """
+    data = get_request_data(request, accepted_keys=(u'ids',), qs_only_first_value=True)
+    return ok_200(api_core.get_medias(spec=api_core.ids_spec(data[u'ids'])), include_properties=True)
+
+
 @app.route(u'/media', methods=[u'GET'])
 @api_method_decorator(api_core, allow_any=True)
 def api_media_get(auth_user=None, api_core=None, request=None):
@@ -64,6 +78,44 @@ def api_media_get(auth_user=None, api_core=None, request=None):
     return ok_200(api_core.get_medias(load_fields=True, **data), include_properties=True)
 
 
+@app.route(u'/media/deleted/count', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_deleted_count(auth_user=None, api_core=None, request=None):
+    u"""Return the number of deleted media assets (the tombstones)."""
+    data = get_request_data(request, accepted_keys=api_core.db_count_keys, qs_only_first_value=True, optional=True)
+    return ok_200(api_core.get_medias_count(deleted=True, **data), include_properties=False)
+
+
+@app.route(u'/media/deleted/HEAD', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_deleted_head(auth_user=None, api_core=None, request=None):
+    u"""Return an array containing the informations about the deleted media assets serialized to JSON."""
+    data = get_request_data(request, accepted_keys=api_core.db_find_keys, qs_only_first_value=True, optional=True)
+    return ok_200(api_core.get_medias(deleted=True, **data), include_properties=True)
+
+
+@app.route(u'/media/deleted', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_deleted_get(auth_user=None, api_core=None, request=None):
+    u"""
+    Return an array containing the informations about the deleted media assets serialized to JSON.
+
+    The deleted media assets are kept apart (as tombstones) and are not returned by the other media methods.
+    """
+    data = get_request_data(request, accepted_keys=api_core.db_find_keys, qs_only_first_value=True, optional=True)
+    return ok_200(api_core.get_medias(load_fields=True, deleted=True, **data), include_properties=True)
+
+
+@app.route(u'/media/deleted/id/<id>', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_deleted_id_get(id=None, auth_user=None, api_core=None, request=None):
+    u"""Return the informations about a deleted media asset serialized to JSON."""
+    media = api_core.get_media(spec={u'_id': id}, load_fields=True, deleted=True)
+    if not media:
+        raise IndexError(to_bytes(u'No deleted media asset with id {0}.'.format(id)))
+    return ok_200(media, include_properties=True)
+
+
 @app.route(u'/media', methods=[u'POST'])
 @api_method_decorator(api_core, allow_any=True)
 def api_media_post(auth_user=None, api_core=None, request=None):
@@ -93,6 +145,65 @@ def api_media_post(auth_user=None, api_core=None, request=None):
     return ok_200(media, include_properties=True)
 
 
+# Resumable uploads management -----------------------------------------------------------------------------------------
+
+def get_upload_session(api_core, auth_user, id):
+    session = api_core.get_upload_session(id)
+    if not session:
+        raise IndexError(to_bytes(u'No upload session with id {0}.'.format(id)))
+    if auth_user._id != session[u'user_id']:
+        flask.abort(403, u'You are not allowed to access upload session with id {0}.'.format(id))
+    return session
+
+
+@app.route(u'/media/upload', methods=[u'POST'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_upload_post(auth_user=None, api_core=None, request=None):
+    u"""
+    Create an upload session for a media asset of ``size`` bytes (the chunks are of ``chunk_size`` bytes).
+
+    The chunks are uploaded in any order (and in parallel) to ``/media/upload/id/<id>/chunk/<offset>`` and the media
+    asset is registered by ``/media/upload/id/<id>/commit``. The ``missing`` chunks are listed to resume an upload.
+    """
+    data = get_request_data(request, qs_only_first_value=True)
+    kwargs = {u'chunk_size': data[u'chunk_size']} if u'chunk_size' in data else {}
+    session = api_core.create_upload_session(auth_user._id, secure_filename(data[u'filename']), data[u'size'],
+                                             data[u'metadata'], **kwargs)
+    return ok_200(session, include_properties=False)
+
+
+@app.route(u'/media/upload/id/<id>', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_upload_id_get(id=None, auth_user=None, api_core=None, request=None):
+    u"""Return the informations about an upload session (e.g. the offsets of the missing chunks) serialized to JSON."""
+    return ok_200(get_upload_session(api_core, auth_user, id), include_properties=False)
+
+
+@app.route(u'/media/upload/id/<id>/chunk/<int:offset>', methods=[u'PUT'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_upload_id_chunk_put(id=None, offset=None, auth_user=None, api_core=None, request=None):
+    u"""Upload a chunk (the body of the request) of an upload session, return its size and MD5 checksum."""
+    get_upload_session(api_core, auth_user, id)
+    return ok_200(api_core.upload_chunk(id, offset, request.stream), include_properties=False)
+
+
+@app.route(u'/media/upload/id/<id>/commit', methods=[u'POST'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_upload_id_commit_post(id=None, auth_user=None, api_core=None, request=None):
+    u"""Register the media asset of a completed upload session, see ``POST /media``."""
+    get_upload_session(api_core, auth_user, id)
+    return ok_200(api_core.commit_upload_session(id), include_properties=True)
+
+
+@app.route(u'/media/upload/id/<id>', methods=[u'DELETE'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_upload_id_delete(id=None, auth_user=None, api_core=None, request=None):
+    u"""Abort an upload session and remove the chunks already uploaded."""
+    get_upload_session(api_core, auth_user, id)
+    api_core.delete_upload_session(id)
+    return ok_200(u'The upload session "{0}" has been aborted.'.format(id), include_properties=False)
+
+
 # FIXME why HEAD verb doesn't work (curl: (18) transfer closed with 263 bytes remaining to read) ?
 @app.route(u'/media/id/<id>/HEAD', methods=[u'GET'])
 @api_method_decorator(api_core, allow_any=True)
@@ -119,6 +230,24 @@ def api_media_id_get(id=None, auth_user=None, api_core=None, request=None):
     return ok_200(media, include_properties=True)
 
 
+@app.route(u'/media/id/<id>/download', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_media_id_download(id=None, auth_user=None, api_core=None, request=None):
+    u"""
+    Download a media asset (the file itself).
+
+    HTTP range requests are supported to resume a download. The transfer is handed to the web server (X-Sendfile) when
+    the API is served by Apache, see wsgi.py.
+    """
+    media = api_core.get_media(spec={u'_id': id})
+    if not media:
+        raise IndexError(to_bytes(u'No media asset with id {0}.'.format(id)))
+    if media.status != Media.READY:
+        raise ValueError(to_bytes(u'Media asset with id {0} is not ready (status {1}).'.format(id, media.status)))
+    filename = api_core.config.storage_medias_path(media, generate=False)
+    return send_file_range(request, filename, as_attachment=True, attachment_filename=media.filename)
+
+
 @app.route(u'/media/id/<id>', methods=[u'PATCH', u'PUT'])
 @api_method_decorator(api_core, allow_any=True)
 def api_media_id_patch(id=None, auth_user=None, api_core=None, request=None):
@@ -138,7 +267,11 @@ def api_media_id_patch(id=None, auth_user=None, api_core=None, request=None):
 @app.route(u'/media/id/<id>', methods=[u'DELETE'])
 @api_method_decorator(api_core, allow_any=True)
 def api_media_id_delete(id=None, auth_user=None, api_core=None, request=None):
-    u"""Remove a media asset from the shared storage and update informations about it (set status to DELETED)."""
+    u"""
+    Remove a media asset from the shared storage and update informations about it (set status to DELETED).
+
+    The informations are moved to the deleted media assets, see ``/media/deleted``.
+    """
     media = api_core.get_media(spec={u'_id': id})
     if not media:
         raise IndexError(to_bytes(u'No media asset with id {0}.'.format(id)))
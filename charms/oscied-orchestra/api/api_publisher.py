@@ -113,6 +113,19 @@ def api_publisher_task_head(auth_user=None, api_core=None, request=None):
     return ok_200(api_core.get_publisher_tasks(**data), include_properties=True)
 
 
+@app.route(u'/publisher/task/ids', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_publisher_task_ids(auth_user=None, api_core=None, request=None):
+    u"""
+    Return an array containing the publication tasks with ids ``ids`` serialized to JSON.
+
+    The publication tasks are retrieved with one query, the unknown ids are skipped.
+    The publication tasks attributes are appended with the Celery's ``async result`` of the tasks.
+    """
+    data = get_request_data(request, accepted_keys=(u'ids',), qs_only_first_value=True)
+    return ok_200(api_core.get_publisher_tasks(spec=api_core.ids_spec(data[u'ids'])), include_properties=True)
+
+
 @app.route(u'/publisher/task', methods=[u'GET'])
 @api_method_decorator(api_core, allow_any=True)
 def api_publisher_task_get(auth_user=None, api_core=None, request=None):
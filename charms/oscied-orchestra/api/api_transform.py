@@ -180,6 +180,19 @@ def api_transform_task_head(auth_user=None, api_core=None, request=None):
     return ok_200(api_core.get_transform_tasks(**data), include_properties=True)
 
 
+@app.route(u'/transform/task/ids', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_transform_task_ids(auth_user=None, api_core=None, request=None):
+    u"""
+    Return an array containing the transformation tasks with ids ``ids`` serialized to JSON.
+
+    The transformation tasks are retrieved with one query, the unknown ids are skipped.
+    The transformation tasks attributes are appended with the Celery's ``async result`` of the tasks.
+    """
+    data = get_request_data(request, accepted_keys=(u'ids',), qs_only_first_value=True)
+    return ok_200(api_core.get_transform_tasks(spec=api_core.ids_spec(data[u'ids'])), include_properties=True)
+
+
 @app.route(u'/transform/task', methods=[u'GET'])
 @api_method_decorator(api_core, allow_any=True)
 def api_transform_task_get(auth_user=None, api_core=None, request=None):
@@ -209,6 +222,14 @@ def api_transform_task_post(auth_user=None, api_core=None, request=None):
 
     The orchestrator will automatically add ``add_date`` to ``statistic``.
 
+    The optional ``segment_duration`` (seconds, ffmpeg profiles only) enables the segmented transcoding : The input
+    media asset is split into segments transcoded in parallel by the transformation units of the queue and then
+    concatenated. The ids of the segments tasks are appended to ``statistic`` as ``segments``.
+
+    The optional ``priority`` (an integer, default 0) is appended to ``statistic``. The orchestrator releases the tasks
+    to the transformation units by priority (the highest first) then by fair-share across the users, the tasks wait in
+    the ready queue of the orchestrator (with the PENDING status) until a transformation unit is available.
+
     .. note::
 
         Interesting enhancement would be to :
@@ -219,10 +240,51 @@ def api_transform_task_post(auth_user=None, api_core=None, request=None):
     data = get_request_data(request, qs_only_first_value=True)
     task_id = api_core.launch_transform_task(
         auth_user._id, data[u'media_in_id'], data[u'profile_id'], data[u'filename'], data[u'metadata'],
-        data[u'send_email'], data[u'queue'], u'/transform/callback')
+        data[u'send_email'], data[u'queue'], u'/transform/callback', data.get(u'segment_duration'),
+        data.get(u'priority', 0))
     return ok_200(task_id, include_properties=True)
 
 
+@app.route(u'/transform/task/ladder', methods=[u'POST'])
+@api_method_decorator(api_core, allow_any=True)
+def api_transform_task_ladder_post(auth_user=None, api_core=None, request=None):
+    u"""
+    Launch the transformation tasks of a ladder (e.g. the renditions of an adaptive bitrate streaming).
+
+    The renditions ``outputs`` are a list of ``{profile_id, filename, metadata}``, the profiles must use the ffmpeg
+    encoder. The input media asset is read and decoded only once, by one FFmpeg process encoding all the renditions.
+
+    Return an array containing the transformation tasks (one per rendition), every one is linked to its own output
+    media asset (with the PENDING status) and the ids of the tasks of the ladder are appended to ``statistic`` as
+    ``ladder``. Revoking any task of the ladder revokes all of them. The ladder is scheduled like one transformation
+    task with the optional ``priority``.
+    """
+    data = get_request_data(request, qs_only_first_value=True)
+    tasks = api_core.launch_transform_ladder(
+        auth_user._id, data[u'media_in_id'], data[u'outputs'], data[u'send_email'], data[u'queue'],
+        u'/transform/callback', data.get(u'priority', 0))
+    return ok_200(tasks, include_properties=True)
+
+
+@app.route(u'/transform/task/estimate', methods=[u'POST'])
+@api_method_decorator(api_core, allow_any=True)
+def api_transform_task_estimate_post(auth_user=None, api_core=None, request=None):
+    u"""
+    Estimate the duration and the output size of a transformation task before launching it.
+
+    The estimate is learned from the statistic of the successful transformation tasks with the same profile and it is
+    relative to the duration of the input media asset. The optional ``unit_type`` (e.g. x86_64-8cpu-16gb, see the
+    ``unit_type`` of the statistic of the tasks) restricts the estimate to the tasks done by such transformation units.
+
+    Return ``elapsed_time`` (seconds), ``elapsed_time_range`` (interquartile range), ``media_out_size`` (bytes), the
+    amount of ``samples`` and the ``unit_type`` of the estimate or null if there are not enough samples. The same
+    estimate is appended to ``statistic`` as ``estimate`` when the task is launched.
+    """
+    data = get_request_data(request, qs_only_first_value=True)
+    return ok_200(api_core.estimate_transform_task(data[u'media_in_id'], data[u'profile_id'], data.get(u'unit_type')),
+                  include_properties=False)
+
+
 # FIXME why HEAD verb doesn't work (curl: (18) transfer closed with 263 bytes remaining to read) ?
 @app.route(u'/transform/task/id/<id>/HEAD', methods=[u'GET'])
 @api_method_decorator(api_core, allow_any=True)
@@ -0,0 +1,110 @@
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : ORCHESTRA
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import flask
+from pytoolbox.encoding import to_bytes
+from pytoolbox.network.http import get_request_data
+
+from server import app, api_method_decorator, api_core, ok_200
+
+
+# Workflows management -------------------------------------------------------------------------------------------------
+
+@app.route(u'/workflow/count', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_workflow_count(auth_user=None, api_core=None, request=None):
+    u"""Return the number of workflows."""
+    data = get_request_data(request, accepted_keys=api_core.db_count_keys, qs_only_first_value=True, optional=True)
+    return ok_200(api_core.get_workflows_count(**data), include_properties=False)
+
+
+@app.route(u'/workflow', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_workflow_get(auth_user=None, api_core=None, request=None):
+    u"""
+    Return an array containing the workflows serialized to JSON.
+
+    All ``thing_id`` fields are replaced by corresponding ``thing``.
+    For example ``user_id`` is replaced by ``user``'s data.
+    """
+    data = get_request_data(request, accepted_keys=api_core.db_find_keys, qs_only_first_value=True, optional=True)
+    return ok_200(api_core.get_workflows(load_fields=True, **data), include_properties=True)
+
+
+@app.route(u'/workflow', methods=[u'POST'])
+@api_method_decorator(api_core, allow_any=True)
+def api_workflow_post(auth_user=None, api_core=None, request=None):
+    u"""
+    Launch a workflow, a chain of transformation and publication tasks advanced by the orchestrator itself.
+
+    The ``steps`` are a list of ``{type: transform, profile_id, filename, metadata, queue}`` (with the optional
+    ``segment_duration`` and ``priority``) and ``{type: publish, queue}``, the input media asset of a step is the output
+    media asset of the previous step (the media asset ``media_in_id`` for the first step). For example a transformation
+    followed by the publication of the output media asset.
+
+    The first step is launched immediately and the next steps are launched by the orchestrator when the previous task
+    is successful. The ``status``, the ``task_id``, the ``media_id`` (output media asset) and the ``publish_uri`` of the
+    steps are updated accordingly, the workflow fails at the first failed step.
+    """
+    data = get_request_data(request, qs_only_first_value=True)
+    workflow = api_core.launch_workflow(auth_user._id, data[u'media_in_id'], data[u'steps'], data[u'send_email'],
+                                        u'/transform/callback', u'/publisher/callback')
+    return ok_200(workflow, include_properties=True)
+
+
+@app.route(u'/workflow/id/<id>', methods=[u'GET'])
+@api_method_decorator(api_core, allow_any=True)
+def api_workflow_id_get(id=None, auth_user=None, api_core=None, request=None):
+    u"""
+    Return a workflow serialized to JSON.
+
+    All ``thing_id`` fields are replaced by corresponding ``thing``.
+    For example ``user_id`` is replaced by ``user``'s data.
+    """
+    workflow = api_core.get_workflow(spec={u'_id': id}, load_fields=True)
+    if not workflow:
+        raise IndexError(to_bytes(u'No workflow with id {0}.'.format(id)))
+    return ok_200(workflow, include_properties=True)
+
+
+@app.route(u'/workflow/id/<id>', methods=[u'DELETE'])
+@api_method_decorator(api_core, allow_any=True)
+def api_workflow_id_delete(id=None, auth_user=None, api_core=None, request=None):
+    u"""
+    Revoke a workflow.
+
+    The next steps of the workflow are not launched and its running transformation task is revoked. A running
+    publication task is not revoked, the media asset can be unpublished by revoking the publication task.
+    """
+    workflow = api_core.get_workflow(spec={u'_id': id})
+    if not workflow:
+        raise IndexError(to_bytes(u'No workflow with id {0}.'.format(id)))
+    if auth_user._id != workflow.user_id:
+        flask.abort(403, u'You are not allowed to revoke workflow with id {0}.'.format(id))
+    api_core.revoke_workflow(workflow)
+    return ok_200(u'The workflow "{0}" has been revoked.'.format(workflow._id), include_properties=False)
@@ -1,8 +1,9 @@
 
 from datetime    import datetime, timedelta
-from flask       import request, make_response, send_from_directory, send_file
+from flask       import request, make_response, send_from_directory
 from flask.views import View
 from pytoolbox.serialization import object2json
+from oscied_lib.api.utils import send_file_range
 
 from utils import check_ip, md5Checksum, PlugItRedirect, PlugItSendFile
 
@@ -83,7 +84,8 @@ class ActionView(View):
                 response.headers['EbuIo-PlugIt-Redirect-NoPrefix'] = 'True'
             return response
         elif isinstance(result, PlugItSendFile):
-            response = send_file(result.filename, mimetype=result.mimetype, as_attachment=result.as_attachment, attachment_filename=result.attachment_filename)
+            # Resumable (HTTP range requests) and handed to the web server if X-Sendfile is enabled
+            response = send_file_range(request, result.filename, mimetype=result.mimetype, as_attachment=result.as_attachment, attachment_filename=result.attachment_filename)
             response.headers['EbuIo-PlugIt-ItAFile'] = 'True'
             return response
 
@@ -96,12 +96,18 @@ def configure_plugit_mode():
 CONFIG_FILENAME = join(abspath(dirname(__file__)), LOCAL_CONFIG_FILENAME)
 CSV_DIRECTORY = join(abspath(dirname(__file__)), u'mock')
 HELP_MOCK = u'Mock the MongoDB driver with MongoMock ([WARNING] Still not a perfect mock of the real-one)'
+HELP_PROCESSES = u'Serve the requests with forked worker processes (production runtime is Apache mod_wsgi, see wsgi.py)'
+HELP_THREADED = u'Serve the requests with threads (production runtime is Apache mod_wsgi, see wsgi.py)'
 
 try:
     configure_unicode()
     parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter, epilog=ABOUT)
     parser.add_argument(u'-m', u'--mock', action=u'store_true', help=HELP_MOCK, default=False)
+    parser.add_argument(u'-p', u'--processes', type=int, help=HELP_PROCESSES, default=1)
+    parser.add_argument(u'-t', u'--threaded', action=u'store_true', help=HELP_THREADED, default=False)
     args = parser.parse_args()
+    if args.processes > 1 and args.threaded:
+        parser.error(u'The server cannot be both multi-process and multi-threaded (--processes > 1 and --threaded).')
 
     if args.mock:
         local_config = ORCHESTRA_CONFIG_TEST
@@ -133,6 +139,7 @@ try:
     from api_publisher import *
     from api_transform import *
     from api_user import *
+    from api_workflow import *
     if not is_standalone:
         import plugit, views
         plugit.load_actions(views)
@@ -140,10 +147,11 @@ try:
     #print(u'Flask URLs Map :\n{0}'.format(app.url_map))
 
     if __name__ == u'__main__':
+        options = {u'debug': api_core.config.verbose, u'processes': args.processes, u'threaded': args.threaded}
         if is_standalone:
-            app.run(host=u'0.0.0.0', debug=api_core.config.verbose)
+            app.run(host=u'0.0.0.0', **options)
         else:
-            app.run(debug=api_core.config.verbose)
+            app.run(**options)
 
 except Exception as error:
     logging.exception(error)
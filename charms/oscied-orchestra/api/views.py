@@ -116,6 +116,91 @@ def upload_media(request):
         return {u'errors': [unicode(e)]}
 
 
+@action(route=u'/upload_files/session', methods=[u'POST'])
+@only_logged_user()
+@user_info(props=[u'pk'])
+@json_only()
+def upload_session(request):
+    u"""Create an upload session to upload a media asset by chunks (resumable and parallel uploads)."""
+    try:
+        auth_user = request.args.get(u'ebuio_u_pk') or request.form.get(u'ebuio_u_pk')
+        data = get_request_data(request, qs_only_first_value=True)
+        session = api_core.create_upload_session(auth_user, secure_filename(data[u'filename']), data[u'size'],
+                                                 {u'title': data.get(u'title', u'')})
+        return {u'session': session}
+    except Exception as e:
+        logging.exception(e)
+        return {u'errors': [unicode(e)]}
+
+
+def get_upload_session(request, id):
+    auth_user = request.args.get(u'ebuio_u_pk') or request.form.get(u'ebuio_u_pk')
+    session = api_core.get_upload_session(id)
+    if not session:
+        raise IndexError(u'No upload session with id {0}.'.format(id))
+    if auth_user != session[u'user_id']:
+        raise ValueError(u'You are not allowed to access upload session with id {0}.'.format(id))
+    return session
+
+
+@action(route=u'/upload_files/session/<id>', methods=[u'GET'])
+@only_logged_user()
+@user_info(props=[u'pk'])
+@json_only()
+def upload_session_get(request, id):
+    u"""Return an upload session, the offsets of the ``missing`` chunks are used to resume an upload."""
+    try:
+        return {u'session': get_upload_session(request, id)}
+    except Exception as e:
+        logging.exception(e)
+        return {u'errors': [unicode(e)]}
+
+
+@action(route=u'/upload_files/session/<id>/chunk/<int:offset>', methods=[u'POST'])
+@only_logged_user()
+@user_info(props=[u'pk'])
+@json_only()
+def upload_session_chunk(request, id, offset):
+    u"""Upload a chunk of a media asset, the chunk is written straight into the uploads directory."""
+    try:
+        get_upload_session(request, id)
+        chunk = request.files.get(u'chunk')
+        return {u'chunk': api_core.upload_chunk(id, offset, chunk.stream if chunk else request.stream)}
+    except Exception as e:
+        logging.exception(e)
+        return {u'errors': [unicode(e)]}
+
+
+@action(route=u'/upload_files/session/<id>/commit', methods=[u'POST'])
+@only_logged_user()
+@user_info(props=[u'pk'])
+@json_only()
+def upload_session_commit(request, id):
+    u"""Register the media asset of a completed upload session."""
+    try:
+        get_upload_session(request, id)
+        media = api_core.commit_upload_session(id)
+        return {u'infos': [u'The media asset "{0}" has been uploaded.'.format(media.metadata[u'title'])]}
+    except Exception as e:
+        logging.exception(e)
+        return {u'errors': [unicode(e)]}
+
+
+@action(route=u'/upload_files/session/<id>', methods=[u'DELETE'])
+@only_logged_user()
+@user_info(props=[u'pk'])
+@json_only()
+def upload_session_delete(request, id):
+    u"""Abort an upload session."""
+    try:
+        get_upload_session(request, id)
+        api_core.delete_upload_session(id)
+        return {u'infos': [u'The upload has been aborted.']}
+    except Exception as e:
+        logging.exception(e)
+        return {u'errors': [unicode(e)]}
+
+
 @action(route=u'/medias/delete/<id>', methods=[u'DELETE'])
 @only_logged_user()
 @user_info(props=[u'pk'])
@@ -24,6 +24,13 @@
 #
 # Retrieved from https://github.com/ebu/OSCIED
 
+# Entry point of the API served by Apache mod_wsgi in daemon mode, the worker processes and threads are configured by
+# the charm (see options api_processes and api_threads) and every worker process connects to MongoDB on its own.
+
 import os
 os.chdir(os.path.dirname(__file__))
-from server import app as application
+from server import app as application, local_config
+
+# Media assets downloads are sent by Apache mod_xsendfile (range requests included) only if the charm enabled the
+# module, see send_file_range
+application.config[u'USE_X_SENDFILE'] = local_config.api_x_sendfile
@@ -26,7 +26,7 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import os, re, shutil, socket, time
+import multiprocessing, os, re, shutil, socket, time
 from codecs import open
 from configobj import ConfigObj
 from os.path import abspath, dirname, exists, join
@@ -44,8 +44,8 @@ from .hooks_base import CharmHooks_Storage
 class OrchestraHooks(CharmHooks_Storage):
 
     PPAS = (u'ppa:smarter/ffmpeg', u'ppa:juju/stable')
-    PACKAGES = tuple(set(CharmHooks_Storage.PACKAGES + (u'apache2', u'ffmpeg', u'libapache2-mod-wsgi', u'mongodb',
-                     u'ntp', u'rabbitmq-server', u'x264')))
+    PACKAGES = tuple(set(CharmHooks_Storage.PACKAGES + (u'apache2', u'ffmpeg', u'libapache2-mod-wsgi',
+                     u'libapache2-mod-xsendfile', u'mongodb', u'ntp', u'rabbitmq-server', u'x264')))
     FIX_PACKAGES = (u'apache2.2-common',)
     JUJU_PACKAGES = (u'juju-core',)
 
@@ -146,11 +146,16 @@ class OrchestraHooks(CharmHooks_Storage):
         chown(local_cfg.ssh_config_path, DAEMON_USER, DAEMON_GROUP, recursive=True)
 
         self.info(u'Configure Apache 2')
+        processes = cfg.api_processes or multiprocessing.cpu_count()
+        self.remark(u'The API is served by {0} processes of {1} threads'.format(processes, cfg.api_threads))
         self.template2config(local_cfg.htaccess_template_file, local_cfg.htaccess_config_file, {})
         self.template2config(local_cfg.site_template_file, join(local_cfg.sites_available_path, site_file), {
             u'alias': self.api_alias, u'directory': local_cfg.site_directory, u'domain': self.public_address,
+            u'processes': processes, u'storage': local_cfg.storage_path, u'threads': cfg.api_threads,
             u'wsgi': local_cfg.api_wsgi
         })
+        self.cmd(u'a2enmod xsendfile')
+        local_cfg.api_x_sendfile = True  # The downloads of the media assets are sent by Apache, see send_file_range
         self.cmd(u'a2dissite 000-default')
         self.cmd(u'a2ensite {0}'.format(site_file))
 
@@ -202,6 +207,17 @@ class OrchestraHooks(CharmHooks_Storage):
         local_cfg.email_username = cfg.email_username
         local_cfg.email_password = cfg.email_password
         local_cfg.plugit_api_url = cfg.plugit_api_url
+        local_cfg.transform_capacity = cfg.transform_capacity
+        local_cfg.transform_weights = {}
+        for item in (i.strip() for i in cfg.transform_weights.split(u',') if i.strip()):
+            try:
+                user_id, weight = (value.strip() for value in item.split(u'='))
+                if not user_id or float(weight) <= 0:
+                    raise ValueError(to_bytes(u'Weight must be a positive number.'))
+                local_cfg.transform_weights[user_id] = float(weight)
+            except ValueError:
+                self.remark(u'Ignore invalid transformation weight {0}, format is user_id=weight'.format(item))
+        local_cfg.transform_reap_delay = cfg.transform_reap_delay
         self.remark(u'Orchestrator successfully configured')
 
         self.info(u'Symlink charms default directory to directory for release {0}'.format(cfg.charms_release))
@@ -212,6 +228,9 @@ class OrchestraHooks(CharmHooks_Storage):
 
         self.storage_remount()
 
+        self.info(u'Gracefully reload the worker processes of the API (if running)')
+        self.cmd(u'service apache2 reload', fail=False)
+
     def hook_uninstall(self):
         self.info(u'Uninstall prerequisities, unregister service and load default configuration')
         self.hook_stop()
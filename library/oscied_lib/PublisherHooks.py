@@ -88,6 +88,7 @@ class PublisherHooks(CharmHooks_Storage, CharmHooks_Subordinate, CharmHooks_Webs
         self.template2config(local_cfg.site_template_file,     local_cfg.site_file, infos)
         self.template2config(local_cfg.site_ssl_template_file, local_cfg.site_ssl_file, infos)
         local_cfg.www_root_path = cfg.www_root_path
+        local_cfg.publish_mode = cfg.publish_mode
         self.storage_remount()
         self.subordinate_register()
 
@@ -25,19 +25,20 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import shutil, time
+import time
 from celery import current_task
 from celery.decorators import task
 from os.path import dirname
 from pytoolbox.datetime import datetime_now
 from pytoolbox.encoding import configure_unicode, to_bytes
-from pytoolbox.filesystem import recursive_copy
 from pytoolbox.serialization import object2json
 from pytoolbox.validation import valid_uri
 
 from .config import PublisherLocalConfig
 from .constants import LOCAL_CONFIG_FILENAME
+from .copier import publish_tree, remove_tree
 from .models import Media, PublisherTask
+from .progress import ProgressPublisher
 from .utils import Callback
 
 
@@ -47,7 +48,7 @@ configure_unicode()
 def publisher_task(media_json, callback_json):
 
     def copy_callback(start_date, elapsed_time, eta_time, src_size, dst_size, ratio):
-        publisher_task.update_state(state=PublisherTask.PROGRESS, meta={
+        progress.publish(request.id, PublisherTask.PROGRESS, {
             u'hostname': request.hostname, u'start_date': start_date, u'elapsed_time': elapsed_time,
             u'eta_time': eta_time, u'media_size': src_size, u'publish_size': dst_size, u'percent': int(100 * ratio)})
 
@@ -64,20 +65,21 @@ def publisher_task(media_json, callback_json):
 
     # ------------------------------------------------------------------------------------------------------------------
 
-    RATIO_DELTA = 0.01  # Update status if at least 1% of progress
-    TIME_DELTA = 1      # Update status if at least 1 second(s) elapsed
-
     # Avoid 'referenced before assignment'
-    callback = publish_root = None
+    callback = progress = publish_root = None
     request = current_task.request
 
     try:
         # Let's the task begin !
         print(u'{0} Publication task started'.format(request.id))
 
-        # Read current configuration to translate files URIs to local paths
-        local_config = PublisherLocalConfig.read(LOCAL_CONFIG_FILENAME, inspect_constructor=False)
-        print(object2json(local_config, include_properties=True))
+        # Read current configuration to translate files URIs to local paths (cached, read again if modified)
+        local_config = PublisherLocalConfig.read_cached(LOCAL_CONFIG_FILENAME, inspect_constructor=False)
+        if local_config.verbose:
+            print(object2json(local_config, include_properties=True))
+
+        # Progress updates are coalesced and written in batches (see progress_* options of the charm)
+        progress = ProgressPublisher.get_instance(publisher_task.backend.database, local_config)
 
         # Load and check task parameters
         callback = Callback.from_json(callback_json, inspect_constructor=True)
@@ -98,23 +100,28 @@ def publisher_task(media_json, callback_json):
         publish_path, publish_uri = local_config.publish_point(media)
         media_root, publish_root = dirname(media_path), dirname(publish_path)
 
-        infos = recursive_copy(media_root, publish_root, copy_callback, RATIO_DELTA, TIME_DELTA)
+        infos = publish_tree(media_root, publish_root, local_config.publish_mode, copy_callback,
+                             local_config.progress_ratio_delta, local_config.progress_time_delta)
         if not valid_uri(publish_uri, check_404=True):
             raise IOError(to_bytes(u'Media asset is unreachable from publication URI {0}'.format(publish_uri)))
 
         # Here all seem okay
         print(u'{0} Publication task successful, media asset published as {1}'.format(request.id, publish_uri))
+        statistic = {u'hostname': request.hostname, u'start_date': infos[u'start_date'],
+                     u'elapsed_time': infos[u'elapsed_time'], u'eta_time': 0, u'media_size': infos[u'src_size'],
+                     u'publish_size': infos[u'src_size'], u'publish_mode': infos[u'mode'], u'percent': 100}
+        progress.finish(request.id, PublisherTask.SUCCESS, statistic)
         publish_callback(PublisherTask.SUCCESS, publish_uri)
-        return {u'hostname': request.hostname, u'start_date': infos[u'start_date'],
-                u'elapsed_time': infos[u'elapsed_time'], u'eta_time': 0, u'media_size': infos[u'src_size'],
-                u'publish_size': infos[u'src_size'], u'percent': 100}
+        return statistic
 
     except Exception as error:
 
         # Here something went wrong
         print(u'{0} Publication task failed'.format(request.id))
         if publish_root:
-            shutil.rmtree(publish_root, ignore_errors=True)
+            remove_tree(publish_root)
+        if progress:
+            progress.finish(request.id, PublisherTask.FAILURE, {u'hostname': request.hostname})
         publish_callback(unicode(error), None)
         raise
 
@@ -142,9 +149,10 @@ def revoke_publisher_task(publish_uri, callback_json):
         # Let's the task begin !
         print(u'{0} Revoke publication task started'.format(request.id))
 
-        # Read current configuration to translate files URIs to local paths
-        local_config = PublisherLocalConfig.read(LOCAL_CONFIG_FILENAME, inspect_constructor=False)
-        print(object2json(local_config, True))
+        # Read current configuration to translate files URIs to local paths (cached, read again if modified)
+        local_config = PublisherLocalConfig.read_cached(LOCAL_CONFIG_FILENAME, inspect_constructor=False)
+        if local_config.verbose:
+            print(object2json(local_config, True))
 
         # Load and check task parameters
         callback = Callback.from_json(callback_json, inspect_constructor=True)
@@ -158,9 +166,9 @@ def revoke_publisher_task(publish_uri, callback_json):
         if not publish_root:
             raise ValueError(to_bytes(u'Media asset is not hosted on this publication point.'))
 
-        # Remove publication directory
+        # Remove publication directory (or symbolic link, the media asset is not removed)
         start_date, start_time = datetime_now(), time.time()
-        shutil.rmtree(publish_root, ignore_errors=True)
+        remove_tree(publish_root)
         if valid_uri(publish_uri, check_404=True):
             raise IOError(to_bytes(u'Media asset is reachable from publication URI {0}'.format(publish_uri)))
         elapsed_time = time.time() - start_time
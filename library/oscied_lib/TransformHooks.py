@@ -27,12 +27,12 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 from os.path import abspath, dirname, exists, join
-from pytoolbox.filesystem import first_that_exist
+from pytoolbox.filesystem import chown, first_that_exist, try_makedirs
 from pytoolbox.juju import  CONFIG_FILENAME, METADATA_FILENAME, DEFAULT_OS_ENV
 from pytoolbox.subprocess import make
 
 from .config import TransformLocalConfig
-from .constants import LOCAL_CONFIG_FILENAME
+from .constants import DAEMON_GROUP, DAEMON_USER, LOCAL_CONFIG_FILENAME
 from .hooks_base import CharmHooks_Storage, CharmHooks_Subordinate
 
 
@@ -101,6 +101,21 @@ class TransformHooks(CharmHooks_Storage, CharmHooks_Subordinate):
             self.cmd(u'apt-get -y install gpac')
 
     def hook_config_changed(self):
+        cfg, local_cfg = self.config, self.local_config
+        self.info(u'Configure the local cache of the media assets and the scratch space')
+        local_cfg.cache_max_size = cfg.cache_max_size * 1024 * 1024
+        local_cfg.scratch_path = cfg.scratch_path
+        self.info(u'Configure the CPU budget and the priorities of the encoders')
+        local_cfg.cpu_budget = cfg.cpu_budget
+        local_cfg.cpu_affinity = cfg.cpu_affinity
+        local_cfg.encoder_nice = cfg.encoder_nice
+        local_cfg.encoder_ionice_class = cfg.encoder_ionice_class
+        local_cfg.encoder_stall_timeout = cfg.encoder_stall_timeout
+        local_cfg.encoder_kill_timeout = cfg.encoder_kill_timeout
+        for path in (local_cfg.cache_path, local_cfg.scratch_path, local_cfg.cpu_budget_path):
+            if path:
+                try_makedirs(path)
+                chown(path, DAEMON_USER, DAEMON_GROUP, recursive=True)
         self.storage_remount()
         self.subordinate_register()
 
@@ -25,34 +25,138 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import os, re, select, shlex, time, uuid
+import json, os, re, shlex, shutil, time, uuid
 from celery import current_task
 from celery.decorators import task
 from codecs import open
+from datetime import timedelta
 from os.path import dirname, exists
 from pytoolbox.datetime import datetime_now, total_seconds
 from pytoolbox.encoding import configure_unicode, to_bytes
 from pytoolbox.ffmpeg import get_media_duration, get_media_tracks
-from pytoolbox.filesystem import get_size, recursive_copy, try_makedirs, try_remove
+from pytoolbox.filesystem import get_size, try_makedirs, try_remove
 from pytoolbox.serialization import object2json
-from pytoolbox.subprocess import make_async, read_async
-from subprocess import Popen, PIPE
 
+from .cache import MediaCache, atomic_move
 from .config import TransformLocalConfig
 from .constants import LOCAL_CONFIG_FILENAME
+from .copier import recursive_copy
+from .encoders import (CpuBudget, EncoderSupervisor, FFmpegProgressParser, OutputSizeTracker, PhaseTimer,
+                       RingBuffer)
 from .models import Media, TransformProfile, TransformTask
-from .utils import Callback
+from .progress import ProgressPublisher
+from .utils import Callback, get_unit_type
 
 
 configure_unicode()
 
-DASHCAST_REGEX = re.compile(r'Read video frame (?P<frame>\d+)')
+DASHCAST_REGEX = re.compile(r'Read video frame (\d+)')
 DASHCAST_SUCCESS_REGEX = re.compile(r'MPD file generated')
+DASHCAST_TIMEOUT_TIME = 10
+ENCODER_OUT_SIZE = 64 * 1024  # Keep (and report on error) the last 64 KB of the output of the encoder.
+SEGMENTS_PATH = u'segments'   # Directory of the segments (output media asset directory) of a segmented transcode.
+
+
+def post_callback(callback, task_id, status):
+    data_json = object2json({u'task_id': task_id, u'status': status}, include_properties=False)
+    if callback is None:
+        print(u'{0} [ERROR] Unable to callback orchestrator: {1}'.format(task_id, data_json))
+    else:
+        r = callback.post(data_json)
+        print(u'{0} Code {1} {2} : {3}'.format(task_id, r.status_code, r.reason, r._content))
+
+
+def ffmpeg_encode(cmd, duration, parser, progress_callback, budget, config, tracker=None):
+    u"""
+    Execute the FFmpeg command ``cmd`` and return its supervisor (with the return code and the resources used by
+    FFmpeg), the output is fed to ``parser``.
+
+    The ``progress_callback(ratio, stats)`` is called for every progress line, the ratio is relative to ``duration``
+    (in seconds). The priorities and the CPUs of the encoder are managed by the CPU ``budget``. FFmpeg is killed if
+    neither its time nor the size of its output (``tracker``) progressed during ``encoder_stall_timeout`` seconds.
+    """
+    print(cmd)
+    state = {u'ratio': 0.0, u'time': None}
+
+    def handler(stdout, stderr):
+        stats = parser.feed(stderr)
+        if not stats:
+            return False
+        try:
+            ratio = total_seconds(stats[u'time']) / duration
+            state[u'ratio'] = 0.0 if ratio < 0.0 else 1.0 if ratio > 1.0 else ratio
+        except ZeroDivisionError:
+            state[u'ratio'] = 1.0
+        except (TypeError, ValueError):
+            pass  # Time is not available (N/A) at the beginning of some encodings
+        progress_callback(state[u'ratio'], stats)
+        progressed, state[u'time'] = stats[u'time'] != state[u'time'], stats[u'time']
+        return progressed
+
+    encoder = EncoderSupervisor.from_config(shlex.split(cmd), handler, config, tracker=tracker, budget=budget)
+    encoder.run()
+    if encoder.stalled:
+        raise OSError(to_bytes(u'FFmpeg stalled during {0} seconds and was killed.'.format(encoder.stall_timeout)))
+    return encoder
+
+
+def cache_media_in(local_config, media_in, media_in_path):
+    u"""Return the path of the input media asset (in the local cache if enabled) and the statistic of the cache."""
+    cache = MediaCache.get_instance(local_config)
+    if cache is None:
+        return media_in_path, {}
+    path, hit = cache.get(media_in._id, media_in_path)
+    return path, {u'cache_hit': hit, u'cache_bytes_saved': os.path.getsize(path) if hit else 0,
+                  u'cache_hit_ratio': cache.hit_ratio}
+
+
+def get_encode_path(local_config, media_out_path):
+    u"""Return the path where to encode the output media asset (in the local scratch space if enabled)."""
+    if not local_config.scratch_path:
+        return media_out_path
+    try_makedirs(local_config.scratch_path)
+    return os.path.join(local_config.scratch_path, u'{0}{1}'.format(uuid.uuid4(), os.path.splitext(media_out_path)[1]))
+
+
+def get_segment_path(media_out_path, index):
+    u"""Return the path of the segment ``index`` of a segmented transcode (same format as the output media asset)."""
+    return os.path.join(dirname(media_out_path), SEGMENTS_PATH,
+                        u'{0:05d}{1}'.format(index, os.path.splitext(media_out_path)[1]))
+
+
+def get_checkpoint(segment_path):
+    u"""
+    Return the statistic of the checkpoint of a segment (transcoded and recorded on the shared storage) or None.
+
+    The checkpoint is ignored if the segment is missing or if its size does not match the one of the checkpoint.
+    """
+    try:
+        with open(segment_path + u'.json', u'r', u'utf-8') as f:
+            statistic = json.load(f)
+        return statistic if os.path.getsize(segment_path) == statistic[u'media_out_size'] else None
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+
+def save_checkpoint(segment_path, statistic):
+    u"""Record the checkpoint of a segment on the shared storage, the segment must be complete (moved in place)."""
+    temporary_path = segment_path + u'.json.tmp'
+    with open(temporary_path, u'w', u'utf-8') as f:
+        f.write(object2json(statistic, include_properties=False))
+    os.rename(temporary_path, segment_path + u'.json')
+
+
+def get_wasted_time(progress, id):
+    u"""
+    Return the time spent by the previous attempts of the task (or of the part of a task) ``id`` for nothing.
 
-# frame= 2071 fps=  0 q=-1.0 size=   34623kB time=00:01:25.89 bitrate=3302.3kbits/s
-FFMPEG_REGEX = re.compile(
-    r'frame=\s*(?P<frame>\d+)\s+fps=\s*(?P<fps>\d+)\s+q=\s*(?P<q>\S+)\s+\S*size=\s*(?P<size>\S+)\s+'
-    r'time=\s*(?P<time>\S+)\s+bitrate=\s*(?P<bitrate>\S+)')
+    The progress of an attempt lost with its worker (the task is delivered again) or failed (the task is retried) is the
+    last progress published by the attempt.
+    """
+    document = progress.get(id)
+    if not document or document[u'state'] == TransformTask.SUCCESS:
+        return 0
+    return document[u'meta'].get(u'wasted_time', 0) + document[u'meta'].get(u'elapsed_time', 0)
 
 
 #@celeryd_after_setup.connect
@@ -64,40 +168,44 @@ FFMPEG_REGEX = re.compile(
 #    print(kwargs)
 
 
-@task(name=u'TransformWorker.transform_task')
+@task(name=u'TransformWorker.transform_task', acks_late=True)
 def transform_task(media_in_json, media_out_json, profile_json, callback_json):
+    u"""
+    Transform the input media asset into the output media asset with the given profile.
+
+    The message is acknowledged once the task is done, a task lost with its worker is delivered again to any unit and
+    starts from scratch (use a segmented transcode to resume from checkpoints), the time spent for nothing is
+    accounted into the statistic as ``wasted_time``.
+    """
 
     def copy_callback(start_date, elapsed_time, eta_time, src_size, dst_size, ratio):
-        transform_task.update_state(state=TransformTask.PROGRESS, meta={
+        progress.publish(request.id, TransformTask.PROGRESS, {
             u'hostname': request.hostname, 'start_date': start_date, u'elapsed_time': elapsed_time,
             u'eta_time': eta_time, u'media_in_size': src_size, u'media_out_size': dst_size,
-            u'percent': int(100 * ratio)})
+            u'percent': int(100 * ratio), u'wasted_time': wasted_time})
 
     def transform_callback(status):
-        data_json = object2json({u'task_id': request.id, u'status': status}, include_properties=False)
-        if callback is None:
-            print(u'{0} [ERROR] Unable to callback orchestrator: {1}'.format(request.id, data_json))
-        else:
-            r = callback.post(data_json)
-            print(u'{0} Code {1} {2} : {3}'.format(request.id, r.status_code, r.reason, r._content))
+        post_callback(callback, request.id, status)
 
     # ------------------------------------------------------------------------------------------------------------------
 
-    RATIO_DELTA, TIME_DELTA = 0.01, 1  # Update status if at least 1% of progress and 1 second elapsed.
-    MAX_TIME_DELTA = 5                 # Also ensure status update every 5 seconds.
-    DASHCAST_TIMEOUT_TIME = 10
-
     try:
         # Avoid 'referenced before assignment'
-        callback = dashcast_conf = None
-        encoder_out, request = u'', current_task.request
+        budget = callback = dashcast_conf = encode_path = progress = None
+        cache_statistic, phases, resources = {}, PhaseTimer(), {}
+        encoder_out, request, wasted_time = u'', current_task.request, 0
 
         # Let's the task begin !
         print(u'{0} Transformation task started'.format(request.id))
 
-        # Read current configuration to translate files uri to local paths
-        local_config = TransformLocalConfig.read(LOCAL_CONFIG_FILENAME, inspect_constructor=False)
-        print(object2json(local_config, include_properties=True))
+        # Read current configuration to translate files uri to local paths (cached, read again if modified)
+        local_config = TransformLocalConfig.read_cached(LOCAL_CONFIG_FILENAME, inspect_constructor=False)
+        if local_config.verbose:
+            print(object2json(local_config, include_properties=True))
+
+        # Progress updates are coalesced and written in batches (see progress_* options of the charm)
+        progress = ProgressPublisher.get_instance(transform_task.backend.database, local_config)
+        wasted_time = get_wasted_time(progress, request.id)
 
         # Load and check task parameters
         callback = Callback.from_json(callback_json, inspect_constructor=True)
@@ -128,11 +236,15 @@ def transform_task(media_in_json, media_out_json, profile_json, callback_json):
         try_makedirs(media_out_root)
 
         # Get input media duration and frames to be able to estimate ETA
+        phases.start(u'probe')
         media_in_duration = get_media_duration(media_in_path)
+        phases.start(u'encode')
 
         # NOT A REAL TRANSFORM : FILE COPY -----------------------------------------------------------------------------
         if profile.encoder_name == u'copy':
-            infos = recursive_copy(media_in_root, media_out_root, copy_callback, RATIO_DELTA, TIME_DELTA)
+            # The media assets are never modified in place, the files are hard linked if on the same file-system
+            infos = recursive_copy(media_in_root, media_out_root, copy_callback, local_config.progress_ratio_delta,
+                                   local_config.progress_time_delta, link=True)
             media_out_tmp = media_in_path.replace(media_in_root, media_out_root)
             os.rename(media_out_tmp, media_out_path)
             start_date = infos[u'start_date']
@@ -143,58 +255,52 @@ def transform_task(media_in_json, media_out_json, profile_json, callback_json):
         elif profile.encoder_name == u'ffmpeg':
 
             start_date, start_time = datetime_now(), time.time()
-            prev_ratio = prev_time = 0
 
             # Get input media size to be able to estimate ETA
             media_in_size = get_size(media_in_root)
+            parser = FFmpegProgressParser(log_size=ENCODER_OUT_SIZE)
+            encoder_out = parser.log
 
-            # Create FFmpeg subprocess
-            cmd = u'ffmpeg -y -i "{0}" {1} "{2}"'.format(media_in_path, profile.encoder_string, media_out_path)
-            print(cmd)
-            ffmpeg = Popen(shlex.split(cmd), stderr=PIPE, close_fds=True)
-            make_async(ffmpeg.stderr)
-
-            while True:
-                # Wait for data to become available
-                select.select([ffmpeg.stderr], [], [])
-                chunk = ffmpeg.stderr.read()
-                encoder_out += chunk
+            # Read the input from the local cache and encode to the local scratch space (if enabled)
+            media_in_local_path, cache_statistic = cache_media_in(local_config, media_in, media_in_path)
+            encode_path = get_encode_path(local_config, media_out_path)
+            media_out_tracker = OutputSizeTracker(encode_path)
+
+            def ffmpeg_callback(ratio, stats):
                 elapsed_time = time.time() - start_time
-                match = FFMPEG_REGEX.match(chunk)
-                if match:
-                    stats = match.groupdict()
-                    media_out_duration = stats[u'time']
-                    try:
-                        ratio = total_seconds(media_out_duration) / total_seconds(media_in_duration)
-                        ratio = 0.0 if ratio < 0.0 else 1.0 if ratio > 1.0 else ratio
-                    except ZeroDivisionError:
-                        ratio = 1.0
-                    delta_time = elapsed_time - prev_time
-                    if (ratio - prev_ratio > RATIO_DELTA and delta_time > TIME_DELTA) or delta_time > MAX_TIME_DELTA:
-                        prev_ratio, prev_time = ratio, elapsed_time
-                        eta_time = int(elapsed_time * (1.0 - ratio) / ratio) if ratio > 0 else 0
-                        transform_task.update_state(
-                            state=TransformTask.PROGRESS,
-                            meta={u'hostname': request.hostname,
-                                  u'start_date': start_date,
-                                  u'elapsed_time': elapsed_time,
-                                  u'eta_time': eta_time,
-                                  u'media_in_size': media_in_size,
-                                  u'media_in_duration': media_in_duration,
-                                  u'media_out_size': get_size(media_out_root),
-                                  u'media_out_duration': media_out_duration,
-                                  u'percent': int(100 * ratio),
-                                  u'encoding_frame': stats[u'frame'],
-                                  u'encoding_fps': stats[u'fps'],
-                                  u'encoding_bitrate': stats[u'bitrate'],
-                                  u'encoding_quality': stats[u'q']})
-                returncode = ffmpeg.poll()
-                if returncode is not None:
-                    break
+                if progress.accept(request.id, ratio, elapsed_time):
+                    eta_time = int(elapsed_time * (1.0 - ratio) / ratio) if ratio > 0 else 0
+                    progress.publish(request.id, TransformTask.PROGRESS,
+                                     {u'hostname': request.hostname,
+                                      u'start_date': start_date,
+                                      u'elapsed_time': elapsed_time,
+                                      u'eta_time': eta_time,
+                                      u'media_in_size': media_in_size,
+                                      u'media_in_duration': media_in_duration,
+                                      u'media_out_size': media_out_tracker.update(),
+                                      u'media_out_duration': stats[u'time'],
+                                      u'percent': int(100 * ratio),
+                                      u'encoding_frame': stats[u'frame'],
+                                      u'encoding_fps': stats[u'fps'],
+                                      u'encoding_bitrate': stats[u'bitrate'],
+                                      u'encoding_quality': stats[u'q'],
+                                      u'wasted_time': wasted_time})
+
+            # Create FFmpeg subprocess
+            with CpuBudget.from_config(local_config) as budget:
+                cmd = u'ffmpeg -y -i "{0}" {1} "{2}"'.format(media_in_local_path,
+                                                             budget.encoder_string(profile.encoder_string), encode_path)
+                encoder = ffmpeg_encode(cmd, total_seconds(media_in_duration), parser, ffmpeg_callback, budget,
+                                        local_config, media_out_tracker)
+                returncode, resources = encoder.returncode, encoder.resources
 
             # FFmpeg output sanity check
             if returncode != 0:
                 raise OSError(to_bytes(u'FFmpeg return code is {0}, encoding probably failed.'.format(returncode)))
+            phases.start(u'finalize')
+            if encode_path != media_out_path:
+                atomic_move(encode_path, media_out_path)
+            elapsed_time = time.time() - start_time
 
             # Output media file sanity check
 #            media_out_duration = get_media_duration(media_out_path)
@@ -205,7 +311,6 @@ def transform_task(media_in_json, media_out_json, profile_json, callback_json):
         elif profile.encoder_name == u'dashcast':
 
             start_date, start_time = datetime_now(), time.time()
-            prev_ratio = prev_time = 0
 
             # Get input media size and frames to be able to estimate ETA
             media_in_size = get_size(media_in_root)
@@ -222,71 +327,363 @@ def transform_task(media_in_json, media_out_json, profile_json, callback_json):
             cmd = u'DashCast -conf {0} -av "{1}" {2} -out "{3}" -mpd "{4}"'.format(
                 dashcast_conf, media_in_path, profile.dash_options, media_out_root, media_out.filename)
             print(cmd)
-            dashcast = Popen(shlex.split(cmd), stdout=PIPE, stderr=PIPE, close_fds=True)
-            make_async(dashcast.stdout.fileno())
-            make_async(dashcast.stderr.fileno())
-
-            while True:
-                # Wait for data to become available
-                select.select([dashcast.stdout.fileno()], [], [])
-                stdout, stderr = read_async(dashcast.stdout), read_async(dashcast.stderr)
+            budget = CpuBudget.from_config(local_config)
+            budget.register()
+            media_out_tracker = OutputSizeTracker(media_out_root, directory=True)
+            encoder_out = RingBuffer(ENCODER_OUT_SIZE)
+            state = {u'frames': 0}
+
+            def dashcast_handler(stdout, stderr):
+                stdout, stderr = stdout.decode(u'utf-8', u'replace'), stderr.decode(u'utf-8', u'replace')
+                encoder_out.append(stdout)
+                encoder_out.append(stderr)
+                if DASHCAST_SUCCESS_REGEX.search(stdout):
+                    encoder.finish()  # DashCast may stay alive once the MPD is generated
                 elapsed_time = time.time() - start_time
-                match = DASHCAST_REGEX.match(stdout)
-                if match:
-                    stats = match.groupdict()
-                    media_out_frames = int(stats[u'frame'])
-                    try:
-                        ratio = float(media_out_frames) / media_in_frames
-                        ratio = 0.0 if ratio < 0.0 else 1.0 if ratio > 1.0 else ratio
-                    except ZeroDivisionError:
-                        ratio = 1.0
-                    delta_time = elapsed_time - prev_time
-                    if (ratio - prev_ratio > RATIO_DELTA and delta_time > TIME_DELTA) or delta_time > MAX_TIME_DELTA:
-                        prev_ratio, prev_time = ratio, elapsed_time
-                        eta_time = int(elapsed_time * (1.0 - ratio) / ratio) if ratio > 0 else 0
-                        transform_task.update_state(
-                            state=TransformTask.PROGRESS,
-                            meta={u'hostname': request.hostname,
-                                  u'start_date': start_date,
-                                  u'elapsed_time': elapsed_time,
-                                  u'eta_time': eta_time,
-                                  u'media_in_size': media_in_size,
-                                  u'media_in_duration': media_in_duration,
-                                  u'media_out_size': get_size(media_out_root),
-                                  u'percent': int(100 * ratio),
-                                  u'encoding_frame': media_out_frames})
-                match = DASHCAST_SUCCESS_REGEX.match(stdout)
-                returncode = dashcast.poll()
-                if returncode is not None or match:
-                    encoder_out = u'stdout: {0}\nstderr: {1}'.format(stdout, stderr)
-                    break
-                if media_out_frames == 0 and elapsed_time > DASHCAST_TIMEOUT_TIME:
-                    encoder_out = u'stdout: {0}\nstderr: {1}'.format(stdout, stderr)
-                    raise OSError(to_bytes(u'DashCast does not output frame number, encoding probably failed.'))
+                frames = DASHCAST_REGEX.findall(stdout)
+                if not frames:
+                    if state[u'frames'] == 0 and elapsed_time > DASHCAST_TIMEOUT_TIME:
+                        raise OSError(to_bytes(u'DashCast does not output frame number, encoding probably failed.'))
+                    return False
+                media_out_frames = int(frames[-1])
+                try:
+                    ratio = float(media_out_frames) / media_in_frames
+                    ratio = 0.0 if ratio < 0.0 else 1.0 if ratio > 1.0 else ratio
+                except ZeroDivisionError:
+                    ratio = 1.0
+                if progress.accept(request.id, ratio, elapsed_time):
+                    eta_time = int(elapsed_time * (1.0 - ratio) / ratio) if ratio > 0 else 0
+                    progress.publish(request.id, TransformTask.PROGRESS,
+                                     {u'hostname': request.hostname,
+                                      u'start_date': start_date,
+                                      u'elapsed_time': elapsed_time,
+                                      u'eta_time': eta_time,
+                                      u'media_in_size': media_in_size,
+                                      u'media_in_duration': media_in_duration,
+                                      u'media_out_size': media_out_tracker.update(),
+                                      u'percent': int(100 * ratio),
+                                      u'encoding_frame': media_out_frames,
+                                      u'wasted_time': wasted_time})
+                progressed, state[u'frames'] = media_out_frames > state[u'frames'], media_out_frames
+                return progressed
+
+            encoder = EncoderSupervisor.from_config(shlex.split(cmd), dashcast_handler, local_config, stdout=True,
+                                                    tracker=media_out_tracker, budget=budget)
+            returncode, resources = encoder.run(), encoder.resources
+            elapsed_time = time.time() - start_time
+            if encoder.stalled:
+                raise OSError(to_bytes(u'DashCast stalled during {0} seconds and was killed.'.format(
+                              encoder.stall_timeout)))
 
             # DashCast output sanity check
             if not exists(media_out_path):
                 raise OSError(to_bytes(u'Output media asset not found, DashCast encoding probably failed.'))
-            if returncode != 0:
+            if returncode != 0 and not encoder.finished:
                 raise OSError(to_bytes(u'DashCast return code is {0}, encoding probably failed.'.format(returncode)))
             # FIXME check duration too !
 
         # Here all seem okay -------------------------------------------------------------------------------------------
-        media_out_size = get_size(media_out_root)
+        phases.start(u'finalize')
+        media_out_size = get_size(media_out_root)  # The only walk of the output directory
         media_out_duration = get_media_duration(media_out_path)
         print(u'{0} Transformation task successful, output media asset {1}'.format(request.id, media_out.filename))
+        statistic = {u'hostname': request.hostname, u'start_date': start_date, u'elapsed_time': elapsed_time,
+                     u'eta_time': 0, u'media_in_size': media_in_size, u'media_in_duration': media_in_duration,
+                     u'media_out_size': media_out_size, u'media_out_duration': media_out_duration, u'percent': 100,
+                     u'unit_type': get_unit_type(), u'wasted_time': wasted_time, u'resources': resources,
+                     u'phases': phases.times}
+        statistic.update(cache_statistic)
+        progress.finish(request.id, TransformTask.SUCCESS, statistic)
+        phases.start(u'callback')
         transform_callback(TransformTask.SUCCESS)
-        return {u'hostname': request.hostname, u'start_date': start_date, u'elapsed_time': elapsed_time,
-                u'eta_time': 0, u'media_in_size': media_in_size, u'media_in_duration': media_in_duration,
-                u'media_out_size': media_out_size, u'media_out_duration': media_out_duration, u'percent': 100}
+        phases.stop()
+        progress.finish(request.id, TransformTask.SUCCESS, statistic)  # With the duration of the callback
+        return statistic
 
     except Exception as error:
 
         # Here something went wrong
         print(u'{0} Transformation task failed '.format(request.id))
-        transform_callback(u'ERROR\n{0}\n\nOUTPUT\n{1}'.format(unicode(error), encoder_out))
+        if progress:
+            progress.finish(request.id, TransformTask.FAILURE, {u'hostname': request.hostname})
+        transform_callback(u'ERROR\n{0}\n\nOUTPUT\n{1}'.format(unicode(error), unicode(encoder_out)))
         raise
 
     finally:
+        if budget:
+            budget.unregister()
         if dashcast_conf:
             try_remove(dashcast_conf)
+        if encode_path and encode_path != media_out_path:
+            try_remove(encode_path)
+
+
+def load_task_arguments(media_in_json, media_out_json, profile_json, callback_json):
+    u"""Return the local configuration, the callback, the media assets and the profile of a (segmented) transcode."""
+    local_config = TransformLocalConfig.read_cached(LOCAL_CONFIG_FILENAME, inspect_constructor=False)
+    callback = Callback.from_json(callback_json, inspect_constructor=True)
+    callback.is_valid(True)
+    if local_config.api_nat_socket and len(local_config.api_nat_socket) > 0:
+        callback.replace_netloc(local_config.api_nat_socket)
+    media_in = Media.from_json(media_in_json, inspect_constructor=True)
+    media_out = Media.from_json(media_out_json, inspect_constructor=True)
+    profile = TransformProfile.from_json(profile_json, inspect_constructor=True)
+    media_in.is_valid(True)
+    media_out.is_valid(True)
+    profile.is_valid(True)
+    media_in_path = local_config.storage_medias_path(media_in, generate=False)
+    media_out_path = local_config.storage_medias_path(media_out, generate=True)
+    if not media_in_path or not media_out_path:
+        raise NotImplementedError(to_bytes(u'Media assets will not be readed from/written to shared storage.'))
+    return local_config, callback, media_in_path, media_out_path, profile
+
+
+@task(name=u'TransformWorker.transform_segment_task', max_retries=3, default_retry_delay=30, acks_late=True)
+def transform_segment_task(media_in_json, media_out_json, profile_json, callback_json, task_id, index, count, start,
+                           duration):
+    u"""
+    Transcode the segment ``index`` of ``count`` (``duration`` seconds from ``start``) of a segmented transformation
+    task.
+
+    The segments are transcoded in parallel by the transform units and then concatenated by ``transform_concat_task``
+    (the callback of the chord). A failed segment is retried on its own, the transformation task fails if the segment
+    still fails after ``max_retries`` retries.
+
+    Every transcoded segment is a checkpoint recorded on the shared storage. The message is acknowledged once the
+    segment is done, a segment lost with its worker is delivered again to any unit and a segment with a checkpoint is
+    not transcoded again.
+    """
+    callback = progress = start_time = None
+    encoder_out, request, wasted_time = u'', current_task.request, 0
+    try:
+        print(u'{0} Segment {1} of transformation task {2} started'.format(request.id, index, task_id))
+        local_config, callback, media_in_path, media_out_path, profile = load_task_arguments(
+            media_in_json, media_out_json, profile_json, callback_json)
+        progress = ProgressPublisher.get_instance(transform_segment_task.backend.database, local_config)
+        segment_path = get_segment_path(media_out_path, index)
+        try_makedirs(dirname(segment_path))
+
+        statistic = get_checkpoint(segment_path)
+        if statistic:
+            print(u'{0} Segment {1} of transformation task {2} resumed from checkpoint'.format(request.id, index,
+                  task_id))
+            statistic[u'resumed'] = True
+            progress.finish(request.id, TransformTask.SUCCESS, statistic, task_id=task_id)
+            return statistic
+
+        wasted_time = get_wasted_time(progress, request.id)
+        start_date, start_time = datetime_now(), time.time()
+        parser = FFmpegProgressParser(log_size=ENCODER_OUT_SIZE)
+        encoder_out = parser.log
+        # The segment is encoded under a temporary name, a partial segment is never taken for a complete one
+        base, extension = os.path.splitext(segment_path)
+        encode_path = u'{0}.partial{1}'.format(base, extension)
+        segment_tracker = OutputSizeTracker(encode_path)
+
+        def ffmpeg_callback(ratio, stats):
+            elapsed_time = time.time() - start_time
+            if progress.accept(request.id, ratio, elapsed_time):
+                eta_time = int(elapsed_time * (1.0 - ratio) / ratio) if ratio > 0 else 0
+                progress.publish(request.id, TransformTask.PROGRESS, {
+                    u'hostname': request.hostname, u'start_date': start_date, u'elapsed_time': elapsed_time,
+                    u'eta_time': eta_time, u'media_out_size': segment_tracker.update(), u'percent': int(100 * ratio),
+                    u'segment': index, u'segments_count': count, u'wasted_time': wasted_time}, task_id=task_id)
+
+        # Seek the input (before -i) then decode and encode the segment, it starts with a key frame
+        with CpuBudget.from_config(local_config) as budget:
+            cmd = u'ffmpeg -y -ss {0} -i "{1}" -t {2} {3} "{4}"'.format(
+                start, media_in_path, duration, budget.encoder_string(profile.encoder_string), encode_path)
+            encoder = ffmpeg_encode(cmd, duration, parser, ffmpeg_callback, budget, local_config, segment_tracker)
+        returncode = encoder.returncode
+        if returncode != 0:
+            raise OSError(to_bytes(u'FFmpeg return code is {0}, encoding probably failed.'.format(returncode)))
+        os.rename(encode_path, segment_path)
+
+        # The result is serialized to JSON (argument of the chord callback), so start time instead of start date
+        statistic = {u'hostname': request.hostname, u'start_time': start_time,
+                     u'elapsed_time': time.time() - start_time, u'eta_time': 0,
+                     u'media_out_size': os.path.getsize(segment_path), u'percent': 100, u'segment': index,
+                     u'segments_count': count, u'wasted_time': wasted_time, u'resources': encoder.resources}
+        save_checkpoint(segment_path, statistic)
+        progress.finish(request.id, TransformTask.SUCCESS, statistic, task_id=task_id)
+        return statistic
+
+    except Exception as error:
+        print(u'{0} Segment {1} of transformation task {2} failed'.format(request.id, index, task_id))
+        if request.retries < transform_segment_task.max_retries:
+            if progress and start_time:
+                # The time spent by this attempt is wasted, the next attempt will account for it
+                progress.finish(request.id, TransformTask.RETRY, {
+                    u'hostname': request.hostname, u'elapsed_time': time.time() - start_time,
+                    u'wasted_time': wasted_time, u'segment': index, u'segments_count': count}, task_id=task_id)
+            raise transform_segment_task.retry(exc=error)
+        if progress:
+            progress.finish(task_id, TransformTask.FAILURE, {u'hostname': request.hostname})
+        post_callback(callback, task_id, u'ERROR\nSegment {0}: {1}\n\nOUTPUT\n{2}'.format(index, unicode(error),
+                      unicode(encoder_out)))
+        raise
+
+
+@task(name=u'TransformWorker.transform_concat_task', acks_late=True)
+def transform_concat_task(segments_statistics, media_in_json, media_out_json, profile_json, callback_json):
+    u"""
+    Concatenate (without transcoding) the segments of a segmented transformation task into the output media asset.
+
+    This is the callback of the chord of ``transform_segment_task``, its id is the id of the transformation task.
+    The segments resumed from their checkpoint and the time wasted by the lost or failed attempts are accounted into
+    the statistic as ``segments_resumed`` and ``wasted_time``.
+    """
+    callback = progress = None
+    encoder_out, request = u'', current_task.request
+    try:
+        print(u'{0} Concatenation of {1} segments started'.format(request.id, len(segments_statistics)))
+        local_config, callback, media_in_path, media_out_path, profile = load_task_arguments(
+            media_in_json, media_out_json, profile_json, callback_json)
+        progress = ProgressPublisher.get_instance(transform_concat_task.backend.database, local_config)
+        media_in_duration = get_media_duration(media_in_path)
+        segments_path = os.path.join(dirname(media_out_path), SEGMENTS_PATH)
+
+        # The list of the segments (relative paths are considered safe by the concat demuxer)
+        list_path = os.path.join(segments_path, u'segments.txt')
+        with open(list_path, u'w', u'utf-8') as f:
+            for index in xrange(len(segments_statistics)):
+                f.write(u"file '{0}'\n".format(os.path.basename(get_segment_path(media_out_path, index))))
+
+        # The transformation task started with its first segment
+        start_time = min(s[u'start_time'] for s in segments_statistics)
+        start_date = datetime_now(offset=timedelta(seconds=start_time - time.time()))
+        parser = FFmpegProgressParser(log_size=ENCODER_OUT_SIZE)
+        encoder_out = parser.log
+
+        def ffmpeg_callback(ratio, stats):
+            if progress.accept(request.id, ratio, time.time() - start_time):
+                progress.publish(request.id, TransformTask.PROGRESS, {
+                    u'hostname': request.hostname, u'start_date': start_date,
+                    u'elapsed_time': time.time() - start_time, u'eta_time': 0,
+                    u'media_in_duration': media_in_duration, u'media_out_duration': stats[u'time'],
+                    u'percent': 100, u'segments_count': len(segments_statistics)})
+
+        cmd = u'ffmpeg -y -f concat -i "{0}" -c copy "{1}"'.format(list_path, media_out_path)
+        with CpuBudget.from_config(local_config) as budget:
+            encoder = ffmpeg_encode(cmd, total_seconds(media_in_duration), parser, ffmpeg_callback, budget,
+                                    local_config, OutputSizeTracker(media_out_path))
+        returncode = encoder.returncode
+        if returncode != 0:
+            raise OSError(to_bytes(u'FFmpeg return code is {0}, concatenation probably failed.'.format(returncode)))
+        shutil.rmtree(segments_path, ignore_errors=True)
+
+        print(u'{0} Transformation task successful, output media asset {1}'.format(request.id, media_out_path))
+        statistic = {u'hostname': request.hostname, u'start_date': start_date,
+                     u'elapsed_time': time.time() - start_time, u'eta_time': 0,
+                     u'media_in_size': get_size(dirname(media_in_path)), u'media_in_duration': media_in_duration,
+                     u'media_out_size': get_size(dirname(media_out_path)),
+                     u'media_out_duration': get_media_duration(media_out_path), u'percent': 100,
+                     u'segments_count': len(segments_statistics),
+                     u'segments_resumed': sum(1 for s in segments_statistics if s.get(u'resumed')),
+                     u'wasted_time': sum(s.get(u'wasted_time', 0) for s in segments_statistics),
+                     u'resources': encoder.resources}
+        progress.finish(request.id, TransformTask.SUCCESS, statistic)
+        post_callback(callback, request.id, TransformTask.SUCCESS)
+        return statistic
+
+    except Exception as error:
+        print(u'{0} Concatenation of the segments failed'.format(request.id))
+        if progress:
+            progress.finish(request.id, TransformTask.FAILURE, {u'hostname': request.hostname})
+        post_callback(callback, request.id, u'ERROR\n{0}\n\nOUTPUT\n{1}'.format(unicode(error), unicode(encoder_out)))
+        raise
+
+
+@task(name=u'TransformWorker.transform_ladder_task')
+def transform_ladder_task(media_in_json, media_outs_json, profiles_json, callback_json, tasks_ids):
+    u"""
+    Transcode the input media asset into the renditions of a ladder (one output media asset per profile) with one
+    FFmpeg process, the input is read and decoded only once.
+
+    Every rendition is a transformation task (``tasks_ids``) with its own progress, statistic and callback. The id of
+    this task is the id of the first rendition.
+    """
+    callback, cache_statistic, renditions, reported = None, {}, [], set()
+    encoder_out, progress, request = u'', None, current_task.request
+    try:
+        print(u'{0} Transformation ladder of {1} renditions started'.format(request.id, len(tasks_ids)))
+        for media_out_json, profile_json in zip(media_outs_json, profiles_json):
+            local_config, callback, media_in_path, media_out_path, profile = load_task_arguments(
+                media_in_json, media_out_json, profile_json, callback_json)
+            if profile.encoder_name != u'ffmpeg':
+                raise NotImplementedError(to_bytes(u'Encoder {0} cannot transcode a ladder.'.format(
+                                          profile.encoder_name)))
+            try_makedirs(dirname(media_out_path))
+            encode_path = get_encode_path(local_config, media_out_path)
+            renditions.append((media_out_path, encode_path, profile, OutputSizeTracker(encode_path)))
+        progress = ProgressPublisher.get_instance(transform_ladder_task.backend.database, local_config)
+
+        start_date, start_time = datetime_now(), time.time()
+        media_in_duration = get_media_duration(media_in_path)
+        media_in_size = get_size(dirname(media_in_path))
+        parser = FFmpegProgressParser(log_size=ENCODER_OUT_SIZE)
+        encoder_out = parser.log
+        media_in = Media.from_json(media_in_json, inspect_constructor=True)
+        media_in_local_path, cache_statistic = cache_media_in(local_config, media_in, media_in_path)
+
+        def ffmpeg_callback(ratio, stats):
+            elapsed_time = time.time() - start_time
+            if progress.accept(request.id, ratio, elapsed_time):
+                eta_time = int(elapsed_time * (1.0 - ratio) / ratio) if ratio > 0 else 0
+                for task_id, (media_out_path, encode_path, profile, tracker) in zip(tasks_ids, renditions):
+                    progress.publish(task_id, TransformTask.PROGRESS, {
+                        u'hostname': request.hostname, u'start_date': start_date, u'elapsed_time': elapsed_time,
+                        u'eta_time': eta_time, u'media_in_size': media_in_size,
+                        u'media_in_duration': media_in_duration, u'media_out_size': tracker.update(),
+                        u'media_out_duration': stats[u'time'], u'percent': int(100 * ratio),
+                        u'encoding_frame': stats[u'frame'], u'encoding_fps': stats[u'fps']})
+
+        # The options of FFmpeg apply to the next output file, so every profile encodes its own rendition
+        with CpuBudget.from_config(local_config) as budget:
+            cmd = u'ffmpeg -y -i "{0}" {1}'.format(media_in_local_path, u' '.join(
+                u'{0} "{1}"'.format(budget.encoder_string(profile.encoder_string, len(renditions)), encode_path)
+                for media_out_path, encode_path, profile, tracker in renditions))
+            encoder = ffmpeg_encode(cmd, total_seconds(media_in_duration), parser, ffmpeg_callback, budget,
+                                    local_config, renditions[0][3])
+        returncode = encoder.returncode
+
+        # The status of every rendition (FFmpeg may fail after the completion of some outputs)
+        statistics = {}
+        for task_id, (media_out_path, encode_path, profile, tracker) in zip(tasks_ids, renditions):
+            if returncode == 0 and exists(encode_path) and tracker.update() > 0:
+                if encode_path != media_out_path:
+                    atomic_move(encode_path, media_out_path)
+                elapsed_time = time.time() - start_time
+                statistic = {u'hostname': request.hostname, u'start_date': start_date,
+                             u'elapsed_time': elapsed_time, u'eta_time': 0, u'media_in_size': media_in_size,
+                             u'media_in_duration': media_in_duration,
+                             u'media_out_size': get_size(dirname(media_out_path)),
+                             u'media_out_duration': get_media_duration(media_out_path), u'percent': 100,
+                             u'unit_type': get_unit_type(), u'resources': encoder.resources}
+                statistic.update(cache_statistic)
+                progress.finish(task_id, TransformTask.SUCCESS, statistic)
+                post_callback(callback, task_id, TransformTask.SUCCESS)
+                statistics[task_id] = statistic
+            else:
+                progress.finish(task_id, TransformTask.FAILURE, {u'hostname': request.hostname})
+                post_callback(callback, task_id, u'ERROR\nFFmpeg return code is {0}, encoding of {1} probably '
+                              u'failed.\n\nOUTPUT\n{2}'.format(returncode, profile.title, unicode(encoder_out)))
+            reported.add(task_id)
+        print(u'{0} Transformation ladder completed, {1} of {2} renditions successful'.format(
+              request.id, len(statistics), len(tasks_ids)))
+        if not statistics:
+            raise OSError(to_bytes(u'FFmpeg return code is {0}, encoding probably failed.'.format(returncode)))
+        return statistics
+
+    except Exception as error:
+        print(u'{0} Transformation ladder failed'.format(request.id))
+        for task_id in (t for t in tasks_ids if t not in reported):
+            if progress:
+                progress.finish(task_id, TransformTask.FAILURE, {u'hostname': request.hostname})
+            post_callback(callback, task_id, u'ERROR\n{0}\n\nOUTPUT\n{1}'.format(unicode(error), unicode(encoder_out)))
+        raise
+
+    finally:
+        for media_out_path, encode_path, profile, tracker in renditions:
+            if encode_path != media_out_path:
+                try_remove(encode_path)
@@ -28,6 +28,9 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from .base import *
 from .client import *
 from .decorators import *
+from .predictor import *
+from .scheduler import *
 from .server import *
+from .snapshot import *
 from .test import *
 from .utils import *
@@ -89,6 +89,17 @@ class OsciedCRUDMapper(object):
         return self.api_client.do_request(get, self.get_url(extra=u'count'),
                                           data=object2json(data, include_properties=False))
 
+    def get_many(self, ids):
+        u"""Return the values with ids ``ids`` with one request (fields are not loaded), unknown ids are skipped."""
+        values = []
+        response_dict = self.api_client.do_request(get, self.get_url(extra=u'ids'),
+                                                   data=object2json({u'ids': list(ids)}, include_properties=False))
+        if self.cls is None:
+            return response_dict
+        for value_dict in response_dict:
+            values.append(dict2object(self.cls, value_dict, inspect_constructor=True))
+        return values
+
     def list(self, head=False, **data):
         values = []
         response_dict = self.api_client.do_request(get, self.get_url(extra=(u'HEAD' if head else None)),
@@ -25,17 +25,18 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import os
+import hashlib, os, pipes, subprocess, tempfile
+from multiprocessing.pool import ThreadPool
 from pytoolbox.encoding import to_bytes
-from pytoolbox.flask import map_exceptions
-from pytoolbox.juju import get_unit_path, juju_do
-from pytoolbox.serialization import dict2object
-from pytoolbox.subprocess import rsync, ssh
+from pytoolbox.filesystem import try_makedirs
+from pytoolbox.serialization import dict2object, object2json
+from pytoolbox.subprocess import ssh
 from requests import get, post
 
 from ..config import OrchestraLocalConfig
 from ..constants import LOCAL_CONFIG_FILENAME
-from ..models import Media, User, TransformProfile, PublisherTask, TransformTask
+from ..models import Media, User, TransformProfile, PublisherTask, TransformTask, Workflow
+from ..utils import new_session
 from .base import VERSION, OsciedCRUDMapper
 
 
@@ -44,7 +45,7 @@ class OrchestraAPIClient(object):
 
     def __init__(self, hostname, port=80, version=VERSION, api_unit=u'oscied-orchestra/0',
                  auth=None, id_rsa=u'~/.ssh/id_rsa', environment=u'default',
-                 timeout=10.0):
+                 timeout=10.0, pool_size=10, max_retries=3, backoff_factor=0.5):
         self.api_url = u'{0}:{1}/api/{2}'.format(hostname, port, version)
         self.api_unit = api_unit
         self.auth = auth
@@ -52,15 +53,21 @@ class OrchestraAPIClient(object):
         self.id_rsa = os.path.abspath(os.path.expanduser(id_rsa))
         self.environment = environment
         self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._session = self._session_pid = None
         self.storage_path = self.storage_address = self.storage_mountpoint = None
         self.users = OsciedCRUDMapper(self, u'user', User)
         self.medias = OsciedCRUDMapper(self, u'media', Media)
+        self.deleted_medias = OsciedCRUDMapper(self, u'media/deleted', Media)
         self.environments = OsciedCRUDMapper(self, u'environment', None, u'name')
         self.transform_profiles = OsciedCRUDMapper(self, u'transform/profile', TransformProfile)
         self.transform_units = OsciedCRUDMapper(self, u'transform/unit', None, u'number', True)
         self.transform_tasks = OsciedCRUDMapper(self, u'transform/task', TransformTask)
         self.publisher_units = OsciedCRUDMapper(self, u'publisher/unit', None, u'number', True)
         self.publisher_tasks = OsciedCRUDMapper(self, u'publisher/task', PublisherTask)
+        self.workflows = OsciedCRUDMapper(self, u'workflow', Workflow)
         self._local_config = None
         # FIXME api_transform_unit_number_get, api_transform_unit_number_delete ...
 
@@ -111,19 +118,35 @@ class OrchestraAPIClient(object):
     def publisher_queues(self):
         return self.do_request(get, u'{0}/publisher/queue'.format(self.api_url))
 
+    def estimate_transform_task(self, media_in, profile, unit_type=None):
+        u"""Return the estimated duration and output size of a transformation task, see the API documentation."""
+        data = {u'media_in_id': media_in._id, u'profile_id': profile._id, u'unit_type': unit_type}
+        return self.do_request(post, u'{0}/transform/task/estimate'.format(self.api_url),
+                               data=object2json(data, include_properties=False))
+
     # ------------------------------------------------------------------------------------------------------------------
 
+    @property
+    def session(self):
+        u"""Return the HTTP session of the client (created again in a forked process), connections are kept alive."""
+        if self._session is None or self._session_pid != os.getpid():
+            self._session = new_session(self.pool_size, self.max_retries, self.backoff_factor)
+            self._session_pid = os.getpid()
+        return self._session
+
     def do_request(self, verb, resource, auth=None, data=None):
-        u"""Execute a method of the API."""
+        u"""Execute a method of the API, ``verb`` is one of the functions get, post, patch or delete of requests."""
         headers = {u'Content-type': u'application/json', u'Accept': u'application/json'}
         auth = auth or self.auth
         auth = auth.credentials if isinstance(auth, User) else auth
         url = u'http://{0}'.format(resource)
-        response = verb(url, auth=auth, data=data, headers=headers, timeout=self.timeout)
+        response = getattr(self.session, verb.__name__)(url, auth=auth, data=data, headers=headers,
+                                                        timeout=self.timeout)
         try:
             response_json = response.json()
         except:
             raise ValueError(to_bytes(u'Response does not contain valid JSON data:\n' + unicode(response.text)))
+        from pytoolbox.flask import map_exceptions  # Imported on first use, Flask is heavy
         return map_exceptions(response_json)
 
     # More complex methods not directly related to the API -------------------------------------------------------------
@@ -142,36 +165,113 @@ class OrchestraAPIClient(object):
 
     def get_unit_local_config(self, service, number, cls=None, local_config=LOCAL_CONFIG_FILENAME):
         u"""Return an instance of ``cls`` with the content of the local configuration of an instance of a charm !"""
+        from pytoolbox.juju import get_unit_path, juju_do
         config_dict = juju_do(u'ssh', environment=self.environment, options=[u'{0}/{1}'.format(service, number),
                               u'sudo cat {0}'.format(get_unit_path(service, number, local_config))])
         return dict2object(cls, config_dict, inspect_constructor=False) if cls else config_dict
 
-    def upload_media(self, filepath, backup_in_remote=True):
-        u"""Upload a media asset by rsync-ing the local file to the shared storage mount point of the orchestrator !"""
+    def _ssh_args(self, remote_cmd):
+        u"""Return the arguments to execute ``remote_cmd`` into the orchestration unit with a secure shell."""
+        return [u'ssh', u'-i', self.id_rsa, u'-o', u'BatchMode=yes', self.api_host, remote_cmd]
+
+    def _remote_md5(self, path, offset, size, block_size):
+        u"""Return the MD5 checksum of ``size`` bytes at ``offset`` of a remote file (computed by the remote host)."""
+        remote_cmd = u'sudo dd if={0} bs={1} skip={2} count={3} iflag=fullblock 2>/dev/null | md5sum'.format(
+                     pipes.quote(path), block_size, offset // block_size, -(-size // block_size))
+        return subprocess.check_output(self._ssh_args(remote_cmd)).split()[0].decode(u'utf-8')
+
+    @staticmethod
+    def _read_chunk(filepath, offset, size, block_size):
+        u"""Yield the blocks of the chunk of ``size`` bytes at ``offset`` of a local file."""
+        with open(filepath, u'rb') as f:
+            f.seek(offset)
+            remaining = size
+            while remaining > 0:
+                data = f.read(min(block_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    def _upload_chunk(self, filepath, dst_file, offset, size, block_size, resume, retries):
+        u"""
+        Stream a chunk of a local file into a remote file, the MD5 checksum is computed while streaming and then
+        compared to the checksum of the remote chunk. A chunk that is already uploaded is skipped if ``resume``.
+        """
+        if resume:
+            md5 = hashlib.md5()
+            for data in self._read_chunk(filepath, offset, size, block_size):
+                md5.update(data)
+            if self._remote_md5(dst_file, offset, size, block_size) == md5.hexdigest():
+                return 0  # This chunk was already uploaded
+        remote_cmd = u'sudo dd of={0} bs={1} seek={2} conv=notrunc iflag=fullblock 2>/dev/null'.format(
+                     pipes.quote(dst_file), block_size, offset // block_size)
+        for retry in xrange(retries + 1):
+            md5 = hashlib.md5()
+            process = subprocess.Popen(self._ssh_args(remote_cmd), stdin=subprocess.PIPE)
+            try:
+                for data in self._read_chunk(filepath, offset, size, block_size):
+                    md5.update(data)
+                    process.stdin.write(data)
+            except IOError:
+                pass  # Broken pipe, the return code of the process is checked below
+            finally:
+                process.stdin.close()
+            if process.wait() == 0 and md5.hexdigest() == self._remote_md5(dst_file, offset, size, block_size):
+                return size
+        raise IOError(to_bytes(u'Unable to upload chunk at offset {0} of file {1} after {2} retries.'.format(
+                      offset, filepath, retries)))
+
+    def upload_media(self, filepath, backup_in_remote=True, chunk_size=64*1024*1024, parallel=4, retries=3):
+        u"""
+        Upload a media asset straight to the uploads directory of the shared storage mount point of the orchestrator.
+
+        The file is uploaded by ``parallel`` streams of chunks of ``chunk_size`` bytes, any chunk is verified (MD5) and
+        retried ``retries`` times on failure. The upload is resumed (the chunks already uploaded are skipped) if a
+        previous upload of the file was interrupted. The file is only renamed to its final name when complete.
+
+        A copy of the file is kept into the 'backup' directory of the shared storage if ``backup_in_remote``.
+        """
         # FIXME detect name based on hostname ?
         os.chmod(self.id_rsa, 0600)
-        api_host, local_cfg = self.api_host, self.api_local_config
-        bkp_path = local_cfg.storage_uploads_path + u'_bkp/'
+        local_cfg = self.api_local_config
         dst_path = local_cfg.storage_uploads_path
         if not dst_path:
             raise ValueError(to_bytes(u'Unable to retrieve shared storage uploads directory.'))
+        block_size = 1024 * 1024
+        chunk_size = max(block_size, chunk_size - chunk_size % block_size)
+        size, filename = os.path.getsize(filepath), os.path.basename(filepath)
+        dst_file = os.path.join(dst_path, filename)
+        part_file = dst_file + u'.part'
+        # Pre-allocate the (partial) remote file and detect if the upload is resumed
+        remote_cmd = u'sudo mkdir -p {0} && (sudo stat -c %s {1} 2>/dev/null || true) && sudo truncate -s {2} {1}'
+        remote_cmd = remote_cmd.format(pipes.quote(dst_path), pipes.quote(part_file), size)
+        resume = bool(subprocess.check_output(self._ssh_args(remote_cmd)).strip())
+        pool = ThreadPool(parallel)
+        try:
+            uploaded = sum(pool.map(lambda offset: self._upload_chunk(
+                filepath, part_file, offset, min(chunk_size, size - offset), block_size, resume, retries),
+                xrange(0, size, chunk_size)))
+        finally:
+            pool.close()
+            pool.join()
+        # Publish the complete file and set ownership of this file only
+        remote_cmd = u'sudo mv {0} {1} && sudo chown www-data:www-data {1}'.format(pipes.quote(part_file),
+                                                                                  pipes.quote(dst_file))
         if backup_in_remote:
-            # Mirror the local file into a 'backup' directory on the shared storage, then into the destination directory
-            rsync(filepath, u'{0}:{1}'.format(api_host, bkp_path), cli_output=True, makedest=True, archive=True,
-                  progress=True, rsync_path=u'sudo rsync', extra='ssh -i {0}'.format(self.id_rsa))
-            sync_bkp_to_upload = u'sudo rsync -ah --progress {0} {1}'.format(bkp_path, dst_path)
-            ssh(api_host, cli_output=True, id=self.id_rsa, remote_cmd=sync_bkp_to_upload)
-        else:
-            # Mirror the local file into the destination directory of the shared storage
-            rsync(filepath, u'{0}:{1}'.format(api_host, dst_path), cli_output=True, makedest=True, archive=True,
-                  progress=True, rsync_path=u'sudo rsync', extra='ssh -i {0}'.format(self.id_rsa))
-        ssh(api_host, id=self.id_rsa, remote_cmd=u'sudo chown www-data:www-data {0} -R'.format(dst_path))
+            remote_cmd += u' && sudo mkdir -p {0} && sudo cp {1} {0}/'.format(pipes.quote(dst_path + u'_bkp'),
+                                                                              pipes.quote(dst_file))
+        subprocess.check_call(self._ssh_args(remote_cmd))
+        print(u'Uploaded {0} bytes of {1} bytes ({2} already uploaded)'.format(uploaded, size, size - uploaded))
         return u'{0}://{1}/{2}/uploads/{3}'.format(u'glusterfs', local_cfg.storage_address,
-                                                   local_cfg.storage_mountpoint, os.path.basename(filepath))
+                                                   local_cfg.storage_mountpoint, filename)
 
-    def download_media(self, media, destination_path):
+    def download_media(self, media, destination_path, parallel=4):
         u"""
         Download a media asset by rsync-ing its directory from the shared storage mount point of the orchestrator !
+
+        The files (e.g. segments of a MPEG-DASH media asset) are split into ``parallel`` sets, transferred concurrently.
+        Partially transferred files are kept to resume the transfer and rsync verifies the checksum of every file.
         """
         # FIXME detect name based on hostname ?
         os.chmod(self.id_rsa, 0600)
@@ -179,9 +279,28 @@ class OrchestraAPIClient(object):
         src_path = local_cfg.storage_medias_path(media)
         if not src_path:
             raise ValueError(to_bytes(u'Unable to retrieve shared storage uploads directory.'))
+        src_directory = os.path.dirname(src_path)
+        remote_cmd = u"sudo find {0} -type f -printf '%P\\n'".format(pipes.quote(src_directory))
+        filenames = subprocess.check_output(self._ssh_args(remote_cmd)).decode(u'utf-8').splitlines()
+        dst_directory = os.path.join(destination_path, os.path.basename(src_directory))
+        try_makedirs(dst_directory)
+
+        def download_files(filenames):
+            with tempfile.NamedTemporaryFile() as files_from:
+                files_from.write(u'\n'.join(filenames).encode(u'utf-8'))
+                files_from.flush()
+                subprocess.check_call([u'rsync', u'-a', u'--partial', u'--files-from={0}'.format(files_from.name),
+                                       u'--rsync-path=sudo rsync', u'-e', u'ssh -i {0}'.format(self.id_rsa),
+                                       u'{0}:{1}/'.format(api_host, src_directory), dst_directory])
+
         # Mirror the remote directory of the media from the source directory of the shared storage
-        rsync(u'{0}:{1}'.format(api_host, os.path.dirname(src_path)), destination_path, cli_output=True, makedest=True,
-              archive=True, progress=True, rsync_path=u'sudo rsync', extra='ssh -i {0}'.format(self.id_rsa))
+        sets = [s for s in (filenames[i::parallel] for i in xrange(parallel)) if s]
+        pool = ThreadPool(max(1, len(sets)))
+        try:
+            pool.map(download_files, sets)
+        finally:
+            pool.close()
+            pool.join()
 
     def remove_medias(self):
         u"""Remove all medias from the shared storage mount point of the orchestrator !"""
@@ -189,3 +308,67 @@ class OrchestraAPIClient(object):
         os.chmod(self.id_rsa, 0600)
         medias_path_filter = os.path.join(self.api_local_config.storage_medias_path(), u'*')
         ssh(self.api_host, id=self.id_rsa, remote_cmd=u'sudo rm -rf {0}'.format(medias_path_filter))
+
+
+class OrchestraAPIClientPool(object):
+    u"""
+    Drive one or many orchestrators concurrently with a bounded pool of threads.
+
+    This is the non-blocking counterpart of ``OrchestraAPIClient`` for this Python 2 code base : Calls to the clients
+    (and their mappers) are executed by a pool of ``concurrency`` threads sharing the keep-alive HTTP sessions of the
+    clients (set their ``pool_size`` to at least ``concurrency``). The results are the usual objects, e.g. instances of
+    ``TransformTask``, this permit to monitor thousands of tasks across environments from one process.
+
+    **Example usage**
+
+    >>> pool = OrchestraAPIClientPool(concurrency=4)
+    >>> print(pool.map(lambda x: x * 2, [1, 2, 3]))
+    [2, 4, 6]
+    >>> pool.close()
+    """
+
+    def __init__(self, concurrency=8, chunk_size=100):
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(self.concurrency)
+        return self._pool
+
+    def close(self):
+        u"""Wait for the pending calls to finish and release the threads."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def map(self, function, iterable):
+        u"""Call ``function`` with every item of ``iterable`` concurrently and return the results in the same order."""
+        return self.pool.map(function, list(iterable))
+
+    def apply_async(self, function, *args, **kwargs):
+        u"""Call ``function`` in the pool and return an asynchronous result (see ``multiprocessing.pool``)."""
+        return self.pool.apply_async(function, args, kwargs)
+
+    def get_many(self, mapper, ids):
+        u"""Return the values with ids ``ids`` using ``mapper``, see ``get_many_multi``."""
+        return self.get_many_multi([(mapper, ids)])[0]
+
+    def get_many_multi(self, requests):
+        u"""
+        Return the values for every (mapper, ids) tuple of ``requests``, e.g. tasks of many orchestrators.
+
+        The ids are retrieved concurrently by chunks of ``chunk_size`` ids, one request per chunk.
+        """
+        chunks = []
+        for index, (mapper, ids) in enumerate(requests):
+            ids = list(ids)
+            for start in xrange(0, len(ids), self.chunk_size):
+                chunks.append((index, mapper, ids[start:start + self.chunk_size]))
+        values = [[] for request in requests]
+        for (index, mapper, ids), chunk_values in zip(chunks, self.map(lambda c: c[1].get_many(c[2]), chunks)):
+            values[index].extend(chunk_values)
+        return values
@@ -25,14 +25,16 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import flask, logging
+import logging
 from functools import wraps
-from pytoolbox.flask import check_id, map_exceptions
 
 
 # http://publish.luisrei.com/articles/flaskrest.html
 def api_method_decorator(api_core, authenticate=True, allow_root=False, allow_node=False, allow_any=False, role=None,
                          allow_same_id=False):
+    import flask  # Only the orchestrator needs Flask, do not load it when importing the API package
+    from pytoolbox.flask import check_id, map_exceptions
+
     def decorate(func):
         @wraps(func)
         def wrapper(**kwargs):
@@ -0,0 +1,105 @@
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import math
+from pytoolbox.datetime import total_seconds
+
+
+def percentile(values, ratio):
+    u"""
+    Return the percentile ``ratio`` (0.5 is the median) of the ``values`` (nearest rank).
+
+    **Example usage**
+
+    >>> print(percentile([3, 1, 2], 0.5), percentile([4, 1, 3, 2], 0.25), percentile([4, 1, 3, 2], 0.75))
+    2 1 3
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(math.ceil(ratio * len(values))) - 1))]
+
+
+def get_transform_sample(statistic):
+    u"""
+    Return the sample (time and output size per second of input media asset) of the ``statistic`` of a successful
+    transformation task or None if the statistic is incomplete.
+
+    **Example usage**
+
+    >>> sample = get_transform_sample({u'elapsed_time': 60, u'media_in_duration': u'00:02:00.00',
+    ...                                u'media_out_size': 3000, u'unit_type': u'x86_64-8cpu-16gb'})
+    >>> print(sample[u'time_rate'], sample[u'size_rate'], sample[u'unit_type'])
+    0.5 25.0 x86_64-8cpu-16gb
+    >>> print(get_transform_sample({u'elapsed_time': 60}))
+    None
+    """
+    try:
+        duration = total_seconds(statistic[u'media_in_duration'])
+        return {u'time_rate': statistic[u'elapsed_time'] / duration,
+                u'size_rate': statistic[u'media_out_size'] / duration, u'unit_type': statistic.get(u'unit_type')}
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def predict_transform(samples, duration, unit_type=None, min_samples=3):
+    u"""
+    Return the estimated ``elapsed_time`` (seconds) and ``media_out_size`` (bytes) of a transformation task with an
+    input media asset of ``duration`` seconds, None if there are less than ``min_samples`` ``samples``.
+
+    The samples are the ones of the finished transformation tasks with the same profile (see ``get_transform_sample``).
+    The samples of the units of type ``unit_type`` are used if there are enough of them. The estimates are the medians
+    of the time and of the output size per second of input media asset, ``elapsed_time_range`` is the interquartile
+    range of the elapsed time.
+
+    **Example usage**
+
+    >>> samples = [{u'time_rate': r, u'size_rate': 100, u'unit_type': u'small'} for r in (1.8, 2.2, 2.0, 9.0)]
+    >>> samples += [{u'time_rate': r, u'size_rate': 100, u'unit_type': u'large'} for r in (0.5, 0.4, 0.6)]
+    >>> estimate = predict_transform(samples, 60)
+    >>> print(estimate[u'elapsed_time'], estimate[u'elapsed_time_range'], estimate[u'media_out_size'])
+    108 [30, 132] 6000
+    >>> estimate = predict_transform(samples, 60, unit_type=u'large')
+    >>> print(estimate[u'elapsed_time'], estimate[u'samples'], estimate[u'unit_type'])
+    30 3 large
+    >>> print(predict_transform(samples, 60, unit_type=u'medium')[u'unit_type'])
+    None
+    >>> print(predict_transform(samples[:2], 60))
+    None
+    """
+    same_type = [sample for sample in samples if unit_type and sample[u'unit_type'] == unit_type]
+    if len(same_type) >= min_samples:
+        samples = same_type
+    else:
+        unit_type = None
+    if len(samples) < min_samples:
+        return None
+    time_rates = [sample[u'time_rate'] for sample in samples]
+    return {
+        u'elapsed_time': int(round(percentile(time_rates, 0.5) * duration)),
+        u'elapsed_time_range': [int(round(percentile(time_rates, r) * duration)) for r in (0.25, 0.75)],
+        u'media_out_size': int(round(percentile([sample[u'size_rate'] for sample in samples], 0.5) * duration)),
+        u'samples': len(samples), u'unit_type': unit_type
+    }
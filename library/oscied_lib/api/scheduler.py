@@ -0,0 +1,188 @@
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import logging, time
+
+
+def select_entries(ready, running, capacity, weights=None):
+    u"""
+    Return the entries to release from the ``ready`` queue given the number of slots used by the ``running`` entries.
+
+    The entries with the highest priority are released first. Among the entries with the same priority, the next entry
+    is the oldest one of the user with the lowest weighted share (slots used divided by the weight of the user, the
+    weight of a user is 1 if not set in ``weights``). An entry using more slots than ``capacity`` is released only if
+    nothing else is running.
+
+    **Example usage**
+
+    >>> def entry(_id, user_id, priority=0, slots=1):
+    ...     return {u'_id': _id, u'user_id': user_id, u'priority': priority, u'slots': slots, u'add_date': _id}
+    >>> batch = [entry(i, u'alice') for i in xrange(10)]
+    >>> ready = batch + [entry(10, u'bob'), entry(11, u'bob'), entry(12, u'carol', priority=1)]
+    >>> [e[u'_id'] for e in select_entries(ready, [], 4)]
+    [12, 0, 10, 1]
+    >>> [e[u'_id'] for e in select_entries(ready, [entry(20, u'bob')], 4)]
+    [12, 0, 1]
+    >>> [e[u'_id'] for e in select_entries(ready, [], 6, weights={u'alice': 3})]
+    [12, 0, 10, 1, 2, 3]
+    >>> [e[u'_id'] for e in select_entries([entry(0, u'bob', slots=8)], [entry(1, u'alice')], 4)]
+    []
+    >>> [e[u'_id'] for e in select_entries([entry(0, u'bob', slots=8)], [], 4)]
+    [0]
+    """
+    weights = weights or {}
+    used, shares = 0, {}
+    for entry in running:
+        used += entry[u'slots']
+        shares[entry[u'user_id']] = shares.get(entry[u'user_id'], 0) + entry[u'slots']
+    pending = sorted(ready, key=lambda e: (-e[u'priority'], e[u'add_date']))
+    selected = []
+    while pending and used < capacity:
+        priority = pending[0][u'priority']
+        candidates, users = [], set()
+        for entry in pending:
+            if entry[u'priority'] != priority:
+                break
+            if entry[u'user_id'] not in users:  # Only the oldest entry of every user
+                users.add(entry[u'user_id'])
+                candidates.append(entry)
+        entry = min(candidates, key=lambda e: shares.get(e[u'user_id'], 0) / weights.get(e[u'user_id'], 1))
+        if used > 0 and used + entry[u'slots'] > capacity:
+            break
+        pending.remove(entry)
+        selected.append(entry)
+        used += entry[u'slots']
+        shares[entry[u'user_id']] = shares.get(entry[u'user_id'], 0) + entry[u'slots']
+    return selected
+
+
+class TaskScheduler(object):
+    u"""
+    Hold the tasks in a ready queue (a MongoDB collection) and release them to the workers (Celery) of a queue only
+    when there is a free slot, the broker never holds a backlog that cannot be reordered.
+
+    The tasks are released by priority then by weighted fair-share across the users, see ``select_entries``. The slots
+    of a task are freed by ``release`` (e.g. when the workers call back the orchestrator) or by ``reap`` if the task is
+    no longer alive (``is_alive(task_id, queue)`` returns False, e.g. the worker died). The queues are also scheduled
+    periodically by ``run``, the dead tasks are reaped even if nothing is submitted or released. The ready queue is
+    disabled (the tasks are released immediately) if ``capacity`` is 0.
+
+    The ``dispatch`` function is called with the signature of the Celery task to release (a dictionary).
+    """
+
+    READY = u'READY'
+    RUNNING = u'RUNNING'
+
+    def __init__(self, collection, dispatch, capacity=0, weights=None, is_alive=None, reap_delay=600):
+        self.collection = collection
+        self.dispatch = dispatch
+        self.capacity = capacity
+        self.weights = weights or {}
+        self.is_alive = is_alive
+        self.reap_delay = reap_delay
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def submit(self, user_id, queue, signature, tasks_ids, priority=0, slots=1):
+        u"""
+        Append a task (the Celery task with ``signature`` that executes the transformation tasks ``tasks_ids``) to the
+        ready queue ``queue`` and release the tasks that fit in the free slots. Return True if the task was released.
+        """
+        if not self.enabled:
+            self.dispatch(signature)
+            return True
+        self.collection.save({
+            u'_id': tasks_ids[0], u'tasks_ids': tasks_ids, u'user_id': user_id, u'queue': queue,
+            u'priority': priority, u'slots': slots, u'signature': signature, u'status': self.READY,
+            u'add_date': time.time()
+        }, safe=True)
+        return tasks_ids[0] in self.schedule(queue)
+
+    def release(self, task_id):
+        u"""
+        Remove the task from the ready queue (freeing its slots) and release the next tasks of its queue.
+        Return True if the task was waiting in the ready queue (not yet released to the workers).
+        """
+        entry = self.collection.find_and_modify({u'tasks_ids': task_id}, remove=True)
+        if not entry:
+            return False
+        self.schedule(entry[u'queue'])
+        return entry[u'status'] == self.READY
+
+    def reap(self, queue):
+        u"""
+        Free the slots of the released tasks of the queue ``queue`` that are no longer alive, the tasks released less
+        than ``reap_delay`` seconds ago are kept (the workers may not have started them yet). Return the ids of the
+        tasks.
+        """
+        if not self.is_alive:
+            return []
+        reaped = []
+        spec = {u'queue': queue, u'status': self.RUNNING, u'release_date': {u'$lt': time.time() - self.reap_delay}}
+        for entry in list(self.collection.find(spec, {u'signature': 0})):
+            if self.is_alive(entry[u'_id'], queue):
+                continue
+            if self.collection.find_and_modify({u'_id': entry[u'_id'], u'status': self.RUNNING}, remove=True):
+                logging.warning(u'Task {0} of queue {1} is not alive, slots freed.'.format(entry[u'_id'], queue))
+                reaped.append(entry[u'_id'])
+        return reaped
+
+    def schedule(self, queue):
+        u"""Release the tasks of the ready queue ``queue`` that fit in the free slots, return the ids of the tasks."""
+        if not self.enabled:
+            return []
+        self.reap(queue)
+        ready = list(self.collection.find({u'queue': queue, u'status': self.READY}, {u'signature': 0}))
+        running = list(self.collection.find({u'queue': queue, u'status': self.RUNNING}, {u'signature': 0}))
+        released = []
+        for entry in select_entries(ready, running, self.capacity, self.weights):
+            # Claim the task atomically, another process serving the API may release it concurrently
+            entry = self.collection.find_and_modify({u'_id': entry[u'_id'], u'status': self.READY},
+                                                    {u'$set': {u'status': self.RUNNING, u'release_date': time.time()}},
+                                                    new=True)
+            if not entry:
+                continue
+            try:
+                self.dispatch(entry[u'signature'])
+            except Exception:
+                logging.exception(u'Unable to release task {0} to queue {1}.'.format(entry[u'_id'], queue))
+                self.collection.update({u'_id': entry[u'_id']}, {u'$set': {u'status': self.READY}}, safe=True)
+                break
+            released.append(entry[u'_id'])
+        return released
+
+    def run(self, queues, interval):
+        u"""Schedule the queues ``queues`` every ``interval`` seconds, forever (e.g. by a daemon thread)."""
+        while True:
+            time.sleep(interval)
+            for queue in queues:
+                try:
+                    self.schedule(queue)
+                except Exception:
+                    logging.exception(u'Unable to schedule queue {0}.'.format(queue))
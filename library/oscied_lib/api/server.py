@@ -26,37 +26,40 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import logging, mongomock, pymongo, smtplib, uuid
-from celery.task.control import revoke
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from jinja2 import Template
-from pymongo.errors import DuplicateKeyError
-from pytoolbox import juju
-from pytoolbox.datetime import datetime_now
+import hashlib, logging, os, threading, time, uuid
+from pytoolbox.datetime import datetime_now, total_seconds
 from pytoolbox.encoding import to_bytes
+from pytoolbox.filesystem import try_makedirs
 from pytoolbox.serialization import dict2object, object2dict, object2json
 from pytoolbox.validation import valid_uuid
 from random import randint
 
-from .. import PublisherWorker, TransformWorker
-from ..constants import UUID_ZERO
-from ..models import Media, User, TransformProfile, PublisherTask, TransformTask, ENCODERS_NAMES
+from ..constants import UPLOAD_CHUNK_SIZE, UUID_ZERO
+from ..models import Media, User, TransformProfile, PublisherTask, TransformTask, Workflow, ENCODERS_NAMES
+from ..progress import get_progress
 from ..utils import Callback, Storage
 from .base import ABOUT
+from .predictor import get_transform_sample, predict_transform
+from .scheduler import TaskScheduler
+from .snapshot import StatusSnapshots
 
 
 class OrchestraAPICore(object):
-    u"""Core class of the orchestration unit containing the implementation of the methods."""
+    u"""
+    Core class of the orchestration unit containing the implementation of the methods.
+
+    The heavy dependencies (Celery and the workers, MongoDB drivers, JuJu, e-mail delivery) are imported on first use,
+    this keeps the API package fast to import for the clients and the charms hooks.
+    """
 
     # <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<< Constructor >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
 
     def __init__(self, config):
         self.config = config
-        if self.config.is_mock:
-            self._db = mongomock.Connection().orchestra
-        else:
-            self._db = pymongo.Connection(config.mongo_admin_connection)[u'orchestra']
+        self._db_instance = self._db_pid = None
+        self._progress_instance = self._progress_pid = None
+        self._scheduler_pid = None
+        self.snapshots = StatusSnapshots(config.status_max_age, config.status_refresh_delay)
         self.config_db()
         self.root_user = User(first_name=u'root', last_name=u'oscied', mail=u'root@oscied.org',
                               secret=self.config.root_secret, admin_platform=True, _id=UUID_ZERO)
@@ -65,6 +68,59 @@ class OrchestraAPICore(object):
 
     # <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<< Properties >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
 
+    @property
+    def _db(self):
+        u"""
+        Return the orchestra database, the connection is created (again) in any new (e.g. pre-forked) worker process.
+
+        Sockets of the connection to MongoDB must not be shared between the processes serving the API. The mocked
+        database lives in memory and is inherited by the worker processes.
+        """
+        pid = os.getpid()
+        if self._db_instance is None or (self._db_pid != pid and not self.config.is_mock):
+            if self.config.is_mock:
+                import mongomock
+                self._db_instance = mongomock.Connection().orchestra
+            else:
+                import pymongo
+                self._db_instance = pymongo.Connection(self.config.mongo_admin_connection)[u'orchestra']
+            self._db_pid = pid
+        return self._db_instance
+
+    @property
+    def _progress(self):
+        u"""Return the collection of the progress of the tasks published by the workers (in the Celery database)."""
+        pid = os.getpid()
+        if self._progress_instance is None or (self._progress_pid != pid and not self.config.is_mock):
+            if self.config.is_mock:
+                self._progress_instance = self._db.progress
+            else:
+                import pymongo
+                database = pymongo.uri_parser.parse_uri(self.config.mongo_node_connection)[u'database']
+                self._progress_instance = pymongo.Connection(self.config.mongo_node_connection)[database].progress
+            self._progress_pid = pid
+        return self._progress_instance
+
+    @property
+    def scheduler(self):
+        u"""
+        Return the scheduler holding the transformation tasks in a ready queue, see ``TaskScheduler``.
+
+        The queues are scheduled every tenth of the reap delay by a daemon thread, started on first use (again in a
+        forked process).
+        """
+        scheduler = TaskScheduler(self._db.transform_queue, self._dispatch, self.config.transform_capacity,
+                                  self.config.transform_weights, self._is_transform_alive,
+                                  self.config.transform_reap_delay)
+        pid = os.getpid()
+        if scheduler.enabled and self._scheduler_pid != pid and not self.config.is_mock:
+            thread = threading.Thread(target=scheduler.run, name=u'scheduler',
+                                      args=(self.config.transform_queues, self.config.transform_reap_delay / 10))
+            thread.daemon = True
+            thread.start()
+            self._scheduler_pid = pid
+        return scheduler
+
     @property
     def about(self):
         return ABOUT
@@ -84,16 +140,35 @@ class OrchestraAPICore(object):
     # <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<< Functions >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
 
     def config_db(self):
+        # Move media assets deleted by previous releases (status was DELETED in medias) to the tombstones collection
+        for entity in self._db.medias.find({u'status': Media.DELETED}):
+            self._db.medias_deleted.save(entity, safe=True)
+            self._db.medias.remove({u'_id': entity[u'_id']})
         self._db.users.ensure_index('mail', unique=True)
         self._db.medias.ensure_index('uri', unique=True)
+        self._db.medias_deleted.ensure_index('user_id')
+        self._db.upload_sessions.ensure_index('user_id')
+        self._progress.ensure_index('task_id')
+        self._db.transform_queue.ensure_index('tasks_ids')
+        self._db.transform_queue.ensure_index([('queue', 1), ('status', 1)])
         self._db.transform_profiles.ensure_index('title', unique=True)
+        self._db.transform_tasks.ensure_index('profile_id')
+        self._db.workflows.ensure_index('tasks_ids')
 
     def flush_db(self):
-        for collection in (u'users', u'medias', u'transform_profiles', u'transform_tasks', u'publisher_tasks'):
+        for collection in (u'users', u'medias', u'medias_deleted', u'upload_sessions', u'transform_profiles',
+                           u'transform_tasks', u'transform_queue', u'publisher_tasks', u'workflows'):
             self._db.drop_collection(collection)
         self.config_db()
         logging.info(u"Orchestra database's collections dropped !")
 
+    @staticmethod
+    def ids_spec(ids):
+        u"""Return the spec to retrieve the documents with ids ``ids`` (a list of UUIDs) with one query."""
+        if not isinstance(ids, list) or not all(valid_uuid(_id, none_allowed=False) for _id in ids):
+            raise ValueError(to_bytes(u'Ids must be a list of valid UUIDs.'))
+        return {u'_id': {u'$in': ids}}
+
     def only_standalone(self):
         if not self.config.is_standalone:
             raise RuntimeError(to_bytes(u'This method is only available in standalone mode.'))
@@ -102,6 +177,9 @@ class OrchestraAPICore(object):
         if not self.config.email_server:
             logging.debug(u'E-mail delivery is disabled in configuration.')
             return {}
+        import smtplib
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
         part1 = MIMEText(text_plain, u'plain')
         part2 = MIMEText(text_html, u'html') if text_html else None
         msg = part1 if not part2 else MIMEMultipart(u'alternative')
@@ -124,11 +202,12 @@ class OrchestraAPICore(object):
 
     def send_email_task(self, task, status, media=None, media_out=None):
         if task.send_email:
+            from jinja2 import Template
             user = self.get_user({u'_id': task.user_id}, {u'mail': 1})
             if not user:
                 raise IndexError(to_bytes(u'Unable to find user with id {0}.'.format(task.user_id)))
             if isinstance(task, TransformTask):
-                media_in = self.get_media({u'_id': task.media_in_id})
+                media_in = self._get_media_or_tombstone(task.media_in_id)
                 if not media_in:
                     # FIXME maybe do not raise but put default value or return ?
                     raise IndexError(to_bytes(u'Unable to find input media asset with id {0}.'.format(
@@ -145,15 +224,32 @@ class OrchestraAPICore(object):
                 template, name = self.config.email_ptask_template, u'Publication'
             else:
                 return  # FIXME oups
-            task.append_async_result()
+            self.append_progress([task])
             with open(template, u'r', u'utf-8') as template_file:
                 text_plain = Template(template_file.read()).render(object2dict(task, include_properties=True))
                 # FIXME YourFormatter().format(template_file.read(), task)
             self.send_email(task.user.mail, u'OSCIED - {0} task {1} {2}'.format(name, task._id, status), text_plain)
 
+    def append_progress(self, tasks):
+        u"""
+        Append the progress published by the workers to the tasks, the progress is retrieved with one query.
+
+        The result of a task without any published progress (e.g. pending) is retrieved from the Celery result backend.
+        """
+        progress = get_progress(self._progress, [task._id for task in tasks]) if tasks else {}
+        for task in tasks:
+            document = progress.get(task._id)
+            if document is None:
+                task.append_async_result()
+                continue
+            if task.status not in task.CANCELED_STATUS:
+                task.status = document[u'state']
+            task.statistic.update(document[u'meta'])
+
     # ------------------------------------------------------------------------------------------------------------------
 
     def save_user(self, user, hash_secret):
+        from pymongo.errors import DuplicateKeyError
         self.only_standalone()
         user.is_valid(True)
         if hash_secret:
@@ -201,7 +297,17 @@ class OrchestraAPICore(object):
 
     # ------------------------------------------------------------------------------------------------------------------
 
+    def _get_medias_collection(self, deleted):
+        u"""Return the collection of the live media assets or the collection of the tombstones if ``deleted``."""
+        return self._db.medias_deleted if deleted else self._db.medias
+
     def save_media(self, media):
+        u"""
+        Save a media asset, a media asset with status DELETED is moved from medias to the tombstones collection.
+
+        Keeping the tombstones apart keeps the listing of the live media assets (and its indexes) lean.
+        """
+        from pymongo.errors import DuplicateKeyError
         media.is_valid(True)
         if not media.get_metadata(u'title'):
             raise ValueError(to_bytes(u"Title key is required in media asset's metadata."))
@@ -217,19 +323,25 @@ class OrchestraAPICore(object):
         if duration:
             media.add_metadata(u'duration', duration, True)
         media.add_metadata(u'add_date', datetime_now(), True)
+        if media.status == Media.DELETED:
+            self._db.medias_deleted.save(media.__dict__, safe=True)
+            self._db.medias.remove({u'_id': media._id})
+            return
         try:
             self._db.medias.save(media.__dict__, safe=True)
         except DuplicateKeyError:
             raise ValueError(to_bytes(u'The media URI {0} is already used by another media asset.'.format(media.uri)))
+        self._db.medias_deleted.remove({u'_id': media._id})  # A media asset is either live or a tombstone
 
-    def get_media(self, spec, fields=None, load_fields=False):
-        entity = self._db.medias.find_one(spec, fields)
+    def get_media(self, spec, fields=None, load_fields=False, deleted=False):
+        u"""Return a media asset, the tombstones of the deleted media assets are only searched if ``deleted``."""
+        entity = self._get_medias_collection(deleted).find_one(spec, fields)
         if not entity:
             return None
         media = dict2object(Media, entity, inspect_constructor=True)
         if load_fields:
             media.load_fields(self.get_user({u'_id': media.user_id}, {u'secret': 0}),
-                              self.get_media({u'_id': media.parent_id}))
+                              self._get_media_or_tombstone(media.parent_id))
 
         if not self.config.is_standalone:
             # Add read path to the media asset
@@ -250,33 +362,148 @@ class OrchestraAPICore(object):
             raise ValueError(to_bytes(u'Cannot delete the media asset, it is actually in use by publication task with i'
                              'd {0} and status {1}.'.format(task._id, task.status)))
         media.status = Media.DELETED
-        self.save_media(media)
-        #self._db.medias.remove({'_id': media._id})
+        self.save_media(media)  # Move the media asset to the tombstones collection
         Storage.delete_media(self.config, media)
 
-    def get_medias(self, spec=None, fields=None, skip=0, limit=0, sort=None, load_fields=False):
+    def _get_media_or_tombstone(self, media_id):
+        u"""Return a media asset, even if deleted (e.g. output of a revoked task), this is used to load fields."""
+        return self.get_media({u'_id': media_id}) or self.get_media({u'_id': media_id}, deleted=True)
+
+    def get_medias(self, spec=None, fields=None, skip=0, limit=0, sort=None, load_fields=False, deleted=False):
+        u"""Return the media assets, the tombstones of the deleted media assets are only listed if ``deleted``."""
         medias, sort = [], sort or [('metadata.title',  1)]  # Sort by default, this is nicer like that !
-        for entity in list(self._db.medias.find(spec=spec, fields=fields, skip=int(skip), limit=int(limit), sort=sort,
-                                                **self.db_find_options)):
+        for entity in list(self._get_medias_collection(deleted).find(spec=spec, fields=fields, skip=int(skip),
+                           limit=int(limit), sort=sort, **self.db_find_options)):
             media = dict2object(Media, entity, inspect_constructor=True)
             if load_fields:
                 media.load_fields(self.get_user({u'_id': media.user_id}, {u'secret': 0}),
-                                  self.get_media({u'_id': media.parent_id}))
+                                  self._get_media_or_tombstone(media.parent_id))
             medias.append(media)
         return medias
 
-    def get_medias_count(self, spec=None):
-        return self._db.medias.find(spec, {u'_id': 1}).count()
+    def get_medias_count(self, spec=None, deleted=False):
+        return self._get_medias_collection(deleted).find(spec, {u'_id': 1}).count()
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def _get_upload_filename(self, session_id):
+        return os.path.join(self.config.storage_uploads_path, u'{0}.part'.format(session_id))
+
+    def create_upload_session(self, user_id, filename, size, metadata, chunk_size=UPLOAD_CHUNK_SIZE):
+        u"""
+        Create an upload session for a media asset of ``size`` bytes and pre-allocate its (partial) file.
+
+        The chunks of ``chunk_size`` bytes can then be uploaded in any order (and in parallel) with ``upload_chunk``.
+        """
+        size, chunk_size = int(size), int(chunk_size)
+        if size <= 0 or chunk_size <= 0:
+            raise ValueError(to_bytes(u'Size and chunk size must be positive.'))
+        if not metadata or not metadata.get(u'title'):
+            raise ValueError(to_bytes(u"Title key is required in media asset's metadata."))
+        session = {
+            u'_id': unicode(uuid.uuid4()), u'user_id': user_id, u'filename': filename, u'size': size,
+            u'chunk_size': chunk_size, u'metadata': metadata, u'chunks': {}, u'add_date': datetime_now()
+        }
+        try_makedirs(self.config.storage_uploads_path)
+        with open(self._get_upload_filename(session[u'_id']), u'wb') as f:
+            f.truncate(size)
+        self._db.upload_sessions.save(session, safe=True)
+        return self.get_upload_session(session[u'_id'])
+
+    def get_upload_session(self, session_id):
+        u"""Return an upload session with the offsets of the ``missing`` chunks (to resume the upload) or None."""
+        session = self._db.upload_sessions.find_one({u'_id': session_id})
+        if session:
+            session[u'missing'] = [offset for offset in xrange(0, session[u'size'], session[u'chunk_size'])
+                                   if unicode(offset) not in session[u'chunks']]
+        return session
+
+    def upload_chunk(self, session_id, offset, stream, block_size=1024*1024):
+        u"""
+        Write a chunk read from ``stream`` at ``offset`` of the file of an upload session.
+
+        The chunk is written straight into the uploads directory of the shared storage and its MD5 checksum is computed
+        while streaming. A chunk can be uploaded again (e.g. retried), the last one wins.
+        """
+        session = self.get_upload_session(session_id)
+        if not session:
+            raise IndexError(to_bytes(u'No upload session with id {0}.'.format(session_id)))
+        offset, size, chunk_size = int(offset), session[u'size'], session[u'chunk_size']
+        if offset < 0 or offset >= size or offset % chunk_size:
+            raise ValueError(to_bytes(u'Offset {0} is not the offset of a chunk of {1} bytes.'.format(offset,
+                             chunk_size)))
+        length = remaining = min(chunk_size, size - offset)
+        md5 = hashlib.md5()
+        with open(self._get_upload_filename(session_id), u'r+b') as f:
+            f.seek(offset)
+            while remaining > 0:
+                data = stream.read(min(block_size, remaining))
+                if not data:
+                    break
+                md5.update(data)
+                f.write(data)
+                remaining -= len(data)
+        if remaining or stream.read(1):
+            raise ValueError(to_bytes(u'Chunk at offset {0} must be of {1} bytes.'.format(offset, length)))
+        checksum = md5.hexdigest()
+        self._db.upload_sessions.update({u'_id': session_id}, {u'$set': {u'chunks.{0}'.format(offset): checksum}},
+                                        safe=True)
+        return {u'offset': offset, u'size': length, u'md5': checksum}
+
+    def commit_upload_session(self, session_id):
+        u"""
+        Rename the file of a completed upload session and register the media asset (see ``save_media``).
+
+        The checksum of the media asset is the MD5 of the checksums of the chunks followed by the number of chunks (as
+        computed by the multipart uploads of object storages), the file is not read again.
+        """
+        session = self.get_upload_session(session_id)
+        if not session:
+            raise IndexError(to_bytes(u'No upload session with id {0}.'.format(session_id)))
+        if session[u'missing']:
+            raise ValueError(to_bytes(u'Upload session with id {0} is missing {1} chunks.'.format(session_id,
+                             len(session[u'missing']))))
+        offsets = sorted(int(offset) for offset in session[u'chunks'])
+        checksum = hashlib.md5(b''.join(session[u'chunks'][unicode(o)].decode(u'hex') for o in offsets)).hexdigest()
+        upload_filename = self._get_upload_filename(session_id)
+        filename = os.path.join(self.config.storage_uploads_path, u'{0}_{1}'.format(session_id, session[u'filename']))
+        os.rename(upload_filename, filename)
+        media = Media(user_id=session[u'user_id'], uri=self.config.storage_uri(os.path.relpath(filename,
+                      self.config.storage_path)), filename=session[u'filename'], metadata=session[u'metadata'],
+                      status=Media.READY)
+        media.add_metadata(u'checksum', u'{0}-{1}'.format(checksum, len(offsets)), True)
+        try:
+            self.save_media(media)
+        except Exception:
+            # Move the file back (the storage may have moved it already), the session can be committed again or deleted
+            path = self.config.storage_medias_path(media, generate=False)
+            if path and os.path.exists(path):
+                os.rename(path, upload_filename)
+            raise
+        self._db.upload_sessions.remove({u'_id': session_id})
+        return media
+
+    def delete_upload_session(self, session_id):
+        u"""Abort an upload session and remove its (partial) file."""
+        if not self._db.upload_sessions.find_one({u'_id': session_id}):
+            raise IndexError(to_bytes(u'No upload session with id {0}.'.format(session_id)))
+        try:
+            os.remove(self._get_upload_filename(session_id))
+        except OSError:
+            pass
+        self._db.upload_sessions.remove({u'_id': session_id})
 
     # ------------------------------------------------------------------------------------------------------------------
 
     def _get_environment(self, name):
         u"""Return an instance of the environment class to control environment ``name``."""
+        from pytoolbox import juju
         return juju.Environment(name, config=self.config.charms_config, release=self.config.charms_release, auto=True)
 
     def add_environment(self, name, type, region, access_key, secret_key, control_bucket, test=False):
         if not test:
             raise NotImplementedError(u'This method is in development, set test to True to disable this warning.')
+        from pytoolbox import juju
         return juju.add_environment(name, type, region, access_key, secret_key, control_bucket,
                                     self.config.charms_release, environments=self.config.juju_config_file)
 
@@ -288,10 +515,31 @@ class OrchestraAPICore(object):
                                                    environments=self.config.juju_config_file)
 
     def get_environment(self, name, get_status=False):
-        return juju.get_environment(name, get_status=get_status, environments=self.config.juju_config_file)
+        from pytoolbox import juju
+        if get_status:
+            return self.snapshots.get(u'environment/{0}'.format(name), lambda: juju.get_environment(
+                                      name, get_status=True, environments=self.config.juju_config_file))
+        return juju.get_environment(name, get_status=False, environments=self.config.juju_config_file)
 
     def get_environments(self, get_status=False):
-        return juju.get_environments(get_status=get_status, environments=self.config.juju_config_file)
+        u"""Return the environments, the status is served from a snapshot, see ``get_status_date``."""
+        from pytoolbox import juju
+        if get_status:
+            return self.snapshots.get(u'environments', lambda: juju.get_environments(
+                                      get_status=True, environments=self.config.juju_config_file))
+        return juju.get_environments(get_status=False, environments=self.config.juju_config_file)
+
+    def get_status_date(self, name=None):
+        u"""Return the date of the snapshot of the status of the environments (or of environment ``name``)."""
+        return self.snapshots.get_date(u'environment/{0}'.format(name) if name else u'environments')
+
+    def _get_units_snapshot(self, environment, service, count=False):
+        u"""Return the units (or the number of units) of a service from a snapshot of the status of the environment."""
+        key = u'{0}/{1}/{2}'.format(environment, service, u'count' if count else u'units')
+        the_environment = self._get_environment(environment)
+        if count:
+            return self.snapshots.get(key, lambda: the_environment.get_units_count(service))
+        return self.snapshots.get(key, lambda: the_environment.get_units(service))
 
     # ------------------------------------------------------------------------------------------------------------------
 
@@ -299,6 +547,7 @@ class OrchestraAPICore(object):
         return ENCODERS_NAMES
 
     def save_transform_profile(self, profile):
+        from pymongo.errors import DuplicateKeyError
         profile.is_valid(True)
         # FIXME exact matching !
         try:
@@ -348,6 +597,7 @@ class OrchestraAPICore(object):
         if environment == 'default':
             environment = default
         same_environment = (environment == default)
+        from pytoolbox import juju
         config = juju.load_unit_config(self.config.transform_config)
         config[u'rabbit_queues'] = u'transform_{0}'.format(environment)
         if not same_environment:
@@ -362,38 +612,44 @@ class OrchestraAPICore(object):
             config[u'storage_options'] = self.config.storage_options
         juju.save_unit_config(self.config.charms_config, self.config.transform_service, config)
         the_environment = self._get_environment(environment)
-        the_environment.ensure_num_units(self.config.transform_service, local=True, num_units=num_units,
-                                         terminate=terminate, repository=self.config.charms_repository)
-        if same_environment and num_units:
-            try:
-                try:
-                    the_environment.add_relation(self.config.orchestra_service, self.config.transform_service,
-                                                 u'transform', u'transform')
-                except RuntimeError as e:
-                    raise NotImplementedError(to_bytes(u'Orchestra service must be available and running on default '
-                                              'environment {0}, reason : {1}'.format(default, e)))
+        try:
+            the_environment.ensure_num_units(self.config.transform_service, local=True, num_units=num_units,
+                                             terminate=terminate, repository=self.config.charms_repository)
+            if same_environment and num_units:
                 try:
-                    the_environment.add_relation(self.config.storage_service, self.config.transform_service)
-                except RuntimeError as e:
-                    raise NotImplementedError(to_bytes(u'Storage service must be available and running on default '
-                                              'environment {0}, reason : {1}'.format(default, e)))
-            except NotImplementedError:
-                the_environment.destroy_service(self.config.transform_service)
-                raise
+                    try:
+                        the_environment.add_relation(self.config.orchestra_service, self.config.transform_service,
+                                                     u'transform', u'transform')
+                    except RuntimeError as e:
+                        raise NotImplementedError(to_bytes(u'Orchestra service must be available and running on '
+                                                  'default environment {0}, reason : {1}'.format(default, e)))
+                    try:
+                        the_environment.add_relation(self.config.storage_service, self.config.transform_service)
+                    except RuntimeError as e:
+                        raise NotImplementedError(to_bytes(u'Storage service must be available and running on default '
+                                                  'environment {0}, reason : {1}'.format(default, e)))
+                except NotImplementedError:
+                    the_environment.destroy_service(self.config.transform_service)
+                    raise
+        finally:
+            self.snapshots.invalidate()  # Units were added or removed
 
     def get_transform_unit(self, environment, number):
         return self._get_environment(environment).get_unit(self.config.transform_service, number)
 
     def get_transform_units(self, environment):
-        return self._get_environment(environment).get_units(self.config.transform_service)
+        return self._get_units_snapshot(environment, self.config.transform_service)
 
     def get_transform_units_count(self, environment):
-        return self._get_environment(environment).get_units_count(self.config.transform_service)
+        return self._get_units_snapshot(environment, self.config.transform_service, count=True)
 
     def destroy_transform_unit(self, environment, number, terminate, test=False):
         if not test:
             raise NotImplementedError(u'This method is in development, set test to True to disable this warning.')
-        self._get_environment(environment).destroy_unit(self.config.transform_service, number, terminate)
+        try:
+            self._get_environment(environment).destroy_unit(self.config.transform_service, number, terminate)
+        finally:
+            self.snapshots.invalidate()
 
     # ------------------------------------------------------------------------------------------------------------------
 
@@ -401,7 +657,14 @@ class OrchestraAPICore(object):
         return self.config.transform_queues
 
     def launch_transform_task(self, user_id, media_in_id, profile_id, filename, metadata, send_email, queue,
-                              callback_url):
+                              callback_url, segment_duration=None, priority=0):
+        u"""
+        Launch a transformation task. If ``segment_duration`` (seconds) is set, the input media asset is split into
+        segments transcoded in parallel by the transformation units of the queue then concatenated (ffmpeg only).
+
+        The task is released to the transformation units by the scheduler, by ``priority`` (the highest first) then by
+        fair-share across the users, see ``TaskScheduler``.
+        """
         if self.config.is_standalone:
             user = self.get_user({u'_id': user_id}, {u'secret': 0})
             if not user:
@@ -414,6 +677,8 @@ class OrchestraAPICore(object):
             raise IndexError(to_bytes(u'No transformation profile with id {0}.'.format(profile_id)))
         if not queue in self.config.transform_queues:
             raise IndexError(to_bytes(u'No transformation queue with name {0}.'.format(queue)))
+        segments = self._get_segments(media_in, profile, segment_duration)
+        priority = self._get_priority(priority)
         media_out = Media(user_id=user_id, parent_id=media_in_id, filename=filename, metadata=metadata,
                           status=Media.PENDING)
         media_out.uri = self.config.storage_medias_uri(media_out)
@@ -421,22 +686,190 @@ class OrchestraAPICore(object):
         self.save_media(media_out)  # Save pending output media
         # FIXME create a one-time password to avoid fixed secret authentication ...
         callback = Callback(self.config.api_url + callback_url, u'node', self.config.node_secret)
-        if self.config.is_mock:
-            result_id = unicode(uuid.uuid4())
-        else:
-            result = TransformWorker.transform_task.apply_async(
-                args=(object2json(media_in, False), object2json(media_out, False), object2json(profile, False),
-                      object2json(callback, False)), queue=queue)
-            result_id = result.id
-        if not result_id:
-            raise ValueError(to_bytes(u'Unable to transmit task to workers of queue {0}.'.format(queue)))
-        logging.info(u'New transformation task {0} -> queue {1}.'.format(result_id, queue))
+        # The id of a segmented transformation task is the id of the concatenation (the callback of the chord)
+        result_id, segments_ids = unicode(uuid.uuid4()), [unicode(uuid.uuid4()) for segment in segments]
+        signature = None
+        if not self.config.is_mock:
+            from .. import TransformWorker
+            args = (object2json(media_in, False), object2json(media_out, False), object2json(profile, False),
+                    object2json(callback, False))
+            if segments:
+                from celery import chord
+                header = [TransformWorker.transform_segment_task.subtask(
+                          args=args + (result_id, index, len(segments), start, duration),
+                          options={u'queue': queue, u'task_id': segments_ids[index]})
+                          for index, (start, duration) in enumerate(segments)]
+                body = TransformWorker.transform_concat_task.subtask(
+                    args=args, options={u'queue': queue, u'task_id': result_id})
+                signature = chord(header, body)
+            else:
+                signature = TransformWorker.transform_task.subtask(
+                    args=args, options={u'queue': queue, u'task_id': result_id})
+        released = self.scheduler.submit(user_id, queue, signature, [result_id], priority, max(1, len(segments)))
+        logging.info(u'New transformation task {0} -> queue {1} ({2}).'.format(
+                     result_id, queue, u'released' if released else u'ready queue'))
         task = TransformTask(user_id=user_id, media_in_id=media_in._id, media_out_id=media_out._id,
                              profile_id=profile._id, send_email=send_email, _id=result_id)
         task.statistic[u'add_date'] = datetime_now()
+        task.statistic[u'priority'] = priority
+        estimate = self._estimate_transform(media_in, profile)
+        if estimate:
+            task.statistic[u'estimate'] = estimate
+        if segments:
+            task.statistic[u'segments'] = segments_ids
         self._db.transform_tasks.save(task.__dict__, safe=True)
         return task
 
+    def launch_transform_ladder(self, user_id, media_in_id, outputs, send_email, queue, callback_url, priority=0):
+        u"""
+        Launch the transformation tasks of a ladder, the renditions ``outputs`` (a list of dictionaries with the keys
+        profile_id, filename and metadata) of the input media asset are encoded by only one FFmpeg process.
+
+        Every rendition is a transformation task with its own output media asset, the ids of the tasks of the ladder
+        are appended to their ``statistic`` as ``ladder``. The ladder is scheduled like one transformation task.
+        """
+        if self.config.is_standalone:
+            user = self.get_user({u'_id': user_id}, {u'secret': 0})
+            if not user:
+                raise IndexError(to_bytes(u'No user with id {0}.'.format(user_id)))
+        media_in = self.get_media({u'_id': media_in_id})
+        if not media_in:  # FIXME maybe a media access control here
+            raise IndexError(to_bytes(u'No media asset with id {0}.'.format(media_in_id)))
+        if not queue in self.config.transform_queues:
+            raise IndexError(to_bytes(u'No transformation queue with name {0}.'.format(queue)))
+        if not isinstance(outputs, list) or not outputs:
+            raise ValueError(to_bytes(u'Outputs must be a non-empty list of renditions.'))
+        priority = self._get_priority(priority)
+        profiles, medias_out = [], []
+        for output in outputs:
+            profile = self.get_transform_profile({u'_id': output[u'profile_id']})
+            if not profile:  # FIXME maybe a profile access control here
+                raise IndexError(to_bytes(u'No transformation profile with id {0}.'.format(output[u'profile_id'])))
+            if profile.encoder_name != u'ffmpeg':
+                raise ValueError(to_bytes(u'A ladder can only be encoded with the ffmpeg encoder.'))
+            media_out = Media(user_id=user_id, parent_id=media_in_id, filename=output[u'filename'],
+                              metadata=output[u'metadata'], status=Media.PENDING)
+            media_out.uri = self.config.storage_medias_uri(media_out)
+            TransformTask.validate_task(media_in, profile, media_out)
+            profiles.append(profile)
+            medias_out.append(media_out)
+        for media_out in medias_out:
+            self.save_media(media_out)  # Save pending output media
+        # FIXME create a one-time password to avoid fixed secret authentication ...
+        callback = Callback(self.config.api_url + callback_url, u'node', self.config.node_secret)
+        tasks_ids, signature = [unicode(uuid.uuid4()) for output in outputs], None
+        if not self.config.is_mock:
+            from .. import TransformWorker
+            signature = TransformWorker.transform_ladder_task.subtask(
+                args=(object2json(media_in, False), [object2json(media_out, False) for media_out in medias_out],
+                      [object2json(profile, False) for profile in profiles], object2json(callback, False),
+                      tasks_ids), options={u'queue': queue, u'task_id': tasks_ids[0]})
+        released = self.scheduler.submit(user_id, queue, signature, tasks_ids, priority)
+        logging.info(u'New transformation ladder {0} -> queue {1} ({2}).'.format(
+                     tasks_ids, queue, u'released' if released else u'ready queue'))
+        tasks = []
+        for task_id, media_out, profile in zip(tasks_ids, medias_out, profiles):
+            task = TransformTask(user_id=user_id, media_in_id=media_in._id, media_out_id=media_out._id,
+                                 profile_id=profile._id, send_email=send_email, _id=task_id)
+            task.statistic[u'add_date'] = datetime_now()
+            task.statistic[u'ladder'] = tasks_ids
+            task.statistic[u'priority'] = priority
+            estimate = self._estimate_transform(media_in, profile)
+            if estimate:
+                task.statistic[u'estimate'] = estimate
+            self._db.transform_tasks.save(task.__dict__, safe=True)
+            tasks.append(task)
+        return tasks
+
+    def estimate_transform_task(self, media_in_id, profile_id, unit_type=None):
+        u"""
+        Return the estimated ``elapsed_time`` (seconds) and ``media_out_size`` (bytes) of a transformation task, learned
+        from the statistic of the successful tasks with the same profile, None if there are not enough of them.
+        The estimate is specific to the units of type ``unit_type`` if there are enough tasks done by such units.
+        """
+        media_in = self.get_media({u'_id': media_in_id})
+        if not media_in:
+            raise IndexError(to_bytes(u'No media asset with id {0}.'.format(media_in_id)))
+        profile = self.get_transform_profile({u'_id': profile_id})
+        if not profile:
+            raise IndexError(to_bytes(u'No transformation profile with id {0}.'.format(profile_id)))
+        return self._estimate_transform(media_in, profile, unit_type)
+
+    def _estimate_transform(self, media_in, profile, unit_type=None, max_samples=100):
+        u"""Return the estimate of a transformation task from the ``max_samples`` latest tasks with the profile."""
+        duration = media_in.metadata.get(u'duration')
+        if not duration:
+            return None
+        # The segmented transcodes and the ladders are not representative of a transformation task
+        spec = {u'profile_id': profile._id, u'status': TransformTask.SUCCESS,
+                u'statistic.elapsed_time': {u'$exists': True}, u'statistic.segments': {u'$exists': False},
+                u'statistic.ladder': {u'$exists': False}}
+        entities = self._db.transform_tasks.find(spec, {u'statistic': 1}, sort=[('statistic.add_date', -1)],
+                                                 limit=max_samples)
+        samples = filter(None, (get_transform_sample(entity[u'statistic']) for entity in entities))
+        return predict_transform(samples, total_seconds(duration), unit_type)
+
+    @staticmethod
+    def _get_priority(priority):
+        u"""Return the priority of a transformation task as an integer, the highest priority is released first."""
+        try:
+            return int(priority or 0)
+        except (TypeError, ValueError):
+            raise ValueError(to_bytes(u'Priority must be an integer, {0} given.'.format(priority)))
+
+    def _dispatch(self, signature):
+        u"""Send the Celery task with ``signature`` released by the scheduler to the workers."""
+        if not self.config.is_mock:
+            from celery import subtask
+            subtask(signature).apply_async()
+
+    def _is_transform_alive(self, task_id, queue):
+        u"""
+        Return False if the transformation task is done, if its progress is older than the reap delay of the scheduler
+        (e.g. its worker died) or if it is not started and neither the workers nor the broker (the queue ``queue`` is
+        empty) hold it, see ``TaskScheduler.reap``.
+        """
+        document = get_progress(self._progress, [task_id]).get(task_id)
+        if document:
+            return (document[u'state'] not in TransformTask.FINAL_STATUS and
+                    time.time() - document[u'date'] < self.config.transform_reap_delay)
+        if self.config.is_mock:
+            return True
+        from celery import current_app
+        from celery.result import AsyncResult
+        state = AsyncResult(task_id).state
+        if state != TransformTask.PENDING:
+            return state not in TransformTask.FINAL_STATUS  # Started (the started state is tracked) or done
+        try:
+            inspect = current_app.control.inspect()
+            for tasks in (inspect.active() or {}).values() + (inspect.reserved() or {}).values():
+                if any(task[u'id'] == task_id for task in tasks):
+                    return True
+            with current_app.connection() as connection:
+                return connection.default_channel.queue_declare(queue, passive=True).message_count > 0
+        except Exception as e:
+            logging.warning(u'Unable to find transformation task {0}, keep it, reason: {1}'.format(task_id, e))
+            return True
+
+    @staticmethod
+    def _get_segments(media_in, profile, segment_duration):
+        u"""Return the list of the segments (start, duration) of a segmented transcode, an empty list if disabled."""
+        if not segment_duration:
+            return []
+        segment_duration = float(segment_duration)
+        if segment_duration <= 0:
+            raise ValueError(to_bytes(u'Segment duration must be positive, {0} given.'.format(segment_duration)))
+        if profile.encoder_name != u'ffmpeg':
+            raise ValueError(to_bytes(u'Segmented transcoding is only available with the ffmpeg encoder.'))
+        duration = media_in.metadata.get(u'duration')
+        if not duration:
+            raise ValueError(to_bytes(u'Unknown duration of media asset {0}.'.format(media_in._id)))
+        duration, segments, start = total_seconds(duration), [], 0
+        while start < duration:
+            segments.append((start, min(segment_duration, duration - start)))
+            start += segment_duration
+        return segments
+
     def get_transform_task(self, spec, fields=None, load_fields=False, append_result=True):
         entity = self._db.transform_tasks.find_one(spec, fields)
         if not entity:
@@ -444,11 +877,11 @@ class OrchestraAPICore(object):
         task = dict2object(TransformTask, entity, inspect_constructor=True)
         if load_fields:
             task.load_fields(self.get_user({u'_id': task.user_id}, {u'secret': 0}),
-                             self.get_media({u'_id': task.media_in_id}),
-                             self.get_media({u'_id': task.media_out_id}),
+                             self._get_media_or_tombstone(task.media_in_id),
+                             self._get_media_or_tombstone(task.media_out_id),
                              self.get_transform_profile({u'_id': task.profile_id}))
         if append_result:
-            task.append_async_result()
+            self.append_progress([task])
         return task
 
     def revoke_transform_task(self, task, terminate=False, remove=False, delete_media=False):
@@ -466,11 +899,19 @@ class OrchestraAPICore(object):
         if task.status in TransformTask.FINAL_STATUS:
             raise ValueError(to_bytes(u'Cannot revoke a transformation task with status {0}.'.format(task.status)))
         task.status = TransformTask.REVOKED
+        # The renditions of a ladder are encoded by the Celery task of the first rendition, they are revoked together
+        ladder = task.statistic.get(u'ladder', [])
+        waiting = self.scheduler.release(task._id)
         if self.config.is_mock:
             pass  # FIXME TODO
-        else:
-            revoke(task._id, terminate=terminate)
+        elif not waiting:  # Nothing to revoke if the task was still waiting in the ready queue of the scheduler
+            from celery.task.control import revoke
+            for task_id in (ladder[:1] or [task._id]) + task.statistic.get(u'segments', []):
+                revoke(task_id, terminate=terminate)
         self._db.transform_tasks.save(task.__dict__, safe=True)
+        if ladder:
+            spec = {u'_id': {u'$in': ladder}, u'status': {u'$nin': list(TransformTask.FINAL_STATUS)}}
+            self._db.transform_tasks.update(spec, {u'$set': {u'status': TransformTask.REVOKED}}, multi=True, safe=True)
         if delete_media and valid_uuid(task.media_out_id, none_allowed=False):
             self.delete_media(task.media_out_id)
         if remove:
@@ -484,12 +925,12 @@ class OrchestraAPICore(object):
             task = dict2object(TransformTask, entity, inspect_constructor=True)
             if load_fields:
                 task.load_fields(self.get_user({u'_id': task.user_id}, {u'secret': 0}),
-                                 self.get_media({u'_id': task.media_in_id}),
-                                 self.get_media({u'_id': task.media_out_id}),
+                                 self._get_media_or_tombstone(task.media_in_id),
+                                 self._get_media_or_tombstone(task.media_out_id),
                                  self.get_transform_profile({u'_id': task.profile_id}))
-            if append_result:
-                task.append_async_result()
             tasks.append(task)
+        if append_result:
+            self.append_progress(tasks)
         return tasks
         # FIXME this is celery's way to do that:
         #for task in state.itertasks():
@@ -519,6 +960,7 @@ class OrchestraAPICore(object):
         if environment == 'default':
             environment = default
         same_environment = (environment == default)
+        from pytoolbox import juju
         config = juju.load_unit_config(self.config.publisher_config)
         config[u'rabbit_queues'] = u'publisher_{0}'.format(environment)
         if not same_environment:
@@ -533,38 +975,44 @@ class OrchestraAPICore(object):
             config[u'storage_options'] = self.config.storage_options
         juju.save_unit_config(self.config.charms_config, self.config.publisher_service, config)
         the_environment = self._get_environment(environment)
-        the_environment.ensure_num_units(self.config.publisher_service, local=True, num_units=num_units,
-                                         terminate=terminate, repository=self.config.charms_repository)
-        if same_environment and num_units:
-            try:
-                try:
-                    the_environment.add_relation(self.config.orchestra_service, self.config.publisher_service,
-                                                 u'publisher', u'publisher')
-                except RuntimeError as e:
-                    raise NotImplementedError(to_bytes(u'Orchestra service must be available and running on default '
-                                              'environment {0}, reason : {1}'.format(default, e)))
+        try:
+            the_environment.ensure_num_units(self.config.publisher_service, local=True, num_units=num_units,
+                                             terminate=terminate, repository=self.config.charms_repository)
+            if same_environment and num_units:
                 try:
-                    the_environment.add_relation(self.config.storage_service, self.config.publisher_service)
-                except RuntimeError as e:
-                    raise NotImplementedError(to_bytes(u'Storage service must be available and running on default '
-                                              'environment {0}, reason : {1}'.format(default, e)))
-            except NotImplementedError:
-                the_environment.destroy_service(self.config.publisher_service)
-                raise
+                    try:
+                        the_environment.add_relation(self.config.orchestra_service, self.config.publisher_service,
+                                                     u'publisher', u'publisher')
+                    except RuntimeError as e:
+                        raise NotImplementedError(to_bytes(u'Orchestra service must be available and running on '
+                                                  'default environment {0}, reason : {1}'.format(default, e)))
+                    try:
+                        the_environment.add_relation(self.config.storage_service, self.config.publisher_service)
+                    except RuntimeError as e:
+                        raise NotImplementedError(to_bytes(u'Storage service must be available and running on default '
+                                                  'environment {0}, reason : {1}'.format(default, e)))
+                except NotImplementedError:
+                    the_environment.destroy_service(self.config.publisher_service)
+                    raise
+        finally:
+            self.snapshots.invalidate()  # Units were added or removed
 
     def get_publisher_unit(self, environment, number):
         return self._get_environment(environment).get_unit(self.config.publisher_service, number)
 
     def get_publisher_units(self, environment):
-        return self._get_environment(environment).get_units(self.config.publisher_service)
+        return self._get_units_snapshot(environment, self.config.publisher_service)
 
     def get_publisher_units_count(self, environment):
-        return self._get_environment(environment).get_units_count(self.config.publisher_service)
+        return self._get_units_snapshot(environment, self.config.publisher_service, count=True)
 
     def destroy_publisher_unit(self, environment, number, terminate, test=False):
         if not test:
             raise NotImplementedError(u'This method is in development, set test to True to disable this warning.')
-        self._get_environment(environment).destroy_unit(self.config.publisher_service, number, terminate)
+        try:
+            self._get_environment(environment).destroy_unit(self.config.publisher_service, number, terminate)
+        finally:
+            self.snapshots.invalidate()
 
     # ------------------------------------------------------------------------------------------------------------------
 
@@ -595,6 +1043,7 @@ class OrchestraAPICore(object):
         if self.config.is_mock:
             result_id = unicode(uuid.uuid4())
         else:
+            from .. import PublisherWorker
             result = PublisherWorker.publisher_task.apply_async(
                 args=(object2json(media, False), object2json(callback, False)), queue=queue)
             result_id = result.id
@@ -613,9 +1062,9 @@ class OrchestraAPICore(object):
         task = dict2object(PublisherTask, entity, inspect_constructor=True)
         if load_fields:
             task.load_fields(self.get_user({u'_id': task.user_id}, {u'secret': 0}),
-                             self.get_media({u'_id': task.media_id}))
+                             self._get_media_or_tombstone(task.media_id))
         if append_result:
-            task.append_async_result()
+            self.append_progress([task])
         return task
 
     def update_publisher_task_and_media(self, task, publish_uri=None, revoke_task_id=None, status=None):
@@ -652,8 +1101,10 @@ class OrchestraAPICore(object):
         if task.status in PublisherTask.CANCELED_STATUS:
             raise ValueError(to_bytes(u'Cannot revoke a publication task with status {0}.'.format(task.status)))
         if not self.config.is_mock:
+            from celery.task.control import revoke
             revoke(task._id, terminate=terminate)
         if task.status == PublisherTask.SUCCESS and not self.config.is_mock:
+            from .. import PublisherWorker
             # Send revoke task to the worker that published the media
             callback = Callback(self.config.api_url + callback_url, u'node', self.config.node_secret)
             queue = task.get_hostname()
@@ -676,10 +1127,10 @@ class OrchestraAPICore(object):
             task = dict2object(PublisherTask, entity, inspect_constructor=True)
             if load_fields:
                 task.load_fields(self.get_user({u'_id': task.user_id}, {u'secret': 0}),
-                                 self.get_media({u'_id': task.media_id}))
-            if append_result:
-                task.append_async_result()
+                                 self._get_media_or_tombstone(task.media_id))
             tasks.append(task)
+        if append_result:
+            self.append_progress(tasks)
         return tasks
         # FIXME this is celery's way to do that:
         #for task in state.itertasks():
@@ -692,25 +1143,168 @@ class OrchestraAPICore(object):
 
     # ------------------------------------------------------------------------------------------------------------------
 
+    def launch_workflow(self, user_id, media_in_id, steps, send_email, transform_callback_url,
+                        publisher_callback_url):
+        u"""
+        Launch a workflow, the chain of transformation and publication ``steps`` (see ``Workflow``) is advanced by the
+        orchestrator when it receives the callbacks of the tasks, the clients do not have to poll the tasks.
+
+        The first step is launched immediately, any error launching it is raised.
+        """
+        if self.config.is_standalone:
+            user = self.get_user({u'_id': user_id}, {u'secret': 0})
+            if not user:
+                raise IndexError(to_bytes(u'No user with id {0}.'.format(user_id)))
+        media_in = self.get_media({u'_id': media_in_id})
+        if not media_in:  # FIXME maybe a media access control here
+            raise IndexError(to_bytes(u'No media asset with id {0}.'.format(media_in_id)))
+        workflow = Workflow(user_id=user_id, media_in_id=media_in_id, steps=steps, send_email=send_email)
+        workflow.is_valid(True)
+        for step in workflow.steps:
+            if step[u'type'] == Workflow.TRANSFORM:
+                if not self.get_transform_profile({u'_id': step[u'profile_id']}):
+                    raise IndexError(to_bytes(u'No transformation profile with id {0}.'.format(step[u'profile_id'])))
+                if not step[u'queue'] in self.config.transform_queues:
+                    raise IndexError(to_bytes(u'No transformation queue with name {0}.'.format(step[u'queue'])))
+                step[u'callback_url'] = transform_callback_url
+            else:
+                if not step[u'queue'] in self.config.publisher_queues:
+                    raise IndexError(to_bytes(u'No publication queue with name {0}.'.format(step[u'queue'])))
+                step[u'callback_url'] = publisher_callback_url
+            step.update({u'status': Workflow.PENDING, u'task_id': None, u'media_id': None})
+        workflow.statistic[u'add_date'] = datetime_now()
+        self._advance_workflow(workflow, raise_exception=True)
+        logging.info(u'New workflow {0} with {1} steps.'.format(workflow._id, len(workflow.steps)))
+        return workflow
+
+    def _advance_workflow(self, workflow, raise_exception=False):
+        u"""Launch the next step of ``workflow`` (or set it successful if all steps are done) and save it."""
+        index = workflow.current_step
+        if index is None:
+            workflow.status = Workflow.SUCCESS
+            workflow.statistic[u'end_date'] = datetime_now()
+        else:
+            step, media_id = workflow.steps[index], workflow.get_step_input(index)
+            try:
+                if step[u'type'] == Workflow.TRANSFORM:
+                    task = self.launch_transform_task(
+                        workflow.user_id, media_id, step[u'profile_id'], step[u'filename'], step.get(u'metadata', {}),
+                        workflow.send_email, step[u'queue'], step[u'callback_url'], step.get(u'segment_duration'),
+                        step.get(u'priority', 0))
+                    step[u'media_id'] = task.media_out_id
+                else:
+                    task = self.launch_publisher_task(workflow.user_id, media_id, workflow.send_email, step[u'queue'],
+                                                      step[u'callback_url'])
+                    step[u'media_id'] = media_id
+            except Exception as error:
+                if raise_exception:
+                    raise
+                self._fail_workflow(workflow, index, unicode(error))
+                return
+            step[u'status'], step[u'task_id'] = Workflow.RUNNING, task._id
+            workflow.status = Workflow.RUNNING
+            workflow.tasks_ids.append(task._id)
+        self._db.workflows.save(workflow.__dict__, safe=True)
+
+    def _fail_workflow(self, workflow, index, error):
+        workflow.steps[index][u'status'] = workflow.status = Workflow.FAILURE
+        workflow.statistic[u'error_details'] = error.replace(u'\n', u'\\n')
+        workflow.statistic[u'end_date'] = datetime_now()
+        self._db.workflows.save(workflow.__dict__, safe=True)
+        logging.info(u'Workflow {0} failed at step {1}: {2}'.format(workflow._id, index, error))
+
+    def _workflow_callback(self, task_id, status, publish_uri=None):
+        u"""Update the step of the workflow (if any) done by the task ``task_id`` and advance the workflow."""
+        workflow = self.get_workflow({u'tasks_ids': task_id})
+        if not workflow or workflow.status != Workflow.RUNNING:
+            return  # Not a task of a workflow or the workflow is revoked
+        index = workflow.current_step
+        if workflow.steps[index][u'task_id'] != task_id:
+            return
+        if status == Workflow.SUCCESS:
+            workflow.steps[index][u'status'] = Workflow.SUCCESS
+            if publish_uri:
+                workflow.steps[index][u'publish_uri'] = publish_uri
+            self._advance_workflow(workflow)
+        else:
+            self._fail_workflow(workflow, index, status)
+
+    def get_workflow(self, spec, fields=None, load_fields=False):
+        entity = self._db.workflows.find_one(spec, fields)
+        if not entity:
+            return None
+        workflow = dict2object(Workflow, entity, inspect_constructor=True)
+        if load_fields:
+            workflow.load_fields(self.get_user({u'_id': workflow.user_id}, {u'secret': 0}),
+                                 self._get_media_or_tombstone(workflow.media_in_id))
+        return workflow
+
+    def revoke_workflow(self, workflow):
+        u"""
+        Stop the workflow ``workflow`` (the next steps are not launched) and revoke its running transformation task.
+        A running publication task is not revoked, the published media asset can be revoked by its publication task.
+        """
+        if valid_uuid(workflow, none_allowed=False):
+            workflow = self.get_workflow({u'_id': workflow})
+        workflow.is_valid(True)
+        if workflow.status in Workflow.FINAL_STATUS:
+            raise ValueError(to_bytes(u'Cannot revoke a workflow with status {0}.'.format(workflow.status)))
+        workflow.status = Workflow.REVOKED
+        workflow.statistic[u'end_date'] = datetime_now()
+        index = workflow.current_step
+        step = workflow.steps[index] if index is not None else None
+        if step and step[u'status'] == Workflow.RUNNING:
+            step[u'status'] = Workflow.REVOKED
+        self._db.workflows.save(workflow.__dict__, safe=True)  # Saved first, the callbacks of the task are ignored
+        if step and step[u'type'] == Workflow.TRANSFORM and step[u'task_id']:
+            task = self.get_transform_task({u'_id': step[u'task_id']})
+            if task and task.status not in TransformTask.FINAL_STATUS:
+                self.revoke_transform_task(task, terminate=True, delete_media=True)
+
+    def get_workflows(self, spec=None, fields=None, skip=0, limit=0, sort=None, load_fields=False):
+        workflows, sort = [], sort or [('statistic.add_date', -1)]
+        for entity in list(self._db.workflows.find(spec=spec, fields=fields, skip=int(skip), limit=int(limit),
+                                                   sort=sort, **self.db_find_options)):
+            workflow = dict2object(Workflow, entity, inspect_constructor=True)
+            if load_fields:
+                workflow.load_fields(self.get_user({u'_id': workflow.user_id}, {u'secret': 0}),
+                                     self._get_media_or_tombstone(workflow.media_in_id))
+            workflows.append(workflow)
+        return workflows
+
+    def get_workflows_count(self, spec=None):
+        return self._db.workflows.find(spec, {u'_id': 1}).count()
+
+    # ------------------------------------------------------------------------------------------------------------------
+
     def transform_callback(self, task_id, status):
         task = self.get_transform_task({u'_id': task_id})
         if not task:
             raise IndexError(to_bytes(u'No transformation task with id {0}.'.format(task_id)))
-        media_out = self.get_media({u'_id': task.media_out_id})
+        self.scheduler.release(task_id)  # Free the slots of the task, the next tasks of the queue are released
+        media_out = self._get_media_or_tombstone(task.media_out_id)
         if not media_out:
             raise IndexError(to_bytes(u'Unable to find output media asset with id {0}.'.format(task.media_out_id)))
-        if status == TransformTask.SUCCESS:
+        if status == TransformTask.SUCCESS and media_out.status == Media.DELETED:
+            # The output media asset was deleted meanwhile (e.g. by revoke_transform_task), it must stay deleted
+            self._db.transform_tasks.save(task.__dict__, safe=True)
+            logging.info(u'{0} Media {1} was deleted, it is not restored'.format(task_id, media_out.filename))
+        elif status == TransformTask.SUCCESS:
             media_out.status = Media.READY
             self.save_media(media_out)
+            # Keep the final statistic published by the worker, the history of the tasks trains the estimates
+            self._db.transform_tasks.save(task.__dict__, safe=True)
             logging.info(u'{0} Media {1} is now {2}'.format(task_id, media_out.filename, media_out.status))
             #self.send_email_task(task, TransformTask.SUCCESS, media_out=media_out)
         else:
-            self.delete_media(media_out)
+            if media_out.status != Media.DELETED:  # May be already deleted by revoke_transform_task
+                self.delete_media(media_out)
             task.statistic[u'error_details'] = status.replace(u'\n', u'\\n')
             self._db.transform_tasks.save(task.__dict__, safe=True)
             logging.info(u'{0} Error: {1}'.format(task_id, status))
             logging.info(u'{0} Media {1} is now deleted'.format(task_id, media_out.filename))
             #self.send_email_task(task, u'ERROR', media_out=media_out)
+        self._workflow_callback(task_id, status)
 
     def publisher_callback(self, task_id, publish_uri, status):
         task = self.get_publisher_task({u'_id': task_id})
@@ -724,8 +1318,9 @@ class OrchestraAPICore(object):
             task.statistic[u'error_details'] = status.replace(u'\n', u'\\n')
             self._db.publisher_tasks.save(task.__dict__, safe=True)
             logging.info(u'{0} Error: {1}'.format(task_id, status))
-            logging.info(u'{0} Media {1} is not modified'.format(task_id, media.filename))
+            logging.info(u'{0} Media {1} is not modified'.format(task_id, task.media_id))
             #self.send_email_task(task, u'ERROR', media=None)
+        self._workflow_callback(task_id, status, publish_uri)
 
     def publisher_revoke_callback(self, task_id, publish_uri, status):
         task = self.get_publisher_task({u'revoke_task_id': task_id})
@@ -0,0 +1,147 @@
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import logging, threading, time
+
+
+class StatusSnapshots(object):
+    u"""
+    Cache values that are slow to retrieve (e.g. the status of the JuJu environments) and refresh them in background.
+
+    The snapshots are served stale-while-revalidate : A snapshot older than ``max_age`` seconds is returned as is and
+    refreshed by a background thread. All the snapshots that were recently used are refreshed concurrently every
+    ``refresh_delay`` seconds by a daemon thread, started on first use (again in a forked process). A refresh in flight
+    when the snapshots are invalidated does not store its (stale) value.
+
+    **Example usage**
+
+    >>> snapshots = StatusSnapshots(max_age=60, refresh_delay=0)
+    >>> values = iter(xrange(100))
+    >>> print(snapshots.get(u'counter', lambda: next(values)))
+    0
+    >>> print(snapshots.get(u'counter', lambda: next(values)))
+    0
+    >>> snapshots.get_date(u'counter') <= time.time()
+    True
+    >>> snapshots.invalidate()
+    >>> print(snapshots.get_date(u'counter'))
+    None
+    >>> print(snapshots.get(u'counter', lambda: next(values)))
+    1
+    >>> def invalidated_while_loading():
+    ...     snapshots.invalidate()
+    ...     return next(values)
+    >>> print(snapshots.get(u'invalidated', invalidated_while_loading), snapshots.get_date(u'invalidated'))
+    2 None
+    """
+
+    def __init__(self, max_age=30, refresh_delay=10, max_idle_time=300):
+        self.max_age = max_age
+        self.refresh_delay = refresh_delay
+        self.max_idle_time = max_idle_time
+        self._lock = threading.RLock()
+        self._snapshots = {}   # key -> (date, value)
+        self._loaders = {}     # key -> (last access date, function returning the value)
+        self._refreshing = set()
+        self._generation = 0  # Incremented by invalidate
+        self._thread = None
+
+    def get(self, key, loader):
+        u"""Return the value of snapshot ``key``, ``loader`` is called to retrieve the value if not yet cached."""
+        with self._lock:
+            self._loaders[key] = (time.time(), loader)
+            snapshot = self._snapshots.get(key)
+        self.start()
+        if snapshot is None:
+            return self.refresh(key)[1]
+        if time.time() - snapshot[0] > self.max_age:
+            self.refresh_async(key)
+        return snapshot[1]
+
+    def get_date(self, key):
+        u"""Return the date (seconds since epoch) of snapshot ``key`` or None if there is no such snapshot."""
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+        return snapshot[0] if snapshot else None
+
+    def invalidate(self):
+        u"""Forget the snapshots, e.g. after a call that modifies the environments (add or destroy units)."""
+        with self._lock:
+            self._snapshots.clear()
+            self._generation += 1
+
+    def refresh(self, key):
+        u"""Call the loader of snapshot ``key`` to update the snapshot (unless invalidated meanwhile) and return it."""
+        with self._lock:
+            loader, generation = self._loaders[key][1], self._generation
+        snapshot = (time.time(), loader())
+        with self._lock:
+            if generation == self._generation:
+                self._snapshots[key] = snapshot
+        return snapshot
+
+    def refresh_async(self, key):
+        u"""Refresh snapshot ``key`` in a background thread, unless this snapshot is already refreshing."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        thread = threading.Thread(target=self._refresh_async, args=(key,), name=u'refresh {0}'.format(key))
+        thread.daemon = True
+        thread.start()
+
+    def start(self):
+        u"""Start the daemon thread refreshing the snapshots if not running and if enabled (``refresh_delay`` > 0)."""
+        if self.refresh_delay <= 0:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=u'status snapshots')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _refresh_async(self, key):
+        try:
+            self.refresh(key)
+        except Exception as e:
+            logging.warning(u'Unable to refresh snapshot {0}, keep the previous one, reason: {1}'.format(key, e))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_delay)
+            with self._lock:
+                now = time.time()
+                for key, (access_date, loader) in self._loaders.items():
+                    if now - access_date > self.max_idle_time:
+                        del self._loaders[key]  # Nobody is interested in this snapshot anymore
+                        self._snapshots.pop(key, None)
+                keys = self._loaders.keys()
+            for key in keys:
+                self.refresh_async(key)
@@ -26,13 +26,13 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import uuid
-from nose.tools import assert_raises
-from pytoolbox.exception import assert_raises_item
 from ..models import User
 
 
 def test_api(api_client, root_secret, node_secret):
     u"""Live-test security and functionalities of a running orchestrator."""
+    from nose.tools import assert_raises
+    from pytoolbox.exception import assert_raises_item
 
     print(api_client.about)
     root = (u'root', root_secret)
@@ -33,6 +33,58 @@ from ..models import Media, User, TransformProfile
 from .server import OrchestraAPICore
 
 
+def send_file_range(request, filename, mimetype=None, as_attachment=False, attachment_filename=None,
+                    block_size=1024*1024):
+    u"""
+    Return a response sending the file ``filename`` with support of HTTP range requests (to resume a download).
+
+    If the Flask application has ``USE_X_SENDFILE`` enabled, then the transfer (and the ranges) is handed to the
+    front-end web server (e.g. Apache mod_xsendfile) and the worker is not tied up by the transfer. Else a full file is
+    sent with the WSGI file wrapper (kernel sendfile if enabled by the server) and a range is streamed by blocks.
+    """
+    import flask, mimetypes  # Only the orchestrator needs Flask, do not load it when importing the API package
+    from werkzeug.http import http_date, parse_range_header
+    from werkzeug.wsgi import wrap_file
+
+    attachment_filename = attachment_filename or os.path.basename(filename)
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(attachment_filename)[0] or u'application/octet-stream'
+    if flask.current_app.use_x_sendfile:
+        return flask.send_file(filename, mimetype=mimetype, as_attachment=as_attachment,
+                               attachment_filename=attachment_filename, conditional=True)
+    stat = os.stat(filename)
+    ranges = parse_range_header(request.headers.get(u'Range'))
+    byte_range = ranges.range_for_length(stat.st_size) if ranges else None
+    if ranges and byte_range is None:
+        response = flask.Response(status=416)
+        response.headers[u'Content-Range'] = u'bytes */{0}'.format(stat.st_size)
+        return response
+    start, stop = byte_range or (0, stat.st_size)
+    f = open(filename, u'rb')
+    if byte_range:
+        def generate():
+            with f:
+                f.seek(start)
+                remaining = stop - start
+                while remaining > 0:
+                    data = f.read(min(block_size, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+        response = flask.Response(generate(), 206, mimetype=mimetype, direct_passthrough=True)
+        response.headers[u'Content-Range'] = u'bytes {0}-{1}/{2}'.format(start, stop - 1, stat.st_size)
+    else:
+        response = flask.Response(wrap_file(request.environ, f, block_size), 200, mimetype=mimetype,
+                                  direct_passthrough=True)
+    response.headers[u'Accept-Ranges'] = u'bytes'
+    response.headers[u'Content-Length'] = unicode(stop - start)
+    response.headers[u'Last-Modified'] = http_date(stat.st_mtime)
+    if as_attachment:
+        response.headers.add(u'Content-Disposition', u'attachment', filename=attachment_filename)
+    return response
+
+
 def get_test_api_core(api_init_csv_directory, config=ORCHESTRA_CONFIG_TEST, **kwargs):
     u"""Return an instance of ``OrchestraAPICore`` initialized with current scenario's configuration."""
     orchestra = OrchestraAPICore(config)
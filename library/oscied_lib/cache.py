@@ -0,0 +1,173 @@
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import errno, os, shutil, threading, time, uuid
+from os.path import basename, dirname, join, splitext
+from pytoolbox.filesystem import try_makedirs, try_remove
+
+
+class MediaCache(object):
+    u"""
+    A local disk cache of the (input) media assets, the least recently used files are evicted to keep the size of the
+    cache under ``max_size`` bytes.
+
+    A file is cached under the id of the media asset plus the size and the modification time of the source file, a
+    modified source is cached again. Files are copied to a temporary file then renamed (atomic) thus the processes of
+    the worker sharing the cache never read partial files.
+
+    **Example usage**
+
+    >>> import tempfile
+    >>> source, path = tempfile.mkdtemp(), tempfile.mkdtemp()
+    >>> for name, size in ((u'a', 40), (u'b', 50), (u'c', 30), (u'd', 200)):
+    ...     with open(join(source, name + u'.mp4'), u'wb') as f:
+    ...         f.write(b'x' * size)
+    >>> cache = MediaCache(path, max_size=100)
+    >>> print(cache.get(u'a', join(source, u'a.mp4'))[1], cache.get(u'a', join(source, u'a.mp4'))[1])
+    False True
+    >>> _ = cache.get(u'b', join(source, u'b.mp4'))
+    >>> _ = cache.get(u'a', join(source, u'a.mp4'))
+    >>> _ = cache.get(u'c', join(source, u'c.mp4'))  # Evict b, the least recently used
+    >>> print(sorted(name.split(u'_')[0] for name in os.listdir(path)))
+    [u'a', u'c']
+    >>> print(cache.get(u'd', join(source, u'd.mp4')) == (join(source, u'd.mp4'), False))  # Bigger than the cache
+    True
+    >>> print(cache.hits, cache.misses, cache.bytes_saved, cache.hit_ratio)
+    2 4 80 0.333333333333
+    >>> shutil.rmtree(source)
+    >>> shutil.rmtree(path)
+    """
+
+    _instance = _instance_pid = None
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.hits = self.misses = self.bytes_saved = 0
+        self._lock = threading.Lock()
+        try_makedirs(path)
+
+    @classmethod
+    def get_instance(cls, config):
+        u"""Return the cache of this process (configured by the ``cache_*`` options) or None if disabled."""
+        if not config.cache_path or config.cache_max_size <= 0:
+            return None
+        pid = os.getpid()
+        if cls._instance is None or cls._instance_pid != pid:
+            cls._instance = cls(config.cache_path, config.cache_max_size)
+            cls._instance_pid = pid
+        return cls._instance
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def get(self, id, source_path):
+        u"""
+        Return the path of the local copy of ``source_path`` (the media asset ``id``) and True if it was cached.
+
+        The source path is returned if the file cannot be cached (e.g. bigger than the cache).
+        """
+        stat = os.stat(source_path)
+        path = join(self.path, u'{0}_{1}_{2}{3}'.format(id, stat.st_size, int(stat.st_mtime), splitext(source_path)[1]))
+        with self._lock:
+            try:
+                now = time.time()
+                os.utime(path, (now, now))  # Mark the file as recently used
+                self.hits += 1
+                self.bytes_saved += stat.st_size
+                return path, True
+            except OSError as error:
+                if error.errno != errno.ENOENT:
+                    raise
+            self.misses += 1
+            if stat.st_size > self.max_size:
+                return source_path, False
+            self.evict(stat.st_size)
+        temporary_path = join(self.path, u'.{0}.part'.format(uuid.uuid4()))
+        try:
+            shutil.copyfile(source_path, temporary_path)
+            now = time.time()
+            os.utime(temporary_path, (now, now))
+            os.rename(temporary_path, path)
+        finally:
+            try_remove(temporary_path)
+        return path, False
+
+    def evict(self, size):
+        u"""Remove the least recently used files to make room for ``size`` bytes, return the number of bytes freed."""
+        entries, total_size = [], 0
+        for name in os.listdir(self.path):
+            if name.startswith(u'.'):
+                continue  # Temporary file of a copy in progress
+            try:
+                stat = os.stat(join(self.path, name))
+            except OSError:
+                continue  # Evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total_size += stat.st_size
+        freed_size = 0
+        for mtime, file_size, name in sorted(entries):
+            if total_size - freed_size + size <= self.max_size:
+                break
+            try_remove(join(self.path, name))  # A file opened by an encoder is still readable
+            freed_size += file_size
+        return freed_size
+
+
+def atomic_move(source_path, destination_path):
+    u"""
+    Move the file ``source_path`` (e.g. encoded in a local scratch space) to ``destination_path`` (e.g. on the shared
+    storage). The file is copied next to the destination then renamed, thus the destination is never a partial file.
+
+    **Example usage**
+
+    >>> import tempfile
+    >>> source, destination = tempfile.mkdtemp(), tempfile.mkdtemp()
+    >>> with open(join(source, u'a.mp4'), u'wb') as f:
+    ...     f.write(b'data')
+    >>> atomic_move(join(source, u'a.mp4'), join(destination, u'b.mp4'))
+    >>> print(len(os.listdir(source)), os.listdir(destination)[0])
+    0 b.mp4
+    >>> shutil.rmtree(source)
+    >>> shutil.rmtree(destination)
+    """
+    try:
+        os.rename(source_path, destination_path)  # Atomic if on the same file-system
+        return
+    except OSError as error:
+        if error.errno != errno.EXDEV:
+            raise
+    temporary_path = join(dirname(destination_path), u'.{0}.{1}.part'.format(basename(destination_path), uuid.uuid4()))
+    try:
+        shutil.copyfile(source_path, temporary_path)
+        os.rename(temporary_path, destination_path)
+    finally:
+        try_remove(temporary_path)
+    os.remove(source_path)
@@ -28,7 +28,6 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import re
 from os.path import dirname, join
-from pytoolbox.juju import CONFIG_FILENAME
 from urlparse import urlparse
 
 from .config_base import CharmLocalConfig, CharmLocalConfig_Subordinate, CharmLocalConfig_Storage
@@ -40,7 +39,9 @@ class OrchestraLocalConfig(CharmLocalConfig_Storage):
     def __init__(self, api_url=u'', node_secret=u'', root_secret=u'', mongo_admin_connection=u'',
                  mongo_node_connection=u'', rabbit_connection=u'', charms_release=u'trusty', email_server=u'',
                  email_tls=False, email_address=u'', email_username=u'', email_password=u'', plugit_api_url=u'',
-                 api_path=u'api/', juju_template_path=u'juju/', ssh_template_path=u'ssh/',
+                 status_max_age=30, status_refresh_delay=10, transform_capacity=0, transform_weights=None,
+                 transform_reap_delay=600, api_x_sendfile=False, api_path=u'api/', juju_template_path=u'juju/',
+                 ssh_template_path=u'ssh/',
                  celery_template_file=u'templates/celeryconfig.py.template',
                  email_ptask_template=u'templates/ptask_mail.template',
                  email_ttask_template=u'templates/ttask_mail.template',
@@ -65,6 +66,12 @@ class OrchestraLocalConfig(CharmLocalConfig_Storage):
         self.email_username = email_username
         self.email_password = email_password
         self.plugit_api_url = plugit_api_url
+        self.status_max_age = status_max_age
+        self.status_refresh_delay = status_refresh_delay
+        self.transform_capacity = transform_capacity
+        self.transform_weights = transform_weights or {}
+        self.transform_reap_delay = transform_reap_delay
+        self.api_x_sendfile = api_x_sendfile
         self.api_path = api_path
         self.juju_template_path = juju_template_path
         self.ssh_template_path = ssh_template_path
@@ -116,6 +123,7 @@ class OrchestraLocalConfig(CharmLocalConfig_Storage):
 
     @property
     def charms_config(self):
+        from pytoolbox.juju import CONFIG_FILENAME
         return join(self.site_directory, CONFIG_FILENAME)
 
     @property
@@ -140,6 +148,7 @@ class OrchestraLocalConfig(CharmLocalConfig_Storage):
 
     @property
     def publisher_config(self):
+        from pytoolbox.juju import CONFIG_FILENAME
         return join(self.charms_release_path, self.publisher_service, CONFIG_FILENAME)
 
     @property
@@ -157,6 +166,7 @@ class OrchestraLocalConfig(CharmLocalConfig_Storage):
 
     @property
     def transform_config(self):
+        from pytoolbox.juju import CONFIG_FILENAME
         return join(self.charms_release_path, self.transform_service, CONFIG_FILENAME)
 
     @property
@@ -175,7 +185,7 @@ class PublisherLocalConfig(CharmLocalConfig_Storage, CharmLocalConfig_Subordinat
                  www_root_path=u'/mnt', publish_uri=u'', site_template_file=u'templates/000-default.conf.template',
                  site_file=u'/etc/apache2/sites-available/000-default.conf',
                  site_ssl_template_file=u'templates/default-ssl.conf.template',
-                 site_ssl_file=u'/etc/apache2/sites-available/default-ssl.conf', **kwargs):
+                 site_ssl_file=u'/etc/apache2/sites-available/default-ssl.conf', publish_mode=u'copy', **kwargs):
         super(PublisherLocalConfig, self).__init__(**kwargs)
         self.proxy_ips = proxy_ips or []
         self.mod_streaming_installed = mod_streaming_installed
@@ -183,6 +193,7 @@ class PublisherLocalConfig(CharmLocalConfig_Storage, CharmLocalConfig_Subordinat
         self.www_root_path, self.publish_uri = www_root_path, publish_uri
         self.site_template_file, self.site_file = site_template_file, site_file
         self.site_ssl_template_file, self.site_ssl_file = site_ssl_template_file, site_ssl_file
+        self.publish_mode = publish_mode
 
     @property
     def publish_path(self):
@@ -231,8 +242,21 @@ class StorageLocalConfig(CharmLocalConfig):
 
 class TransformLocalConfig(CharmLocalConfig_Storage, CharmLocalConfig_Subordinate):
 
-    def __init__(self, **kwargs):
+    def __init__(self, cache_path=u'/var/cache/oscied-transform', cache_max_size=0, scratch_path=u'',
+                 cpu_budget=False, cpu_budget_path=u'/var/lib/oscied-transform/cpu', cpu_affinity=False,
+                 encoder_nice=0, encoder_ionice_class=0, encoder_stall_timeout=600, encoder_kill_timeout=10,
+                 **kwargs):
         super(TransformLocalConfig, self).__init__(**kwargs)
+        self.cache_path = cache_path
+        self.cache_max_size = cache_max_size
+        self.scratch_path = scratch_path
+        self.cpu_budget = cpu_budget
+        self.cpu_budget_path = cpu_budget_path
+        self.cpu_affinity = cpu_affinity
+        self.encoder_nice = encoder_nice
+        self.encoder_ionice_class = encoder_ionice_class
+        self.encoder_stall_timeout = encoder_stall_timeout
+        self.encoder_kill_timeout = encoder_kill_timeout
 
 
 class WebuiLocalConfig(CharmLocalConfig_Storage):
@@ -25,8 +25,8 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import logging
-from os.path import join, sep
+import logging, os
+from os.path import abspath, join, sep
 from pytoolbox.serialization import JsoneableObject
 
 from .constants import MEDIAS_PATH, UPLOADS_PATH
@@ -34,9 +34,40 @@ from .constants import MEDIAS_PATH, UPLOADS_PATH
 
 class CharmLocalConfig(JsoneableObject):
 
+    _cached = {}
+
     def __init__(self, verbose=True):
         self.verbose = verbose
 
+    @classmethod
+    def read_cached(cls, filename, **kwargs):
+        u"""
+        Return the configuration read from ``filename``, the file is read again only if it was modified (or replaced).
+
+        The instance is shared by the callers (e.g. the tasks run by a worker process) and must not be modified.
+
+        **Example usage**
+
+        >>> import tempfile
+        >>> filename = tempfile.mkstemp(suffix=u'.json')[1]
+        >>> CharmLocalConfig(verbose=False).write(filename)
+        >>> config = CharmLocalConfig.read_cached(filename, inspect_constructor=False)
+        >>> print(config.verbose, CharmLocalConfig.read_cached(filename, inspect_constructor=False) is config)
+        False True
+        >>> CharmLocalConfig(verbose=True).write(filename)
+        >>> os.utime(filename, (0, 0))
+        >>> print(CharmLocalConfig.read_cached(filename, inspect_constructor=False).verbose)
+        True
+        >>> os.remove(filename)
+        """
+        path = abspath(filename)
+        stat = os.stat(path)
+        version = (stat.st_ino, stat.st_size, stat.st_mtime)
+        entry = CharmLocalConfig._cached.get((cls, path))
+        if entry is None or entry[0] != version:
+            entry = CharmLocalConfig._cached[(cls, path)] = (version, cls.read(filename, **kwargs))
+        return entry[1]
+
     def __repr__(self):
         return unicode(self.__dict__)
 
@@ -175,13 +206,17 @@ class CharmLocalConfig_Storage(CharmLocalConfig):
 
 class CharmLocalConfig_Subordinate(CharmLocalConfig):
 
-    def __init__(self, verbose=False, api_nat_socket=u'',
-                 celery_config_file=u'celeryconfig.py',
+    def __init__(self, verbose=False, api_nat_socket=u'', progress_flush_interval=5, progress_ratio_delta=0.01,
+                 progress_time_delta=1, progress_max_time_delta=5, celery_config_file=u'celeryconfig.py',
                  celery_config_template_file=u'templates/celeryconfig.py.template',
                  celery_default_template_file=u'templates/celeryd.default.template',
                  celery_init_template_file=u'templates/celeryd.init.template', **kwargs):
         super(CharmLocalConfig_Subordinate, self).__init__(verbose=verbose)
         self.api_nat_socket = api_nat_socket
+        self.progress_flush_interval = progress_flush_interval
+        self.progress_ratio_delta = progress_ratio_delta
+        self.progress_time_delta = progress_time_delta
+        self.progress_max_time_delta = progress_max_time_delta
         self.celery_config_file = celery_config_file
         self.celery_config_template_file = celery_config_template_file
         self.celery_default_template_file = celery_default_template_file
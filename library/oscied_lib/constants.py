@@ -34,6 +34,7 @@ SERVICE_TO_LABEL     = {u'oscied-transform': u'encoding',        u'oscied-publis
 SERVICE_TO_UNITS_API = {u'oscied-transform': u'transform_units', u'oscied-publisher': u'publisher_units'}
 SERVICE_TO_TASKS_API = {u'oscied-transform': u'transform_tasks', u'oscied-publisher': u'publisher_tasks'}
 MEDIAS_PATH, UPLOADS_PATH = u'medias', u'uploads'
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Default size of the chunks of the (resumable) uploads
 UUID_ZERO = unicode(uuid.UUID(u'{00000000-0000-0000-0000-000000000000}'))
 
 # The daemons (orchestra's API, WebUI, ...) of the charms should run with the following unix user & group:
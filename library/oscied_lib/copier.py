@@ -0,0 +1,301 @@
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import ctypes, ctypes.util, errno, fcntl, os, shutil, threading, time, uuid
+from multiprocessing.pool import ThreadPool
+from os.path import basename, dirname, exists, getsize, isdir, islink, join, relpath
+from pytoolbox.datetime import datetime_now
+from pytoolbox.encoding import to_bytes
+from pytoolbox.filesystem import get_size, try_makedirs, try_remove
+
+BLOCK_SIZE = 8 * 1024 * 1024       # Amount of data copied by a call to the kernel (or read and written)
+SMALL_FILE_SIZE = 4 * 1024 * 1024  # The files smaller than that are copied in parallel by a pool of threads
+FICLONE = 0x40049409               # Clone (reflink) a file, Linux ioctl (e.g. btrfs, xfs)
+PUBLISH_MODES = (u'copy', u'hardlink', u'symlink')
+
+# The errors of the kernel-side copies leading to the next (slower) method of copy
+FALLBACK_ERRNOS = frozenset((errno.EBADF, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EOPNOTSUPP, errno.EPERM,
+                             errno.EXDEV))
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library(u'c'), use_errno=True)
+except OSError:
+    _libc = None
+
+
+def _get_kernel_copy(name):
+    u"""Return the (kernel-side) copy function ``name`` of the C library, None if not available."""
+    function = getattr(_libc, name, None)
+    if function is not None:
+        function.restype = ctypes.c_ssize_t
+        if name == u'copy_file_range':
+            function.argtypes = (ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t,
+                                 ctypes.c_uint)
+        else:
+            function.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t)
+    return function
+
+# copy_file_range(fd_in, off_in, fd_out, off_out, len, flags) and sendfile(out_fd, in_fd, offset, count)
+KERNEL_COPIES = tuple((name, function) for name, function in (
+    (u'copy_file_range', _get_kernel_copy(u'copy_file_range')), (u'sendfile', _get_kernel_copy(u'sendfile')))
+    if function is not None)
+
+
+def copy_file(source_path, destination_path, callback=None, link=False, block_size=BLOCK_SIZE):
+    u"""
+    Copy the file ``source_path`` to ``destination_path`` and return the method of the copy.
+
+    The methods are tried from the fastest to the slowest : A hard link (if ``link`` is True), a clone (reflink), a
+    kernel-side copy (copy_file_range or sendfile) and finally a copy in userspace. The first methods are only
+    available if the source and the destination share a file-system. The ``callback(size)`` is called with the amount
+    of bytes copied.
+
+    **Example usage**
+
+    >>> import shutil, tempfile
+    >>> path = tempfile.mkdtemp()
+    >>> with open(join(path, u'a'), u'wb') as f:
+    ...     f.write(b'x' * (3 * 1024 + 1))
+    >>> sizes = []
+    >>> print(copy_file(join(path, u'a'), join(path, u'b'), sizes.append, block_size=1024) != u'link')
+    True
+    >>> print(sum(sizes), open(join(path, u'b'), u'rb').read() == b'x' * (3 * 1024 + 1))
+    3073 True
+    >>> print(copy_file(join(path, u'a'), join(path, u'c'), link=True), os.stat(join(path, u'c')).st_nlink)
+    link 2
+    >>> shutil.rmtree(path)
+    """
+    callback = callback or (lambda size: None)
+    if link:
+        try_remove(destination_path)
+        try:
+            os.link(source_path, destination_path)
+            callback(getsize(destination_path))
+            return u'link'
+        except OSError as error:
+            if error.errno not in FALLBACK_ERRNOS and error.errno != errno.EMLINK:
+                raise
+    with open(source_path, u'rb') as source:
+        with open(destination_path, u'wb') as destination:
+            try:
+                fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+                callback(getsize(destination_path))
+                return u'reflink'
+            except IOError as error:
+                if error.errno not in FALLBACK_ERRNOS:
+                    raise
+            for name, function in KERNEL_COPIES:
+                copied = 0
+                while True:
+                    if name == u'copy_file_range':
+                        size = function(source.fileno(), None, destination.fileno(), None, block_size, 0)
+                    else:
+                        size = function(destination.fileno(), source.fileno(), None, block_size)
+                    if size < 0:
+                        number = ctypes.get_errno()
+                        if copied == 0 and number in FALLBACK_ERRNOS:
+                            break  # Not supported by this kernel or these file-systems, try the next method
+                        raise OSError(number, os.strerror(number), destination_path)
+                    if size == 0:
+                        return name
+                    copied += size
+                    callback(size)
+            while True:
+                data = source.read(block_size)
+                if not data:
+                    return u'read'
+                destination.write(data)
+                callback(len(data))
+
+
+def recursive_copy(source_path, destination_path, callback=None, ratio_delta=0.01, time_delta=1, link=False,
+                   threads=8, small_size=SMALL_FILE_SIZE, block_size=BLOCK_SIZE):
+    u"""
+    Copy the file or the content of the directory ``source_path`` to ``destination_path``, this is a drop-in
+    replacement of the ``recursive_copy`` of pytoolbox.
+
+    The big files are copied one after the other by ``copy_file``, the small files (e.g. MPEG-DASH segments) are copied
+    in parallel by a pool of ``threads`` threads. The ``callback(start_date, elapsed_time, eta_time, src_size,
+    dst_size, ratio)`` is called if at least ``ratio_delta`` of progress and ``time_delta`` seconds elapsed.
+
+    Return a dictionary with the keys start_date, elapsed_time, src_size, dst_size and methods (the amount of files
+    copied by every method of ``copy_file``).
+
+    **Example usage**
+
+    >>> import shutil, tempfile
+    >>> source, destination = tempfile.mkdtemp(), tempfile.mkdtemp()
+    >>> os.makedirs(join(source, u'video'))
+    >>> for index in xrange(20):
+    ...     with open(join(source, u'video', u'{0}.m4s'.format(index)), u'wb') as f:
+    ...         f.write(b'x' * 1000)
+    >>> with open(join(source, u'a.mpd'), u'wb') as f:
+    ...     f.write(b'x' * 5000)
+    >>> updates = []
+    >>> infos = recursive_copy(source, destination, lambda *args: updates.append(args), 0.2, 0, small_size=2000)
+    >>> print(infos[u'src_size'], infos[u'dst_size'], sum(infos[u'methods'].values()), len(updates) in (4, 5))
+    25000 25000 21 True
+    >>> print(len(os.listdir(join(destination, u'video'))), updates[-1][-1])
+    20 1.0
+    >>> shutil.rmtree(source)
+    >>> shutil.rmtree(destination)
+    """
+    start_date, start_time = datetime_now(), time.time()
+    files = []
+    if isdir(source_path):
+        for root, directories, filenames in os.walk(source_path):
+            try_makedirs(join(destination_path, relpath(root, source_path)))
+            for filename in filenames:
+                path = join(root, filename)
+                files.append((getsize(path), path, join(destination_path, relpath(path, source_path))))
+    else:
+        try_makedirs(dirname(destination_path))
+        files.append((getsize(source_path), source_path, destination_path))
+
+    src_size = sum(size for size, source, destination in files)
+    state = {u'dst_size': 0, u'ratio': 0.0, u'time': 0.0, u'methods': {}}
+    lock = threading.Lock()
+
+    def progress(size):
+        with lock:
+            state[u'dst_size'] += size
+            if callback is None:
+                return
+            elapsed_time = time.time() - start_time
+            ratio = state[u'dst_size'] / src_size if src_size > 0 else 1.0
+            if (ratio - state[u'ratio'] >= ratio_delta and elapsed_time - state[u'time'] >= time_delta) or \
+                    (ratio == 1.0 and state[u'ratio'] < 1.0):
+                state[u'ratio'], state[u'time'] = ratio, elapsed_time
+                eta_time = int(elapsed_time * (1.0 - ratio) / ratio) if ratio > 0 else 0
+                callback(start_date, elapsed_time, eta_time, src_size, state[u'dst_size'], ratio)
+
+    def copy(item):
+        size, source, destination = item
+        method = copy_file(source, destination, progress, link, block_size)
+        with lock:
+            state[u'methods'][method] = state[u'methods'].get(method, 0) + 1
+
+    small_files = [item for item in files if item[0] < small_size]
+    for item in files:
+        if item[0] >= small_size:
+            copy(item)
+    if len(small_files) > 1 and threads > 1:
+        pool = ThreadPool(min(threads, len(small_files)))
+        try:
+            pool.map(copy, small_files)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for item in small_files:
+            copy(item)
+    return {u'start_date': start_date, u'elapsed_time': time.time() - start_time, u'src_size': src_size,
+            u'dst_size': state[u'dst_size'], u'methods': state[u'methods']}
+
+
+def atomic_symlink(source_path, link_path):
+    u"""
+    Create (or replace) the symbolic link ``link_path`` pointing to ``source_path``, the link is created next to its
+    final path then renamed (atomic) thus ``link_path`` is always valid.
+
+    **Example usage**
+
+    >>> import tempfile
+    >>> path = tempfile.mkdtemp()
+    >>> os.makedirs(join(path, u'a'))
+    >>> os.makedirs(join(path, u'b'))
+    >>> atomic_symlink(join(path, u'a'), join(path, u'link'))
+    >>> atomic_symlink(join(path, u'b'), join(path, u'link'))
+    >>> print(os.readlink(join(path, u'link')) == join(path, u'b'), len(os.listdir(path)))
+    True 3
+    >>> shutil.rmtree(path)
+    """
+    if isdir(link_path) and not islink(link_path):
+        shutil.rmtree(link_path)  # e.g. previously published by copy
+    temporary_path = join(dirname(link_path), u'.{0}.{1}.tmp'.format(basename(link_path), uuid.uuid4()))
+    os.symlink(source_path, temporary_path)
+    try:
+        os.rename(temporary_path, link_path)
+    except:
+        try_remove(temporary_path)
+        raise
+
+
+def remove_tree(path):
+    u"""Remove the directory ``path`` or the symbolic link ``path`` (not the directory it is pointing to)."""
+    if islink(path):
+        os.remove(path)
+    elif exists(path):
+        shutil.rmtree(path)
+
+
+def publish_tree(source_path, destination_path, mode=u'copy', callback=None, ratio_delta=0.01, time_delta=1):
+    u"""
+    Publish the directory ``source_path`` as ``destination_path`` and return the infos of ``recursive_copy`` plus the
+    mode of the publication.
+
+    The ``mode`` is one of ``PUBLISH_MODES`` : The files are copied (copy), hard linked (hardlink) or the directory is
+    (atomically) symlinked (symlink). The publication falls back to a copy if the mode is not possible, e.g. the hard
+    links require the source and the destination to share a file-system.
+
+    **Example usage**
+
+    >>> import tempfile
+    >>> source, destination = tempfile.mkdtemp(), tempfile.mkdtemp()
+    >>> with open(join(source, u'a.mp4'), u'wb') as f:
+    ...     f.write(b'x' * 1000)
+    >>> infos = publish_tree(source, join(destination, u'1'), u'symlink')
+    >>> print(infos[u'mode'], infos[u'src_size'], islink(join(destination, u'1')))
+    symlink 1000 True
+    >>> infos = publish_tree(source, join(destination, u'2'), u'hardlink')
+    >>> print(infos[u'mode'], infos[u'methods'], os.stat(join(source, u'a.mp4')).st_nlink)
+    hardlink {u'link': 1} 2
+    >>> for name in (u'1', u'2'):
+    ...     remove_tree(join(destination, name))
+    >>> print(len(os.listdir(destination)), len(os.listdir(source)))
+    0 1
+    >>> shutil.rmtree(source)
+    >>> shutil.rmtree(destination)
+    """
+    if mode not in PUBLISH_MODES:
+        raise ValueError(to_bytes(u'Publication mode {0} is not one of {1}.'.format(mode, PUBLISH_MODES)))
+    if mode == u'symlink':
+        start_date, start_time = datetime_now(), time.time()
+        try:
+            try_makedirs(dirname(destination_path))
+            atomic_symlink(source_path, destination_path)
+            size = get_size(source_path)
+            return {u'start_date': start_date, u'elapsed_time': time.time() - start_time, u'src_size': size,
+                    u'dst_size': size, u'methods': {}, u'mode': mode}
+        except OSError as error:
+            if error.errno not in FALLBACK_ERRNOS:
+                raise
+            mode = u'copy'
+    infos = recursive_copy(source_path, destination_path, callback, ratio_delta, time_delta, link=(mode == u'hardlink'))
+    infos[u'mode'] = mode
+    return infos
@@ -0,0 +1,561 @@
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import errno, fcntl, multiprocessing, os, re, select, subprocess, time
+from collections import deque
+from stat import S_ISDIR
+
+# frame= 2071 fps=  0 q=-1.0 size=   34623kB time=00:01:25.89 bitrate=3302.3kbits/s
+# frame=  240 fps= 29.7 q=28.0 Lsize=N/A time=00:00:10.00 bitrate=N/A
+# size=     235kB time=00:00:15.04 bitrate= 128.0kbits/s (audio only)
+FFMPEG_REGEX = re.compile(
+    r'(?:frame=\s*(?P<frame>\d+)\s+fps=\s*(?P<fps>[\d.]+)\s+q=\s*(?P<q>\S+)\s+)?\S*size=\s*(?P<size>\S+)\s+'
+    r'time=\s*(?P<time>\S+)\s+bitrate=\s*(?P<bitrate>\S+)')
+
+
+class LineSplitter(object):
+    u"""
+    Split a stream of chunks into lines, the chunks are not aligned on the lines and FFmpeg ends its progress lines
+    with a carriage return.
+
+    **Example usage**
+
+    >>> splitter = LineSplitter()
+    >>> print(splitter.feed(u'frame=  1 fps=0.0'))
+    []
+    >>> print(splitter.feed(u' size=N/A\\rframe=  2\\n\\nframe='))
+    [u'frame=  1 fps=0.0 size=N/A', u'frame=  2']
+    >>> print(splitter.flush())
+    frame=
+    """
+
+    LINE_REGEX = re.compile(r'[\r\n]+')
+
+    def __init__(self):
+        self._buffer = u''
+
+    def feed(self, chunk):
+        u"""Append ``chunk`` to the buffer and return the (non empty) lines completed by this chunk."""
+        lines = self.LINE_REGEX.split(self._buffer + chunk)
+        self._buffer = lines.pop()
+        return [line for line in lines if line]
+
+    def flush(self):
+        u"""Return the last (incomplete) line and empty the buffer."""
+        line, self._buffer = self._buffer, u''
+        return line
+
+
+class RingBuffer(object):
+    u"""
+    Keep the last ``max_size`` characters of a stream, e.g. the output of an encoder running for hours.
+
+    **Example usage**
+
+    >>> log = RingBuffer(max_size=8)
+    >>> log.append(u'abcd')
+    >>> log.append(u'efghij')
+    >>> print(log.value, len(log), log.truncated)
+    cdefghij 8 True
+    >>> log.append(u'0123456789')
+    >>> print(log.value)
+    23456789
+    """
+
+    def __init__(self, max_size=64*1024):
+        self.max_size = max_size
+        self.truncated = False
+        self._chunks = deque()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __unicode__(self):
+        return self.value
+
+    @property
+    def value(self):
+        return u''.join(self._chunks)
+
+    def append(self, data):
+        if not data:
+            return
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size > self.max_size:
+            self.truncated = True
+            extra, head = self._size - self.max_size, self._chunks[0]
+            if len(head) <= extra:
+                self._chunks.popleft()
+                self._size -= len(head)
+            else:
+                self._chunks[0] = head[extra:]
+                self._size -= extra
+
+
+class FFmpegProgressParser(object):
+    u"""
+    Parse the (standard error) output of FFmpeg incrementally and keep the last ``log_size`` characters of the output.
+
+    **Example usage**
+
+    >>> parser = FFmpegProgressParser(log_size=32)
+    >>> print(parser.feed(b'Press [q] to stop\\nframe=   10 fps= 25 q=28.0 size=   ') is None)
+    True
+    >>> stats = parser.feed(b'  12kB time=00:00:00.40 bitrate= 245.8kbits/s\\rframe=   20 fps=')
+    >>> print(stats[u'frame'], stats[u'size'], stats[u'time'])
+    10 12kB 00:00:00.40
+    >>> stats = parser.feed(b'23.5 q=28.0 Lsize=N/A time=00:00:00.80 bitrate=N/A\\n')
+    >>> print(stats[u'frame'], stats[u'fps'], stats[u'size'], stats[u'time'], stats[u'bitrate'])
+    20 23.5 N/A 00:00:00.80 N/A
+    >>> print(len(parser.log.value))
+    32
+    """
+
+    def __init__(self, log_size=64*1024, encoding=u'utf-8'):
+        self.encoding = encoding
+        self.log = RingBuffer(log_size)
+        self.splitter = LineSplitter()
+        self.stats = None
+
+    def feed(self, chunk):
+        u"""Parse a chunk of the output and return the statistics of the last progress line completed by this chunk."""
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode(self.encoding, u'replace')
+        self.log.append(chunk)
+        stats = None
+        for line in self.splitter.feed(chunk):
+            match = FFMPEG_REGEX.search(line)
+            if match:
+                stats = match.groupdict()
+        if stats:
+            self.stats = stats
+        return stats
+
+
+class OutputSizeTracker(object):
+    u"""
+    Track the size of the output of an encoder without walking the output directory at every progress update.
+
+    The output is a single file (only this file is stat-ed) or a ``directory`` of files (e.g. MPEG-DASH segments).
+    The files of a directory are listed and only the new files and the files that grew since the last update are
+    stat-ed, a file with the same size for two updates is considered as complete. Sub-directories are ignored.
+
+    **Example usage**
+
+    >>> import os, shutil, tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> def write(name, size):
+    ...     with open(os.path.join(directory, name), u'ab') as f:
+    ...         f.write(b'x' * size)
+    >>> tracker = OutputSizeTracker(directory, directory=True)
+    >>> print(tracker.update())
+    0
+    >>> write(u'segment_1.m4s', 100)
+    >>> write(u'segment_2.m4s', 10)
+    >>> print(tracker.update())
+    110
+    >>> write(u'segment_2.m4s', 20)
+    >>> print(tracker.update(), tracker.stats)
+    130 4
+    >>> print(tracker.update(), tracker.stats)
+    130 5
+    >>> print(tracker.update(), tracker.stats)
+    130 5
+    >>> print(OutputSizeTracker(os.path.join(directory, u'segment_1.m4s')).update())
+    100
+    >>> shutil.rmtree(directory)
+    """
+
+    def __init__(self, path, directory=False):
+        self.path = path
+        self.directory = directory
+        self.stats = 0  # Number of files stat-ed (the I/O on the shared storage)
+        self._sizes = {}
+        self._growing = set()
+
+    @property
+    def size(self):
+        return sum(self._sizes.itervalues())
+
+    def _stat(self, path):
+        self.stats += 1
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
+
+    def update(self):
+        u"""Update and return the size of the output."""
+        if not self.directory:
+            stat = self._stat(self.path)
+            self._sizes[self.path] = stat.st_size if stat else 0
+            return self.size
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return self.size
+        for name in names:
+            if name in self._sizes and name not in self._growing:
+                continue
+            stat = self._stat(os.path.join(self.path, name))
+            if stat is None:
+                continue
+            if S_ISDIR(stat.st_mode):
+                self._sizes[name] = 0  # Ignored
+                continue
+            size = stat.st_size
+            if self._sizes.get(name) == size:
+                self._growing.discard(name)
+            else:
+                self._growing.add(name)
+            self._sizes[name] = size
+        return self.size
+
+
+class CpuBudget(object):
+    u"""
+    Share the CPUs of the host between the encoders running concurrently (e.g. by the processes of a Celery worker).
+
+    Every running encoder is registered as a file (named by the id of the process running it) in the directory
+    ``path``, the registrations of the processes that died are ignored and removed. The encoder is given its share of
+    the ``cpus`` (as the amount of threads) and, if ``affinity`` is True, is pinned to its own set of CPUs. The sets are
+    re-computed (by ``update``) when encoders start and finish. The encoder is also run with the ``nice`` priority and
+    the I/O scheduling class ``ionice_class`` (0 to disable, 2 for best-effort and 3 for idle).
+
+    **Example usage**
+
+    >>> import shutil, tempfile
+    >>> path = tempfile.mkdtemp()
+    >>> budget = CpuBudget(path, cpus=8, affinity=True, nice=10, ionice_class=3)
+    >>> with budget:
+    ...     print(budget.threads, budget.cpuset, budget.encoder_string(u'-c:v libx264'))
+    ...     open(os.path.join(path, u'1'), u'w').close()  # Another encoder (run by the process 1)
+    ...     print(budget.threads, budget.cpuset, budget.encoder_string(u'-threads 2 -c:v libx264'))
+    8 0-7 -threads 8 -c:v libx264
+    4 4-7 -threads 2 -c:v libx264
+    >>> print(len(os.listdir(path)), budget.command([u'ffmpeg']))
+    1 [u'nice', u'-n', u'10', u'ionice', u'-c', u'3', u'ffmpeg']
+    >>> print(CpuBudget(None, cpus=8).encoder_string(u'-c:v libx264'))
+    -c:v libx264
+    >>> shutil.rmtree(path)
+    """
+
+    def __init__(self, path, cpus=None, affinity=False, nice=0, ionice_class=0, interval=5):
+        self.path = path
+        self.cpus = cpus or multiprocessing.cpu_count()
+        self.affinity = affinity
+        self.nice = nice
+        self.ionice_class = ionice_class
+        self.interval = interval
+        self.pid = None
+        self._cpuset = None
+        self._update_time = 0
+
+    @classmethod
+    def from_config(cls, config):
+        u"""Return the budget configured by the ``cpu_*`` and ``encoder_*`` options of ``config``."""
+        return cls(config.cpu_budget_path if config.cpu_budget else None, affinity=config.cpu_affinity,
+                   nice=config.encoder_nice, ionice_class=config.encoder_ionice_class)
+
+    def __enter__(self):
+        self.register()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.unregister()
+
+    @property
+    def filename(self):
+        return os.path.join(self.path, unicode(os.getpid()))
+
+    @property
+    def registrations(self):
+        u"""Return the (sorted) ids of the processes running an encoder, remove the registrations of the dead ones."""
+        pids = []
+        for name in os.listdir(self.path):
+            try:
+                pid = int(name)
+                if pid != os.getpid():
+                    os.kill(pid, 0)
+                pids.append(pid)
+            except ValueError:
+                continue
+            except OSError as error:
+                if error.errno == errno.ESRCH:
+                    try:
+                        os.remove(os.path.join(self.path, name))
+                    except OSError:
+                        pass  # Already removed by another process
+                else:
+                    pids.append(pid)  # e.g. EPERM, the process is alive
+        return sorted(pids)
+
+    @property
+    def threads(self):
+        u"""Return the amount of threads of the encoder, its share of the CPUs."""
+        return max(1, self.cpus // max(1, len(self.registrations))) if self.path else None
+
+    @property
+    def cpuset(self):
+        u"""Return the list of the CPUs (e.g. 4-7) of the encoder, the last encoder gets the remaining CPUs."""
+        if not self.path:
+            return None
+        pids = self.registrations
+        index, count = pids.index(os.getpid()) if os.getpid() in pids else 0, max(1, len(pids))
+        if count >= self.cpus:
+            return unicode(index % self.cpus)
+        share = self.cpus // count
+        last = self.cpus - 1 if index == count - 1 else (index + 1) * share - 1
+        return u'{0}-{1}'.format(index * share, last)
+
+    def register(self):
+        if self.path:
+            try:
+                os.makedirs(self.path)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+            open(self.filename, u'w').close()
+
+    def unregister(self):
+        if self.path:
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+
+    def encoder_string(self, encoder_string, outputs=1):
+        u"""
+        Return the ``encoder_string`` with the amount of threads of the encoder (if not already set), shared by the
+        ``outputs`` of the encoder.
+        """
+        threads = self.threads
+        if threads is None or u'-threads' in encoder_string:
+            return encoder_string
+        return u'-threads {0} {1}'.format(max(1, threads // outputs), encoder_string)
+
+    def command(self, args):
+        u"""Return the command (a list of arguments) ``args`` run with the priorities of the encoder."""
+        prefix = [u'nice', u'-n', unicode(self.nice)] if self.nice else []
+        if self.ionice_class:
+            prefix += [u'ionice', u'-c', unicode(self.ionice_class)]
+        return prefix + list(args)
+
+    def update(self, pid, force=False):
+        u"""Pin the encoder (process ``pid``) to its set of CPUs, if ``affinity`` and if changed."""
+        if not self.affinity or not self.path or (not force and time.time() - self._update_time < self.interval):
+            return
+        self._update_time = time.time()
+        cpuset = self.cpuset
+        if cpuset != self._cpuset:
+            with open(os.devnull, u'w') as devnull:
+                subprocess.call([u'taskset', u'-a', u'-p', u'-c', cpuset, unicode(pid)], stdout=devnull,
+                                stderr=devnull)
+            self._cpuset = cpuset
+
+
+class EncoderSupervisor(object):
+    u"""
+    Run an encoder, feed its output to a handler, kill the encoder if it stalls and account for its resources.
+
+    The ``handler(stdout, stderr)`` is called with the chunks read from the outputs of the encoder (the standard output
+    is only read if ``stdout`` is True) and returns True if the encoder made some progress. The encoder stalls if
+    neither its progress nor the size of its output (``tracker``, an ``OutputSizeTracker``) grew for ``stall_timeout``
+    seconds (0 to disable). A stalled encoder is terminated then killed if still running ``kill_timeout`` seconds later,
+    the encoder is also killed if the handler (or the task running the encoder) raises an exception. The handler calls
+    ``finish`` if the output tells that the work is done, a lingering encoder is then terminated.
+
+    The outputs are waited for at most ``poll_interval`` seconds, the encoder is reaped with ``wait4`` and its CPU time,
+    maximum resident set size and block I/O are available as ``resources``. The priorities and the CPUs of the encoder
+    are managed by the CPU ``budget``.
+
+    **Example usage**
+
+    >>> chunks = []
+    >>> def handler(stdout, stderr):
+    ...     chunks.append(stdout + stderr)
+    ...     return False
+    >>> encoder = EncoderSupervisor([u'sh', u'-c', u'echo frame=1; exec sleep 60'], handler, stdout=True,
+    ...                             stall_timeout=1, poll_interval=0.1)
+    >>> print(encoder.run(), encoder.stalled, b''.join(chunks).strip())
+    -15 True frame=1
+    >>> print(sorted(encoder.resources.keys()))
+    [u'cpu_system_time', u'cpu_user_time', u'max_rss', u'read_bytes', u'write_bytes']
+    >>> encoder = EncoderSupervisor([u'sh', u'-c', u'exit 3'], handler, stall_timeout=1)
+    >>> print(encoder.run(), encoder.stalled)
+    3 False
+    >>> encoder = EncoderSupervisor([u'sh', u'-c', u'echo done; exec sleep 60'], lambda o, e: encoder.finish(),
+    ...                             stdout=True, stall_timeout=30, poll_interval=0.1)
+    >>> print(encoder.run(), encoder.stalled, encoder.finished)
+    -15 False True
+    """
+
+    def __init__(self, args, handler, stdout=False, tracker=None, budget=None, stall_timeout=0, kill_timeout=10,
+                 poll_interval=1):
+        self.args = args
+        self.handler = handler
+        self.stdout = stdout
+        self.tracker = tracker
+        self.budget = budget
+        self.stall_timeout = stall_timeout
+        self.kill_timeout = kill_timeout
+        self.poll_interval = poll_interval
+        self.process = self.returncode = None
+        self.resources = {}
+        self.stalled = self.finished = False
+        self._kill_time = None
+
+    @classmethod
+    def from_config(cls, args, handler, config, **kwargs):
+        u"""Return the supervisor of an encoder configured by the ``encoder_*_timeout`` options of ``config``."""
+        return cls(args, handler, stall_timeout=config.encoder_stall_timeout,
+                   kill_timeout=config.encoder_kill_timeout, **kwargs)
+
+    def run(self):
+        u"""Run the encoder until it exits (or is killed) and return its return code (minus the signal if killed)."""
+        args = self.budget.command(self.args) if self.budget else list(self.args)
+        self.process = subprocess.Popen(args, stdout=subprocess.PIPE if self.stdout else None,
+                                        stderr=subprocess.PIPE, close_fds=True)
+        streams = [stream for stream in (self.process.stdout, self.process.stderr) if stream]
+        for stream in streams:
+            fcntl.fcntl(stream, fcntl.F_SETFL, fcntl.fcntl(stream, fcntl.F_GETFL) | os.O_NONBLOCK)
+        if self.budget:
+            self.budget.update(self.process.pid, force=True)
+        activity_time = size_time = time.time()
+        try:
+            while self.returncode is None:
+                if streams:
+                    ready = select.select(streams, [], [], self.poll_interval)[0]
+                else:
+                    ready = time.sleep(self.poll_interval) or []
+                stdout, stderr = (self._read(stream, streams) if stream in ready else b''
+                                  for stream in (self.process.stdout, self.process.stderr))
+                now = time.time()
+                progress = bool(stdout or stderr) and self.handler(stdout, stderr)
+                if not progress and self.tracker and now - size_time >= self.poll_interval:
+                    size, size_time = self.tracker.size, now
+                    progress = self.tracker.update() != size
+                if progress:
+                    activity_time = now
+                self._wait(os.WNOHANG)
+                if self.returncode is not None:
+                    break
+                if self.budget:
+                    self.budget.update(self.process.pid)
+                stalled = self.stall_timeout and now - activity_time > self.stall_timeout
+                if stalled and not (self.stalled or self.finished):
+                    self.stalled = True
+                    self.terminate()
+                elif self._kill_time and now > self._kill_time:
+                    self.process.kill()
+                    self._kill_time = None
+            # The remaining output, the outputs may be kept open by the children of the encoder
+            stdout, stderr = (self._read(stream, streams) if stream in streams else b''
+                              for stream in (self.process.stdout, self.process.stderr))
+            if stdout or stderr:
+                self.handler(stdout, stderr)
+        finally:
+            if self.returncode is None:
+                self.process.kill()
+                self._wait(0)
+            for stream in (self.process.stdout, self.process.stderr):
+                if stream:
+                    stream.close()
+        return self.returncode
+
+    def finish(self):
+        u"""Declare the work of the encoder done, the encoder is terminated if still running."""
+        self.finished = True
+        self.terminate()
+
+    def terminate(self):
+        u"""Ask the encoder to terminate, it is killed if still running ``kill_timeout`` seconds later."""
+        if self.returncode is None:
+            self.process.terminate()
+            self._kill_time = time.time() + self.kill_timeout
+
+    def _read(self, stream, streams):
+        try:
+            data = os.read(stream.fileno(), 64*1024)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return b''
+            raise
+        if not data:
+            streams.remove(stream)  # End of file
+        return data
+
+    def _wait(self, options):
+        pid, status, rusage = os.wait4(self.process.pid, options)
+        if pid == 0:
+            return
+        self.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        self.process.returncode = self.returncode  # The process is reaped, Popen must not wait for it
+        self.resources = {
+            u'cpu_user_time': rusage.ru_utime, u'cpu_system_time': rusage.ru_stime,
+            u'max_rss': rusage.ru_maxrss * 1024,  # Kilobytes on Linux
+            u'read_bytes': rusage.ru_inblock * 512, u'write_bytes': rusage.ru_oublock * 512
+        }
+
+
+class PhaseTimer(object):
+    u"""
+    Measure the wall time of the successive phases of a task (e.g. probe, encode, finalize and callback), in seconds.
+    Starting a phase ends the current one.
+
+    **Example usage**
+
+    >>> timer = PhaseTimer()
+    >>> timer.start(u'probe')
+    >>> time.sleep(0.01)
+    >>> timer.start(u'encode')
+    >>> timer.start(u'encode')  # Already the current phase
+    >>> timer.stop()
+    >>> print(sorted(timer.times.keys()), timer.times[u'probe'] >= 0.01, timer.times[u'encode'] < 0.01)
+    [u'encode', u'probe'] True True
+    """
+
+    def __init__(self):
+        self.times = {}
+        self._phase = None
+
+    def start(self, name):
+        u"""End the current phase and start the phase ``name`` (if it is not the current phase)."""
+        if self._phase and self._phase[0] == name:
+            return
+        self.stop()
+        self._phase = (name, time.time())
+
+    def stop(self):
+        u"""End the current phase, its duration is added to the wall time of the phase."""
+        if self._phase:
+            name, start_time = self._phase
+            self.times[name] = self.times.get(name, 0) + time.time() - start_time
+            self._phase = None
@@ -239,6 +239,11 @@ class CharmHooks_Subordinate(OsciedCharmHooks):
             return
         self.info(u'Register the Orchestrator')
         local_cfg.api_nat_socket = socket
+        local_cfg.verbose = self.config.verbose  # Dump the local configuration at the beginning of the tasks
+        local_cfg.progress_flush_interval = self.config.progress_flush_interval
+        local_cfg.progress_ratio_delta = self.config.progress_ratio_delta
+        local_cfg.progress_time_delta = self.config.progress_time_delta
+        local_cfg.progress_max_time_delta = self.config.progress_max_time_delta
         try:
             infos = pymongo.uri_parser.parse_uri(mongo)
             assert len(infos[u'nodelist']) == 1
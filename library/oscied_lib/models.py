@@ -425,3 +425,110 @@ class TransformTask(TaskModel):
         if not profile.is_dash and media_out.is_dash:
             raise ValueError(to_bytes(u'Cannot launch the task, output media asset is a MPD but task is not based on a '
                              'MPEG-DASH encoder called {0}.'.format(profile.encoder_name)))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+class Workflow(Model):
+    u"""
+    A chain of transformation and publication steps advanced by the orchestrator, the input media asset of a step is
+    the output media asset of the previous step (the input media asset of the workflow for the first step).
+
+    A step is a dictionary with the ``type`` (transform or publish) and the ``queue`` of the task, a transformation step
+    requires the ``profile_id`` and the ``filename`` and accepts the ``metadata``, the ``segment_duration`` and the
+    ``priority`` of the transformation task. The orchestrator appends the ``status``, the ``task_id`` and the
+    ``media_id`` (output media asset) of the steps.
+    """
+
+    ALL_STATUS = PENDING, RUNNING, SUCCESS, FAILURE, REVOKED = (u'PENDING', u'RUNNING', u'SUCCESS', u'FAILURE',
+                                                                u'REVOKED')
+    FINAL_STATUS = (SUCCESS, FAILURE, REVOKED)
+    STEPS_TYPES = TRANSFORM, PUBLISH = (u'transform', u'publish')
+
+    def __init__(self, user=None, user_id=None, media_in=None, media_in_id=None, steps=None, tasks_ids=None,
+                 send_email=False, _id=None, statistic=None, status=PENDING):
+        super(Workflow, self).__init__(_id)
+        self.user = dict2object(User, user, inspect_constructor=True) if isinstance(user, dict) else user
+        if user is None:  # User attribute overrides user_id
+            self.user_id = user_id
+            del self.user
+        self.media_in = dict2object(Media, media_in, True) if isinstance(media_in, dict) else media_in
+        if media_in is None:  # Media_in attribute overrides media_in_id
+            self.media_in_id = media_in_id
+            del self.media_in
+        self.steps = steps or []
+        self.tasks_ids = tasks_ids or []
+        self.send_email = send_email
+        self.statistic = statistic or {}
+        self.status = status
+
+    @property
+    def current_step(self):
+        u"""
+        Return the index of the first step that is not successful or None if all steps are successful.
+
+        **Example usage**
+
+        >>> workflow = Workflow(steps=[{u'type': u'transform'}, {u'type': u'publish'}])
+        >>> print(workflow.current_step)
+        0
+        >>> workflow.steps[0][u'status'] = Workflow.SUCCESS
+        >>> print(workflow.current_step)
+        1
+        >>> workflow.steps[1][u'status'] = Workflow.SUCCESS
+        >>> print(workflow.current_step)
+        None
+        """
+        for index, step in enumerate(self.steps):
+            if step.get(u'status') != Workflow.SUCCESS:
+                return index
+        return None
+
+    def get_step_input(self, index):
+        u"""
+        Return the id of the input media asset of the step ``index``.
+
+        **Example usage**
+
+        >>> workflow = Workflow(media_in_id=u'in', steps=[{u'media_id': u'out'}, {}])
+        >>> print(workflow.get_step_input(0), workflow.get_step_input(1))
+        in out
+        """
+        return self.steps[index - 1][u'media_id'] if index > 0 else self.media_in_id
+
+    def is_valid(self, raise_exception):
+        if not valid_uuid(self._id, none_allowed=False):
+            self._E(raise_exception, u'_id is not a valid uuid string')
+        if (hasattr(self, u'user') and self.user is not None and
+            (not isinstance(self.user, User) or not self.user.is_valid(False))):
+            self._E(raise_exception, u'user is not a valid instance of user')
+        # Remark: An integer is also considered as a valid user id to simplify the integration with EBU-io
+        if hasattr(self, u'user_id') and not (valid_uuid(self.user_id, none_allowed=False) or valid_int(self.user_id)):
+            self._E(raise_exception, u'user_id is not a valid uuid string neither a valid integer')
+        if (hasattr(self, u'media_in') and self.media_in is not None and
+            (not isinstance(self.media_in, Media) or not self.media_in.is_valid(False))):
+            self._E(raise_exception, u'media_in is not a valid instance of media')
+        if hasattr(self, u'media_in_id') and not valid_uuid(self.media_in_id, none_allowed=False):
+            self._E(raise_exception, u'media_in_id is not a valid uuid string')
+        if not isinstance(self.steps, list) or not self.steps:
+            self._E(raise_exception, u'steps is not a non-empty list')
+        for index, step in enumerate(self.steps):
+            if not isinstance(step, dict) or step.get(u'type') not in Workflow.STEPS_TYPES:
+                self._E(raise_exception, u'step {0} is not a valid step'.format(index))
+            elif not step.get(u'queue'):
+                self._E(raise_exception, u'queue of step {0} is required'.format(index))
+            elif step[u'type'] == Workflow.TRANSFORM:
+                if not valid_uuid(step.get(u'profile_id'), none_allowed=False):
+                    self._E(raise_exception, u'profile_id of step {0} is not a valid uuid string'.format(index))
+                if not valid_filename(step.get(u'filename')):
+                    self._E(raise_exception, u'filename of step {0} is not a valid filename'.format(index))
+        if not self.status in Workflow.ALL_STATUS:
+            self._E(raise_exception, u'status is not a valid status')
+        # FIXME check send_email
+        return True
+
+    def load_fields(self, user, media_in):
+        self.user = user
+        self.media_in = media_in
+        del self.user_id
+        del self.media_in_id
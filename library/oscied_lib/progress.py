@@ -0,0 +1,211 @@
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import logging, os, threading, time
+from pytoolbox.mongo import TaskModel
+
+
+class ProgressPublisher(object):
+    u"""
+    Coalesce the progress updates of the tasks of a worker process and flush them in batches into a compact collection.
+
+    A progress update is accepted if at least ``ratio_delta`` of progress and ``time_delta`` seconds elapsed or if
+    ``max_time_delta`` seconds elapsed since the last accepted update of the task. The last accepted update of every
+    task is written at most once every ``flush_interval`` seconds by a background thread, the final update of a task is
+    written after the flush in progress (if any). The documents are
+    ``{_id: <id>, task_id: <id of the task>, state: <state>, meta: <statistic>, date: <timestamp>}``. The flush also
+    calls ``backend(id, state, meta)`` if set, e.g. to keep the state of the task in the result backend of Celery
+    up-to-date.
+
+    **Example usage**
+
+    >>> import mongomock
+    >>> collection = mongomock.Connection().celery.progress
+    >>> stored = []
+    >>> publisher = ProgressPublisher(collection, flush_interval=60, ratio_delta=0.1, time_delta=1, max_time_delta=5,
+    ...                               backend=lambda id, state, meta: stored.append((id, state, meta[u'percent'])))
+    >>> print(publisher.accept(u'a', 0.05, 2), publisher.accept(u'a', 0.2, 2), publisher.accept(u'a', 0.21, 3))
+    False True False
+    >>> print(publisher.accept(u'a', 0.21, 8))
+    True
+    >>> publisher.publish(u'a', u'PROGRESS', {u'percent': 10})
+    >>> publisher.publish(u'a', u'PROGRESS', {u'percent': 21})
+    >>> print(collection.find().count(), publisher.flush(), collection.find_one()[u'meta'][u'percent'])
+    0 1 21
+    >>> print(stored)
+    [(u'a', u'PROGRESS', 21)]
+    >>> publisher.finish(u'a', u'SUCCESS', {u'percent': 100})
+    >>> print(collection.find_one()[u'state'], publisher.flush(), publisher.get(u'a')[u'meta'][u'percent'])
+    SUCCESS 0 100
+    """
+
+    COLLECTION = u'progress'
+
+    _instance = _instance_pid = None
+
+    def __init__(self, collection, flush_interval=5, ratio_delta=0.01, time_delta=1, max_time_delta=5, backend=None):
+        self.collection = collection
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.ratio_delta = ratio_delta
+        self.time_delta = time_delta
+        self.max_time_delta = max_time_delta
+        self._accepted = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def get_instance(cls, database, config):
+        u"""
+        Return the publisher of this process, writing into the progress collection of ``database``.
+
+        The publisher is created (again) in any new (e.g. pre-forked) worker process.
+        """
+        pid = os.getpid()
+        if cls._instance is None or cls._instance_pid != pid:
+            cls._instance = cls(database[cls.COLLECTION], config.progress_flush_interval, config.progress_ratio_delta,
+                                config.progress_time_delta, config.progress_max_time_delta, store_celery_state)
+            cls._instance_pid = pid
+        return cls._instance
+
+    def accept(self, id, ratio, elapsed_time):
+        u"""Return True if the progress update of task ``id`` is significant enough to be published."""
+        prev_ratio, prev_time = self._accepted.get(id, (0, 0))
+        delta_time = elapsed_time - prev_time
+        if (ratio - prev_ratio > self.ratio_delta and delta_time > self.time_delta) or delta_time > self.max_time_delta:
+            self._accepted[id] = (ratio, elapsed_time)
+            return True
+        return False
+
+    def publish(self, id, state, meta, task_id=None):
+        u"""Replace the pending update of the task (or of a part of the task) ``id``, the flush will write it."""
+        document = {u'_id': id, u'task_id': task_id or id, u'state': state, u'meta': meta, u'date': time.time()}
+        with self._lock:
+            self._pending[id] = document
+        self.start()
+
+    def finish(self, id, state, meta, task_id=None):
+        u"""Write the final update of the task ``id`` immediately, after the updates of a flush in progress."""
+        document = {u'_id': id, u'task_id': task_id or id, u'state': state, u'meta': meta, u'date': time.time()}
+        self._accepted.pop(id, None)
+        with self._write_lock:
+            with self._lock:
+                self._pending.pop(id, None)
+            self.collection.save(document, safe=True)
+
+    def get(self, id):
+        u"""Return the last update of the task (or of a part of the task) ``id`` (pending or written) or None."""
+        with self._lock:
+            document = self._pending.get(id)
+        return document or self.collection.find_one({u'_id': id})
+
+    def flush(self):
+        u"""Write the pending updates and return the amount of updates written."""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            for document in pending.itervalues():
+                try:
+                    self.collection.save(document)
+                except Exception as error:
+                    logging.warning(u'Unable to write progress of task {0}: {1}'.format(document[u'_id'], error))
+                if self.backend:
+                    try:
+                        self.backend(document[u'_id'], document[u'state'], document[u'meta'])
+                    except Exception as error:
+                        logging.warning(u'Unable to store state of task {0}: {1}'.format(document[u'_id'], error))
+        return len(pending)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=u'progress-publisher')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def store_celery_state(task_id, state, meta):
+    u"""Store the state of the task ``task_id`` into the result backend of Celery (what ``update_state`` does)."""
+    from celery import current_app
+    current_app.backend.store_result(task_id, meta, state)
+
+
+def aggregate_progress(task_id, documents):
+    u"""
+    Return the progress of the task ``task_id`` from the progress documents published by the task and its parts.
+
+    The progress of a task split into parts (e.g. the segments of a segmented transcode) is aggregated, unless the
+    task published its own progress (e.g. the concatenation of the segments). The parts done are the checkpoints of
+    the task (``segments_done``).
+
+    **Example usage**
+
+    >>> documents = [
+    ...     {u'_id': u'b', u'task_id': u'a', u'state': u'SUCCESS', u'meta': {u'percent': 100, u'elapsed_time': 10,
+    ...      u'media_out_size': 300, u'segments_count': 4}},
+    ...     {u'_id': u'c', u'task_id': u'a', u'state': u'PROGRESS', u'meta': {u'percent': 50, u'elapsed_time': 6,
+    ...      u'media_out_size': 100, u'segments_count': 4}}]
+    >>> progress = aggregate_progress(u'a', documents)
+    >>> meta = progress[u'meta']
+    >>> print(progress[u'state'], meta[u'percent'], meta[u'elapsed_time'], meta[u'eta_time'], meta[u'media_out_size'])
+    PROGRESS 37 10 16 400
+    >>> print(meta[u'segments_done'], meta[u'wasted_time'])
+    1 0
+    >>> print(aggregate_progress(u'a', documents + [{u'_id': u'a', u'state': u'SUCCESS'}])[u'state'])
+    SUCCESS
+    """
+    for document in documents:
+        if document[u'_id'] == task_id:
+            return document
+    metas = [document[u'meta'] for document in documents]
+    parts = max([len(metas)] + [meta.get(u'segments_count', 0) for meta in metas])
+    percent = sum(meta.get(u'percent', 0) for meta in metas) / parts
+    elapsed_time = max(meta.get(u'elapsed_time', 0) for meta in metas)
+    return {
+        u'_id': task_id, u'task_id': task_id, u'state': TaskModel.PROGRESS,
+        u'date': max(document.get(u'date') for document in documents),
+        u'meta': {u'percent': int(percent), u'elapsed_time': elapsed_time, u'segments_count': parts,
+                  u'segments_done': sum(1 for document in documents if document[u'state'] == TaskModel.SUCCESS),
+                  u'eta_time': int(elapsed_time * (100 - percent) / percent) if percent > 0 else 0,
+                  u'media_out_size': sum(meta.get(u'media_out_size', 0) for meta in metas),
+                  u'wasted_time': sum(meta.get(u'wasted_time', 0) for meta in metas)}
+    }
+
+
+def get_progress(collection, ids):
+    u"""Return the progress of the tasks with ids ``ids`` (one query) as a dictionary task id -> document."""
+    documents = {}
+    for document in collection.find({u'task_id': {u'$in': list(ids)}}):
+        documents.setdefault(document[u'task_id'], []).append(document)
+    return dict((task_id, aggregate_progress(task_id, docs)) for task_id, docs in documents.iteritems())
@@ -25,17 +25,52 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import os, requests, shutil, time
+import multiprocessing, os, platform, requests, shutil, time
 from pytoolbox.encoding import to_bytes
 from pytoolbox.ffmpeg import get_media_duration
 from pytoolbox.filesystem import get_size, try_makedirs
 from pytoolbox.serialization import JsoneableObject
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 from urlparse import urlparse, ParseResult
 
 from .models import Media
 
 
+def new_session(pool_size=10, max_retries=3, backoff_factor=0.5):
+    u"""
+    Return a new HTTP session keeping up to ``pool_size`` connections alive per host.
+
+    Failed connections and idempotent requests answered by a 502, 503 or 504 are retried up to ``max_retries`` times,
+    waiting ``backoff_factor`` * (2 ^ retry number) seconds between retries.
+
+    **Example usage**
+
+    >>> session = new_session(pool_size=4, max_retries=2)
+    >>> adapter = session.get_adapter(u'http://127.0.0.1/api')
+    >>> print(adapter._pool_maxsize, adapter.max_retries.total)
+    4 2
+    """
+    session = requests.Session()
+    retries = Retry(total=max_retries, backoff_factor=backoff_factor, status_forcelist=(502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount(u'http://', adapter)
+    session.mount(u'https://', adapter)
+    return session
+
+
+def get_unit_type():
+    u"""Return the type of this unit (architecture, number of CPUs and amount of memory), e.g. x86_64-8cpu-16gb."""
+    memory = os.sysconf(b'SC_PAGE_SIZE') * os.sysconf(b'SC_PHYS_PAGES')
+    return u'{0}-{1}cpu-{2}gb'.format(platform.machine(), multiprocessing.cpu_count(), int(round(memory / 1024**3)))
+
+
 class Callback(JsoneableObject):
+
+    # Settings of the HTTP session shared by the callbacks of a (worker) process
+    POOL_SIZE, MAX_RETRIES, BACKOFF_FACTOR, TIMEOUT = 2, 5, 1.0, 30.0
+    _session = _session_pid = None
+
     def __init__(self, url=None, username=None, password=None):
         self.url = url
         self.username = username
@@ -66,10 +101,18 @@ class Callback(JsoneableObject):
         url = ParseResult(url.scheme, netloc, url.path, url.params, url.query, url.fragment)
         self.url = url.geturl()
 
-    def post(self, data_json):
-#       return requests.post(self.url, data_json, auth=(self.username, self.password))
+    @classmethod
+    def get_session(cls):
+        u"""Return the HTTP session of the current process, the connections to the orchestrator are kept alive."""
+        if cls._session is None or cls._session_pid != os.getpid():
+            cls._session = new_session(cls.POOL_SIZE, cls.MAX_RETRIES, cls.BACKOFF_FACTOR)
+            cls._session_pid = os.getpid()
+        return cls._session
+
+    def post(self, data_json, timeout=None):
         headers = {u'Content-type': u'application/json', u'Accept': u'text/plain'}
-        return requests.post(self.url, headers=headers, data=data_json, auth=(self.username, self.password))
+        return Callback.get_session().post(self.url, headers=headers, data=data_json,
+                                           auth=(self.username, self.password), timeout=timeout or self.TIMEOUT)
 
 
 class Storage(object):
@@ -39,7 +39,8 @@ CONFIG = {
     u'mongo_node_password': u'Mongo_user_1234', u'rabbit_password': u'Alice_in_wonderland', u'email_server': u'',
     u'email_tls': True, u'email_address': u'someone@oscied.org', u'email_username': u'someone', u'email_password': u'',
     u'storage_address': u'', u'storage_nat_address': u'', u'storage_fstype': u'', 'storage_mountpoint': u'',
-    u'storage_options': u'', u'plugit_api_url': u''
+    u'storage_options': u'', u'plugit_api_url': u'', u'api_processes': 0, u'api_threads': 15,
+    u'transform_capacity': 0, u'transform_weights': u'', u'transform_reap_delay': 600
 }
 
 OS_ENV, RETURNS = copy(DEFAULT_OS_ENV), []
@@ -107,6 +108,7 @@ class TestOrchestraHooks(object):
         assert_equal(self.hooks.cmd.call_args_list, [
             call(u'service mongodb start',         fail=False),
             call(u'service rabbitmq-server start', fail=False),
+            call(u'a2enmod xsendfile'),
             call(u'a2dissite 000-default'),
             call(u'a2ensite oscied-orchestra-0'),
             call(u'mongo f.js'),
@@ -22,9 +22,31 @@
 # If not, see he EUPL licence v1.1 is available in 22 languages:
 #     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
 
+import copy, hashlib, shutil, tempfile, time
+from io import BytesIO
+from mock import Mock, patch
+from nose.tools import assert_equal, assert_raises
+from pytoolbox.datetime import total_seconds
 from oscied_lib.config import OrchestraLocalConfig
+from oscied_lib.config_test import ORCHESTRA_CONFIG_TEST
+from oscied_lib.models import Media, TransformProfile, TransformTask, User, Workflow
+from oscied_lib.models_test import MEDIA_TEST, TRANSFORM_PROFILE_TEST, USER_TEST
 from oscied_lib.api import OrchestraAPICore
 
+
+def get_test_api(config=ORCHESTRA_CONFIG_TEST):
+    u"""Return an API core with a flushed database, a user, a ready input media asset and a profile."""
+    api = OrchestraAPICore(config)
+    api.flush_db()
+    user, media_in = copy.deepcopy(USER_TEST), copy.deepcopy(MEDIA_TEST)
+    profile = copy.deepcopy(TRANSFORM_PROFILE_TEST)
+    media_in.user_id, media_in.status = user._id, Media.READY
+    api.save_user(user, hash_secret=True)
+    api.save_media(media_in)
+    api.save_transform_profile(profile)
+    return api, user, media_in, profile
+
+
 class TestOrchestraAPICore(object):
 
     def test_something(self):
@@ -33,6 +55,173 @@ class TestOrchestraAPICore(object):
         print(api.__dict__)
         # TODO
 
+    def test_delete_media_move_to_tombstones(self):
+        api = OrchestraAPICore(ORCHESTRA_CONFIG_TEST)
+        media = copy.deepcopy(MEDIA_TEST)
+        media.status = Media.READY
+        api.save_media(media)
+        assert_equal(api.get_medias_count(), 1)
+        assert_equal(api.get_medias_count(deleted=True), 0)
+        api.delete_media(media)
+        assert_equal(api.get_medias_count(), 0)
+        assert_equal(api.get_medias_count(deleted=True), 1)
+        assert_equal(api.get_media({u'_id': media._id}), None)
+        assert_equal(api.get_media({u'_id': media._id}, deleted=True).status, Media.DELETED)
+        assert_equal([m._id for m in api.get_medias(deleted=True)], [media._id])
+        media.status = Media.READY
+        api.save_media(media)
+        assert_equal((api.get_medias_count(), api.get_medias_count(deleted=True)), (1, 0))
+
+    def test_transform_callback_keeps_deleted_output(self):
+        api, user, media_in, profile = get_test_api()
+        task = api.launch_transform_task(user._id, media_in._id, profile._id, u'out.mp4', {u'title': u'out'}, False,
+                                         u'transform', u'/transform/callback')
+        api.delete_media(task.media_out_id)
+        api._progress.save({u'_id': task._id, u'task_id': task._id, u'state': u'SUCCESS', u'meta': {}}, safe=True)
+        api.transform_callback(task._id, u'SUCCESS')
+        assert_equal(api.get_media({u'_id': task.media_out_id}), None)
+        assert_equal(api.get_media({u'_id': task.media_out_id}, deleted=True).status, Media.DELETED)
+
+    def test_upload_session(self):
+        config = copy.copy(ORCHESTRA_CONFIG_TEST)
+        config.storage_path = tempfile.mkdtemp()
+        try:
+            api = OrchestraAPICore(config)
+            session = api.create_upload_session(USER_TEST._id, u'video.mp4', 10, {u'title': u'Video'}, chunk_size=4)
+            assert_equal(session[u'missing'], [0, 4, 8])
+            assert_equal(api.upload_chunk(session[u'_id'], 8, BytesIO(b'89'))[u'size'], 2)
+            chunk = api.upload_chunk(session[u'_id'], 0, BytesIO(b'0123'))
+            assert_equal(chunk[u'md5'], hashlib.md5(b'0123').hexdigest())
+            assert_raises(ValueError, api.upload_chunk, session[u'_id'], 4, BytesIO(b'45'))
+            assert_raises(ValueError, api.upload_chunk, session[u'_id'], 5, BytesIO(b'5678'))
+            assert_equal(api.get_upload_session(session[u'_id'])[u'missing'], [4])
+            assert_raises(ValueError, api.commit_upload_session, session[u'_id'])
+            api.upload_chunk(session[u'_id'], 4, BytesIO(b'4567'))
+            with patch.object(api, 'save_media', Mock(side_effect=ValueError)):
+                assert_raises(ValueError, api.commit_upload_session, session[u'_id'])
+            assert_equal(api.get_upload_session(session[u'_id'])[u'missing'], [])
+            media = api.commit_upload_session(session[u'_id'])
+            assert_equal(api.get_upload_session(session[u'_id']), None)
+            assert_equal(api.get_media({u'_id': media._id}).filename, u'video.mp4')
+            with open(config.storage_medias_path(media, generate=False), u'rb') as f:
+                assert_equal(f.read(), b'0123456789')
+        finally:
+            shutil.rmtree(config.storage_path)
+
+    def test_launch_transform_ladder(self):
+        api, user, media_in, profile = get_test_api()
+        profiles = [profile,
+                    TransformProfile(title=u'SD 480p', description=u'MP4 H.264 480p', encoder_name=u'ffmpeg',
+                                     encoder_string=u'-s 854x480 ...'),
+                    TransformProfile(title=u'Copy', description=u'Copy', encoder_name=u'copy', encoder_string=u'')]
+        for profile in profiles[1:]:
+            api.save_transform_profile(profile)
+        outputs = [{u'profile_id': p._id, u'filename': p.title + u'.mp4', u'metadata': {u'title': p.title}}
+                   for p in profiles]
+        assert_raises(ValueError, api.launch_transform_ladder, user._id, media_in._id, outputs, False, u'transform',
+                      u'/transform/callback')
+        assert_equal(api.get_medias_count(), 1)
+        tasks = api.launch_transform_ladder(user._id, media_in._id, outputs[:2], False, u'transform',
+                                            u'/transform/callback')
+        assert_equal([t.profile_id for t in tasks], [profiles[0]._id, profiles[1]._id])
+        assert_equal(len(set(t.media_out_id for t in tasks)), 2)
+        for task in tasks:
+            assert_equal(api.get_transform_task({u'_id': task._id}, append_result=False).statistic[u'ladder'],
+                         [t._id for t in tasks])
+            assert_equal(api.get_media({u'_id': task.media_out_id}).status, Media.PENDING)
+
+    def test_launch_transform_task_fair_share(self):
+        config = copy.copy(ORCHESTRA_CONFIG_TEST)
+        config.transform_capacity = 2
+        api, alice, media_in, profile = get_test_api(config)
+        bob = User(first_name=u'Bob', last_name=u'Oscied', mail=u'bob@oscied.org', secret=u'Secr4taB')
+        api.save_user(bob, hash_secret=True)
+
+        def launch(user, priority=0):
+            return api.launch_transform_task(user._id, media_in._id, profile._id, u'out.mp4', {u'title': u'out'},
+                                             False, u'transform', u'/transform/callback', priority=priority)._id
+
+        def released():
+            return set(e[u'_id'] for e in api._db.transform_queue.find({u'status': u'RUNNING'}))
+
+        batch = [launch(alice) for i in xrange(4)]
+        task_bob, task_urgent = launch(bob), launch(alice, priority=1)
+        assert_raises(ValueError, launch, bob, u'high')
+        assert_equal(released(), set(batch[:2]))
+        api.scheduler.release(batch[0])  # Done, the highest priority is released first
+        assert_equal(released(), set([batch[1], task_urgent]))
+        api.scheduler.release(batch[1])  # Done, bob has no running task
+        assert_equal(released(), set([task_urgent, task_bob]))
+        api.revoke_transform_task(api.get_transform_task({u'_id': batch[3]}, append_result=False))
+        api.scheduler.release(task_bob)
+        assert_equal(released(), set([task_urgent, batch[2]]))
+
+    def test_scheduler_reap(self):
+        config = copy.copy(ORCHESTRA_CONFIG_TEST)
+        config.transform_capacity, config.transform_reap_delay = 1, 60
+        api, user, media_in, profile = get_test_api(config)
+        dead, waiting = (api.launch_transform_task(user._id, media_in._id, profile._id, u'out.mp4', {u'title': u'out'},
+                                                   False, u'transform', u'/transform/callback')._id for i in xrange(2))
+        api.scheduler.schedule(u'transform')  # Released recently
+        assert_equal(api._db.transform_queue.find_one({u'_id': waiting})[u'status'], u'READY')
+        api._progress.save({u'_id': dead, u'task_id': dead, u'state': u'PROGRESS', u'meta': {},
+                            u'date': time.time() - 3600}, safe=True)
+        api._db.transform_queue.update({u'_id': dead}, {u'$set': {u'release_date': time.time() - 3600}}, safe=True)
+        api.scheduler.schedule(u'transform')
+        assert_equal(api._db.transform_queue.find_one({u'_id': dead}), None)
+        assert_equal(api._db.transform_queue.find_one({u'_id': waiting})[u'status'], u'RUNNING')
+
+    def test_estimate_transform_task(self):
+        api, user, media_in, profile = get_test_api()
+        assert_equal(api.estimate_transform_task(media_in._id, profile._id), None)
+        for elapsed_time, unit_type in ((50, u'small'), (60, u'small'), (70, u'small'), (20, u'large')):
+            task = TransformTask(user_id=user._id, media_in_id=media_in._id, media_out_id=media_in._id,
+                                 profile_id=profile._id)
+            task.status = TransformTask.SUCCESS
+            task.statistic = {u'elapsed_time': elapsed_time, u'media_in_duration': u'00:02:00',
+                              u'media_out_size': 1200, u'unit_type': unit_type}
+            api._db.transform_tasks.save(task.__dict__, safe=True)
+        duration = total_seconds(media_in.metadata[u'duration'])
+        estimate = api.estimate_transform_task(media_in._id, profile._id)
+        assert_equal(estimate[u'samples'], 4)
+        assert_equal(estimate[u'elapsed_time'], int(round(duration * 50 / 120)))
+        assert_equal(estimate[u'media_out_size'], int(round(duration * 10)))
+        estimate = api.estimate_transform_task(media_in._id, profile._id, unit_type=u'small')
+        assert_equal((estimate[u'samples'], estimate[u'unit_type']), (3, u'small'))
+        assert_equal(estimate[u'elapsed_time'], int(round(duration * 60 / 120)))
+
+    def test_launch_workflow(self):
+        api, user, media_in, profile = get_test_api()
+        steps = [{u'type': u'transform', u'profile_id': profile._id, u'filename': u'out.mp4', u'queue': u'transform',
+                  u'metadata': {u'title': u'out'}},
+                 {u'type': u'publish', u'queue': u'publisher'}]
+
+        def done(task_id, publish_uri=None):
+            api._progress.save({u'_id': task_id, u'task_id': task_id, u'state': u'SUCCESS', u'meta': {}}, safe=True)
+            if publish_uri:
+                api.publisher_callback(task_id, publish_uri, u'SUCCESS')
+            else:
+                api.transform_callback(task_id, u'SUCCESS')
+            return api.get_workflow({u'_id': workflow._id})
+
+        assert_raises(IndexError, api.launch_workflow, user._id, media_in._id, [dict(steps[1], queue=u'other')],
+                      False, u'/transform/callback', u'/publisher/callback')
+        assert_equal(api.get_workflows_count(), 0)
+        workflow = api.launch_workflow(user._id, media_in._id, copy.deepcopy(steps), False, u'/transform/callback',
+                                       u'/publisher/callback')
+        assert_equal(workflow.status, Workflow.RUNNING)
+        assert_equal([s[u'status'] for s in workflow.steps], [Workflow.RUNNING, Workflow.PENDING])
+        media_out_id = workflow.steps[0][u'media_id']
+        workflow = done(workflow.steps[0][u'task_id'])
+        assert_equal(workflow.status, Workflow.RUNNING)
+        assert_equal([s[u'status'] for s in workflow.steps], [Workflow.SUCCESS, Workflow.RUNNING])
+        task = api.get_publisher_task({u'_id': workflow.steps[1][u'task_id']}, append_result=False)
+        assert_equal(task.media_id, media_out_id)
+        workflow = done(workflow.steps[1][u'task_id'], publish_uri=u'http://publisher/out.mp4')
+        assert_equal(workflow.status, Workflow.SUCCESS)
+        assert_equal(workflow.steps[1][u'publish_uri'], u'http://publisher/out.mp4')
+        assert_equal(api.get_media({u'_id': media_out_id}).public_uris.values(), [u'http://publisher/out.mp4'])
+
 if __name__ == u'__main__':
     from pytoolbox.encoding import configure_unicode
     configure_unicode()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+
+
+import os, shutil, tempfile, time
+from mock import MagicMock, Mock, patch
+from nose.tools import assert_equal, assert_false, assert_true
+from pytoolbox.datetime import datetime_now
+from oscied_lib.models import TransformTask
+from oscied_lib.TransformWorker import SEGMENTS_PATH, transform_concat_task
+
+
+class TestTransformConcatTask(object):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.media_out_path = os.path.join(self.directory, u'out.mp4')
+        os.makedirs(os.path.join(self.directory, SEGMENTS_PATH))
+        self.progress = Mock()
+        transform_concat_task.backend = Mock()
+
+    def tearDown(self):
+        transform_concat_task.backend = None  # Back to the backend of the application
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def ffmpeg_encode(self, cmd, duration, parser, progress_callback, budget, config, tracker=None):
+        progress_callback(1.0, {u'time': u'00:00:10'})
+        return Mock(returncode=0, resources={})
+
+    def test_concat_statistic(self):
+        segments = [{u'start_time': time.time() - 30, u'resumed': True, u'wasted_time': 5},
+                    {u'start_time': time.time() - 20}]
+        arguments = (Mock(), None, os.path.join(self.directory, u'in.mp4'), self.media_out_path, Mock())
+        with patch('oscied_lib.TransformWorker.load_task_arguments', Mock(return_value=arguments)), \
+                patch('oscied_lib.TransformWorker.ProgressPublisher.get_instance', Mock(return_value=self.progress)), \
+                patch('oscied_lib.TransformWorker.ffmpeg_encode', self.ffmpeg_encode), \
+                patch('oscied_lib.TransformWorker.get_media_duration', Mock(return_value=u'00:00:10')), \
+                patch('oscied_lib.TransformWorker.get_size', Mock(return_value=1024)), \
+                patch('oscied_lib.TransformWorker.post_callback', Mock()), \
+                patch('oscied_lib.TransformWorker.CpuBudget', MagicMock()):
+            statistic = transform_concat_task.apply(args=(segments, u'{}', u'{}', u'{}', u'{}')).get()
+        assert_true(statistic[u'elapsed_time'] >= 30)
+        assert_true(statistic[u'start_date'] < datetime_now())
+        assert_equal(statistic[u'segments_resumed'], 1)
+        assert_equal(statistic[u'wasted_time'], 5)
+        (task_id, state, meta), kwargs = self.progress.publish.call_args
+        assert_equal(state, TransformTask.PROGRESS)
+        assert_true(meta[u'elapsed_time'] >= 30)
+        assert_equal(meta[u'start_date'], statistic[u'start_date'])
+        (task_id, state, meta), kwargs = self.progress.finish.call_args
+        assert_equal(state, TransformTask.SUCCESS)
+        assert_false(os.path.exists(os.path.join(self.directory, SEGMENTS_PATH)))
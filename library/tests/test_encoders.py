@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+
+import random
+from os.path import abspath, dirname, join
+from nose.tools import assert_equal, assert_true
+from oscied_lib.encoders import FFMPEG_REGEX, FFmpegProgressParser
+
+FFMPEG_STDERR_FILENAME = join(abspath(dirname(__file__)), u'ffmpeg_stderr.log')
+
+
+def read_chunks(filename, min_size=1, max_size=512):
+    u"""Yield the content of a capture of the output of an encoder by chunks of random sizes (non-blocking reads)."""
+    with open(filename, u'rb') as f:
+        data = f.read()
+    random.seed(0)
+    position = 0
+    while position < len(data):
+        size = random.randint(min_size, max_size)
+        yield data[position:position+size]
+        position += size
+
+
+class TestFFmpegProgressParser(object):
+
+    def test_parse_all_progress_lines(self):
+        parser, times = FFmpegProgressParser(), []
+        for chunk in read_chunks(FFMPEG_STDERR_FILENAME, max_size=64):
+            stats = parser.feed(chunk)
+            if stats:
+                times.append(stats[u'time'])
+        assert_equal(parser.stats[u'frame'], u'17620')
+        assert_equal(parser.stats[u'fps'], u'25.5')
+        assert_equal(parser.stats[u'size'], u'498646kB')
+        assert_equal(times[-1], u'00:12:14.17')
+        assert_equal(times, sorted(times))
+
+    def test_regex_decimal_fps_and_not_available(self):
+        match = FFMPEG_REGEX.search(u'frame=  240 fps= 29.7 q=-1.0 Lsize=N/A time=N/A bitrate=N/A')
+        assert_equal(match.groupdict(), {u'frame': u'240', u'fps': u'29.7', u'q': u'-1.0', u'size': u'N/A',
+                                         u'time': u'N/A', u'bitrate': u'N/A'})
+
+    def test_log_is_bounded(self):
+        parser = FFmpegProgressParser(log_size=1024)
+        for chunk in read_chunks(FFMPEG_STDERR_FILENAME):
+            parser.feed(chunk)
+        assert_equal(len(parser.log), 1024)
+        assert_true(parser.log.truncated)
+        assert_true(parser.log.value.endswith(u'kb/s:5561.37\n'))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+
+import subprocess, sys
+from os.path import abspath, dirname, join
+from nose.tools import assert_equal
+
+LIBRARY_PATH = abspath(join(dirname(__file__), u'..'))
+
+# The modules that must be imported on first use (orchestrator or workers only), the states and results of Celery are
+# loaded by the task models of pytoolbox
+LAZY_MODULES = (u'celery.app.task', u'celery.canvas', u'jinja2', u'mongomock', u'nose', u'pymongo', u'pytoolbox.juju',
+                u'smtplib', u'oscied_lib.PublisherWorker', u'oscied_lib.TransformWorker')
+
+
+def loaded_modules(module):
+    code = u'import sys; sys.path.insert(0, {0!r}); import {1}; print(u",".join(m for m in {2!r} if m in sys.modules))'
+    output = subprocess.check_output([sys.executable, u'-c', code.format(LIBRARY_PATH, module, LAZY_MODULES)])
+    return filter(None, output.decode(u'utf-8').strip().split(u','))
+
+
+class TestImports(object):
+
+    def test_api_package_is_lightweight(self):
+        assert_equal(loaded_modules(u'oscied_lib.api'), [])
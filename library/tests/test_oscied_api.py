@@ -22,12 +22,13 @@
 # If not, see he EUPL licence v1.1 is available in 22 languages:
 #     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
 
-from mock import call
+import json
+from mock import call, Mock
 from nose.tools import assert_equal, assert_raises
 from pytoolbox.unittest import mock_cmd
 from requests import get, post
 
-from oscied_lib.api import VERSION, OsciedCRUDMapper, OrchestraAPIClient
+from oscied_lib.api import VERSION, OsciedCRUDMapper, OrchestraAPIClient, OrchestraAPIClientPool
 from oscied_lib.models import User
 
 
@@ -81,6 +82,31 @@ class TestOsciedCRUDMapper(object):
                  data='{"first_name": "Tabby", "last_name": "Fischer", "admin_platform": false, "secret": "mia0w_mia0w"'
                       ', "mail": "t@f.com", "_id": "3959e400-94b0-49f7-8b0f-fd168b7c90e3"}')])
 
+    def test_get_many(self):
+        client = FakeAPIClient('http://test.com')
+        mapper = OsciedCRUDMapper(client, 'method')
+        mapper.get_many(['a', 'b'])
+        mapper.get_many(_id for _id in ['c'])
+        assert_equal(client.do_request.call_args_list, [
+            call(get, u'http://test.com/method/ids', data='{"ids": ["a", "b"]}'),
+            call(get, u'http://test.com/method/ids', data='{"ids": ["c"]}')])
+
+
+class TestOrchestraAPIClientPool(object):
+
+    def test_get_many_multi(self):
+        maas, amazon = FakeAPIClient('http://maas.com'), FakeAPIClient('http://amazon.com')
+        for client in (maas, amazon):
+            client.do_request = Mock(side_effect=lambda verb, url, data=None: json.loads(data)[u'ids'])
+        pool = OrchestraAPIClientPool(concurrency=3, chunk_size=2)
+        values = pool.get_many_multi([(OsciedCRUDMapper(maas, 'task'), ['a', 'b', 'c', 'd', 'e']),
+                                      (OsciedCRUDMapper(amazon, 'task'), (i for i in ['f'])),
+                                      (OsciedCRUDMapper(amazon, 'task'), [])])
+        pool.close()
+        assert_equal(values, [['a', 'b', 'c', 'd', 'e'], ['f'], []])
+        assert_equal(maas.do_request.call_count, 3)
+        assert_equal(amazon.do_request.call_count, 1)
+
 
 def assert_len(client, mapper, expected):
     client.do_request = mock_cmd()
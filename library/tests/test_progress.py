@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : COMMON LIBRARY
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+
+
+import threading
+from nose.tools import assert_equal, assert_true
+from oscied_lib.progress import ProgressPublisher
+
+
+class BlockingCollection(object):
+    u"""A collection blocking the writes of the progress updates until it is resumed."""
+
+    def __init__(self):
+        self.documents, self.saving, self.resume = {}, threading.Event(), threading.Event()
+
+    def save(self, document, safe=False):
+        if document[u'state'] == u'PROGRESS':
+            self.saving.set()
+            self.resume.wait(5)
+        self.documents[document[u'_id']] = document
+
+
+class TestProgressPublisher(object):
+
+    def test_finish_during_flush(self):
+        collection, states = BlockingCollection(), []
+        publisher = ProgressPublisher(collection, flush_interval=60,
+                                      backend=lambda id, state, meta: states.append(state))
+        publisher.publish(u'a', u'PROGRESS', {u'percent': 50})
+        flusher = threading.Thread(target=publisher.flush)
+        flusher.start()
+        assert_true(collection.saving.wait(5))
+        finisher = threading.Thread(target=publisher.finish, args=(u'a', u'SUCCESS', {u'percent': 100}))
+        finisher.start()
+        finisher.join(0.2)
+        assert_true(finisher.is_alive())  # Waits for the flush in progress
+        collection.resume.set()
+        flusher.join(5)
+        finisher.join(5)
+        assert_equal(collection.documents[u'a'][u'state'], u'SUCCESS')
+        assert_equal(states, [u'PROGRESS'])
+        assert_equal(publisher.flush(), 0)
@@ -68,7 +68,7 @@ def monitor_task_status(api, task_ids, history, interval=15):
     while True:
         time_zero = time.time()
         try:
-            history.append({_id: _extract_info(api.transform_tasks[_id]) for _id in task_ids})
+            history.append({t._id: _extract_info(t) for t in api.transform_tasks.get_many(task_ids)})
             time.sleep(max(0, interval - (time.time() - time_zero)))
         except (ConnectionError, Timeout) as e:
             print(u'WARNING! Communication error while monitoring tasks, details: {1}.'.format(e))
@@ -198,8 +198,7 @@ class Benchmark(DeploymentScenario):
             states  = {}
             percent = 0.0
             try:
-                for st in scheduled_tasks:
-                    task = api_client.transform_tasks[st._id]
+                for task in api_client.transform_tasks.get_many(st._id for st in scheduled_tasks):
                     states[task.status] = states.get(task.status, 0) + 1
                     percent += task.statistic.get('percent', 0)
 
@@ -25,13 +25,12 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import logging, pygal, os, random, shutil, string, threading, time
+import pygal, os, random, shutil, string, threading, time
 from os.path import join
 from collections import defaultdict, deque
 
 from pytoolbox import juju as py_juju
 from pytoolbox.collections import pygal_deque
-from pytoolbox.console import confirm
 from pytoolbox.datetime import datetime_now
 from pytoolbox.encoding import to_bytes
 from pytoolbox.mongo import TaskModel
@@ -367,7 +366,7 @@ class TasksThread(IBCEnvironmentThread):
 
     def transform(self, api_client):
         u"""Transcode source media assets with chosen profiles limiting amount of pending tasks."""
-        medias = api_client.medias.list(head=True, spec={u'status': {u'$ne': Media.DELETED}})
+        medias = api_client.medias.list(head=True)  # Deleted media assets are excluded by the API
         profiles = api_client.transform_profiles.list()
         tasks = api_client.transform_tasks.list(head=True)
         counter = (self.environment.transform_max_pending_tasks -
@@ -386,29 +385,6 @@ class TasksThread(IBCEnvironmentThread):
                                              u'_output_{0}'.format(self.output_counter))
                 self.output_counter += 1
 
-    def cleanup_transform_tasks(self, api_client, auto=False, cleanup_progress_time=20):
-        u"""Cleanup transformation tasks that stuck in progress status without updating the eta_time."""
-        tasks, new_time = api_client.transform_tasks.list(head=True), time.time()
-        progress_tasks = [t for t in tasks if t.status == TaskModel.PROGRESS]
-        delta_time = new_time - self.progress_tasks[0]
-        if cleanup_progress_time and delta_time > cleanup_progress_time:
-            for task in progress_tasks:
-                try:
-                    prev_task = next(t for t in self.progress_tasks[1] if t._id == task._id)
-                    prev_eta_time = prev_task.statistic.get(u'eta_time')
-                    eta_time = task.statistic.get(u'eta_time')
-                    logging.debug(u'PROGRESS task {0} previous eta_time {1}, current {2}'.format(
-                                 task._id, prev_eta_time, eta_time))
-                    if eta_time == prev_eta_time:
-                        logging.warning(u"PROGRESS task {0} hasn't updated is eta_time for at least {1} seconds.".
-                                        format(task._id, delta_time))
-                        logging.info(task.__dict__)
-                        if auto or confirm(u'Revoke the task now ?'):
-                            del api_client.transform_tasks[task._id]
-                except StopIteration:
-                    pass
-        self.progress_tasks = (new_time, progress_tasks)
-
     def cleanup_media_assets(self, api_client):
         u"""Limit output media assets in shared storage by deleting the oldest."""
         maximum = self.environment.max_output_media_assets
@@ -429,7 +405,6 @@ class TasksThread(IBCEnvironmentThread):
 
     def run(self):
         self.output_counter = 0
-        self.progress_tasks = (time.time(), [])
         while True:
             # Get current time to retrieve state
             now, now_string = datetime_now(format=None), datetime_now()
@@ -438,7 +413,6 @@ class TasksThread(IBCEnvironmentThread):
                 api_client = self.environment.api_client
                 api_client.auth = self.environment.daemons_auth
                 self.transform(api_client)
-                self.cleanup_transform_tasks(api_client, auto=True, cleanup_progress_time=60)
                 self.cleanup_media_assets(api_client)
 
             except (ConnectionError, Timeout) as e:
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : SCRIPTS
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os, shutil, sys, tempfile, time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from os.path import abspath, dirname, join
+from pytoolbox.encoding import configure_unicode
+from pytoolbox.filesystem import get_size, recursive_copy as legacy_copy
+
+LIBRARY_PATH = abspath(join(dirname(__file__), u'..', u'library'))
+
+sys.path.insert(0, LIBRARY_PATH)
+from oscied_lib.copier import recursive_copy
+
+
+def create_sources(path, big_size, small_count, small_size):
+    u"""Create a big file (e.g. a MP4) and a directory of small files (e.g. the segments of a MPEG-DASH content)."""
+    big_path, small_path = join(path, u'big'), join(path, u'small')
+    os.makedirs(big_path)
+    os.makedirs(small_path)
+    with open(join(big_path, u'media.mp4'), u'wb') as f:
+        for block in xrange(big_size):
+            f.write(os.urandom(1024 * 1024))
+    for index in xrange(small_count):
+        with open(join(small_path, u'segment_{0:05d}.m4s'.format(index)), u'wb') as f:
+            f.write(os.urandom(small_size * 1024))
+    return ((u'big file', big_path), (u'small files', small_path))
+
+
+def callback(start_date, elapsed_time, eta_time, src_size, dst_size, ratio):
+    pass
+
+
+if __name__ == u'__main__':
+
+    configure_unicode()
+
+    # Gather arguments
+    parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter,
+                            epilog=u'''Measure the throughput of the copy of media assets (legacy vs copier).''')
+    parser.add_argument(u'-r', u'--runs',        action=u'store', type=int, default=3)
+    parser.add_argument(u'-b', u'--big-size',    action=u'store', type=int, default=512, help=u'MB')
+    parser.add_argument(u'-n', u'--small-count', action=u'store', type=int, default=1000)
+    parser.add_argument(u'-s', u'--small-size',  action=u'store', type=int, default=256, help=u'KB')
+    parser.add_argument(u'-t', u'--threads',     action=u'store', type=int, default=8)
+    parser.add_argument(u'-l', u'--link',        action=u'store_true', help=u'Allow hard links')
+    parser.add_argument(u'source', action=u'store', nargs=u'?', default=None,
+                        help=u'Directory where to create the sources (e.g. on the shared storage)')
+    parser.add_argument(u'destination', action=u'store', nargs=u'?', default=None,
+                        help=u'Directory where to copy the sources (e.g. the publication point)')
+    args = parser.parse_args()
+
+    source = tempfile.mkdtemp(dir=args.source)
+    destination = tempfile.mkdtemp(dir=args.destination)
+    try:
+        for label, path in create_sources(source, args.big_size, args.small_count, args.small_size):
+            size = get_size(path)
+            for name, method in ((u'legacy', lambda s, d: legacy_copy(s, d, callback)),
+                                 (u'copier', lambda s, d: recursive_copy(s, d, callback, link=args.link,
+                                                                         threads=args.threads))):
+                timings = []
+                for run in xrange(args.runs):
+                    target = join(destination, u'run')
+                    start = time.time()
+                    infos = method(path, target)
+                    timings.append(time.time() - start)
+                    shutil.rmtree(target)
+                print(u'{0:<12} {1:<8} {2:8.1f} MB/s (best of {3}) {4}'.format(
+                      label, name, size / min(timings) / 1024 / 1024, args.runs, infos.get(u'methods', u'')))
+    finally:
+        shutil.rmtree(source, ignore_errors=True)
+        shutil.rmtree(destination, ignore_errors=True)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : SCRIPTS
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import multiprocessing, os, shlex, shutil, sys, tempfile, time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from os.path import abspath, dirname, join
+from pytoolbox.encoding import configure_unicode
+from subprocess import Popen, PIPE
+
+LIBRARY_PATH = abspath(join(dirname(__file__), u'..', u'library'))
+
+sys.path.insert(0, LIBRARY_PATH)
+from oscied_lib.encoders import CpuBudget, FFmpegProgressParser
+
+ENCODER_STRING = u'-c:v libx264 -preset medium -f null'
+
+
+def encode(args):
+    u"""Encode a synthetic source (like a transform unit would do) and return the amount of encoded frames."""
+    path, source, affinity = args
+    parser = FFmpegProgressParser()
+    with CpuBudget(path, affinity=affinity) as budget:
+        cmd = u'ffmpeg -y -f lavfi -i {0} {1} -'.format(source, budget.encoder_string(ENCODER_STRING))
+        ffmpeg = Popen(budget.command(shlex.split(cmd)), stderr=PIPE, close_fds=True)
+        budget.update(ffmpeg.pid, force=True)
+        for chunk in iter(lambda: os.read(ffmpeg.stderr.fileno(), 4096), b''):
+            parser.feed(chunk)  # The progress lines end with a carriage return
+            budget.update(ffmpeg.pid)
+        ffmpeg.wait()
+        parser.feed(b'\n')
+    return int(parser.stats[u'frame'] or 0) if parser.stats else 0
+
+
+if __name__ == u'__main__':
+
+    configure_unicode()
+
+    # Gather arguments
+    parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter,
+                            epilog=u'''Measure the aggregate throughput (fps) of concurrent encodes with and without
+                                      the CPU budget.''')
+    parser.add_argument(u'-c', u'--concurrency', action=u'store', type=int, default=4)
+    parser.add_argument(u'-d', u'--duration',    action=u'store', type=int, default=30, help=u'seconds')
+    parser.add_argument(u'-s', u'--size',        action=u'store', default=u'1280x720')
+    args = parser.parse_args()
+
+    source = u'testsrc=duration={0}:size={1}:rate=25'.format(args.duration, args.size)
+    for name, budget, affinity in ((u'unmanaged', False, False), (u'budget', True, False),
+                                   (u'affinity', True, True)):
+        path = tempfile.mkdtemp() if budget else None
+        try:
+            pool = multiprocessing.Pool(args.concurrency)
+            start = time.time()
+            frames = sum(pool.map(encode, [(path, source, affinity)] * args.concurrency))
+            elapsed_time = time.time() - start
+            pool.close()
+            pool.join()
+        finally:
+            if path:
+                shutil.rmtree(path, ignore_errors=True)
+        print(u'{0:<10} {1:8.1f} fps (aggregate of {2} encodes, {3} CPUs)'.format(
+              name, frames / elapsed_time, args.concurrency, multiprocessing.cpu_count()))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : SCRIPTS
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import random, re, sys, time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from os.path import abspath, dirname, join
+from pytoolbox.encoding import configure_unicode
+
+LIBRARY_PATH = abspath(join(dirname(__file__), u'..', u'library'))
+FFMPEG_STDERR_FILENAME = join(LIBRARY_PATH, u'tests', u'ffmpeg_stderr.log')
+
+sys.path.insert(0, LIBRARY_PATH)
+from oscied_lib.encoders import FFmpegProgressParser
+
+# The previous implementation : match the (non-blocking) read chunks and keep the whole output
+LEGACY_REGEX = re.compile(
+    r'frame=\s*(?P<frame>\d+)\s+fps=\s*(?P<fps>\d+)\s+q=\s*(?P<q>\S+)\s+\S*size=\s*(?P<size>\S+)\s+'
+    r'time=\s*(?P<time>\S+)\s+bitrate=\s*(?P<bitrate>\S+)')
+
+
+def legacy_parse(chunks):
+    encoder_out, updates = u'', 0
+    for chunk in chunks:
+        chunk = chunk.decode(u'utf-8')
+        encoder_out += chunk
+        if LEGACY_REGEX.match(chunk):
+            updates += 1
+    return updates, len(encoder_out)
+
+
+def parser_parse(chunks):
+    parser, updates = FFmpegProgressParser(), 0
+    for chunk in chunks:
+        if parser.feed(chunk):
+            updates += 1
+    return updates, len(parser.log)
+
+
+def split_chunks(data, max_size):
+    random.seed(0)
+    chunks, position = [], 0
+    while position < len(data):
+        size = random.randint(1, max_size)
+        chunks.append(data[position:position+size])
+        position += size
+    return chunks
+
+
+if __name__ == u'__main__':
+
+    configure_unicode()
+
+    # Gather arguments
+    parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter,
+                            epilog=u'''Measure the throughput of the parsing of captures of the output of FFmpeg.''')
+    parser.add_argument(u'-r', u'--runs',       action=u'store', type=int, default=5)
+    parser.add_argument(u'-c', u'--chunk-size', action=u'store', type=int, default=512)
+    parser.add_argument(u'-p', u'--repeat',     action=u'store', type=int, default=20)
+    parser.add_argument(u'captures', action=u'store', nargs=u'*', default=[FFMPEG_STDERR_FILENAME])
+    args = parser.parse_args()
+
+    for capture in args.captures:
+        with open(capture, u'rb') as f:
+            data = f.read() * args.repeat
+        chunks = split_chunks(data, args.chunk_size)
+        for name, method in ((u'legacy', legacy_parse), (u'parser', parser_parse)):
+            timings = []
+            for run in xrange(args.runs):
+                start = time.time()
+                updates, out_size = method(chunks)
+                timings.append(time.time() - start)
+            print(u'{0:<8} {1:8.1f} MB/s (best of {2}), {3} progress updates, {4} characters kept'.format(
+                  name, len(data) / min(timings) / 1024 / 1024, args.runs, updates, out_size))
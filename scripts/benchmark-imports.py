@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+#**********************************************************************************************************************#
+#              OPEN-SOURCE CLOUD INFRASTRUCTURE FOR ENCODING AND DISTRIBUTION : SCRIPTS
+#
+#  Project Manager : Bram Tullemans (tullemans@ebu.ch)
+#  Main Developer  : David Fischer (david.fischer.ch@gmail.com)
+#  Copyright       : Copyright (c) 2012-2013 EBU. All rights reserved.
+#
+#**********************************************************************************************************************#
+#
+# This file is part of EBU Technology & Innovation OSCIED Project.
+#
+# This project is free software: you can redistribute it and/or modify it under the terms of the EUPL v. 1.1 as provided
+# by the European Commission. This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the European Union Public License for more details.
+#
+# You should have received a copy of the EUPL General Public License along with this project.
+# If not, see he EUPL licence v1.1 is available in 22 languages:
+#     22-07-2013, <https://joinup.ec.europa.eu/software/page/eupl/licence-eupl>
+#
+# Retrieved from https://github.com/ebu/OSCIED
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import subprocess, sys
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from os.path import abspath, dirname, join
+from pytoolbox.encoding import configure_unicode
+
+MODULES = (u'oscied_lib.api', u'oscied_lib.OrchestraHooks', u'oscied_lib.PublisherHooks', u'oscied_lib.TransformHooks')
+HEAVY_MODULES = (u'celery', u'flask', u'jinja2', u'mongomock', u'nose', u'pymongo', u'pytoolbox.juju', u'smtplib',
+                 u'oscied_lib.PublisherWorker', u'oscied_lib.TransformWorker')
+LIBRARY_PATH = abspath(join(dirname(__file__), u'..', u'library'))
+
+# Import the module in a fresh interpreter, print elapsed time and the heavy modules that were loaded
+IMPORT_CODE = u"""
+import sys, time
+sys.path.insert(0, {path!r})
+start = time.time()
+import {module}
+elapsed = time.time() - start
+print(elapsed)
+print(u','.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def benchmark_import(module, runs):
+    u"""Return the best import time of ``module`` and the heavy modules loaded by its import."""
+    timings, loaded = [], u''
+    code = IMPORT_CODE.format(path=LIBRARY_PATH, module=module, heavy=HEAVY_MODULES)
+    for run in xrange(runs):
+        output = subprocess.check_output([sys.executable, u'-c', code]).decode(u'utf-8').splitlines()
+        timings.append(float(output[0]))
+        loaded = output[1] if len(output) > 1 else u''
+    return min(timings), loaded
+
+
+if __name__ == u'__main__':
+
+    configure_unicode()
+
+    # Gather arguments
+    parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter,
+                            epilog=u'''Measure the time to import the modules used by the charms hooks and the scripts.''')
+    parser.add_argument(u'-r', u'--runs',    action=u'store', type=int, default=5)
+    parser.add_argument(u'-m', u'--modules', action=u'store', nargs=u'+', default=MODULES)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        elapsed, loaded = benchmark_import(module, args.runs)
+        print(u'{0:<28} {1:7.1f} ms (best of {2}), heavy modules loaded: {3}'.format(
+              module, elapsed * 1000, args.runs, loaded or u'none'))